@@ -0,0 +1,451 @@
+"""
+Benchmark Suite
+Times and memory-profiles data generation, Supabase import and data acquisition, with a regression history
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCHMARK_DIR, '..', 'src'))
+
+# Remote fetches would otherwise be served from the local table cache
+os.environ['MARKETING_CACHE'] = '0'
+
+import generate_marketing_data as generator
+import import_to_supabase as importer
+import data_acquisition
+from backends import set_backend
+from schema import apply_schema
+from storage import write_dataset
+from stub_server import StubPostgrest
+
+SUITES = ['generate', 'import', 'acquire']
+
+DEFAULT_SCALES = [1.0, 4.0]
+DEFAULT_REPEAT = 3
+
+# Stand-in network profile: seconds per request and per row
+DEFAULT_LATENCY = 0.02
+DEFAULT_ROW_LATENCY = 0.0
+
+DEFAULT_HISTORY = os.path.join(BENCHMARK_DIR, 'history.jsonl')
+
+# Regression thresholds: relative change against the baseline that counts as
+# a regression. Metrics in HIGHER_IS_BETTER regress when they drop.
+DEFAULT_THRESHOLDS = {
+    'seconds': 0.25,
+    'cpu_seconds': 0.25,
+    'peak_mb': 0.20,
+    'rows_per_second': 0.20,
+}
+HIGHER_IS_BETTER = {'rows_per_second'}
+
+# Changes smaller than these are noise, whatever the relative change
+NOISE_FLOORS = {'seconds': 0.02, 'cpu_seconds': 0.02, 'peak_mb': 1.0}
+
+# Earlier runs on the same host whose median is the baseline
+DEFAULT_BASELINE_RUNS = 5
+
+# Rows per chunk for the Parquet streaming benchmark
+STREAM_CHUNK_SIZE = 5000
+
+# Days added by the generate_extension benchmark
+EXTENSION_DAYS = 60
+
+
+def measure(function: Callable, repeat: int = DEFAULT_REPEAT, setup: Optional[Callable] = None) -> dict:
+    """
+    Best-of-repeat wall and CPU time, then the peak traced allocation of one more call
+
+    Memory is traced in a separate call because tracemalloc slows the
+    allocations down enough to skew the timings.
+
+    Args:
+        function: Called with setup()'s result (or nothing); the length of what it returns is reported as rows
+        repeat: Timed calls
+        setup: Optional untimed call producing the argument for each call
+    """
+    timings = []
+    rows = None
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = function(argument) if setup else function()
+        timings.append((time.perf_counter() - wall, time.process_time() - cpu))
+        rows = _row_count(result)
+
+    argument = setup() if setup else None
+    tracemalloc.start()
+    try:
+        function(argument) if setup else function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    seconds, cpu_seconds = min(timings)
+    metrics = {'seconds': seconds, 'cpu_seconds': cpu_seconds, 'peak_mb': peak / 1024 ** 2}
+    if rows is not None:
+        metrics['rows'] = rows
+        metrics['rows_per_second'] = rows / seconds if seconds else 0.0
+    return metrics
+
+
+def _row_count(result) -> Optional[int]:
+    """Rows in a benchmarked function's result, when it has any"""
+    if isinstance(result, tuple):
+        return sum(len(part) for part in result)
+    if isinstance(result, dict):
+        return sum(result.values())
+    return len(result) if hasattr(result, '__len__') else None
+
+
+def _quiet(function: Callable) -> Callable:
+    """Wrap a function so its progress output is discarded"""
+    def wrapper(*args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return function(*args)
+    return wrapper
+
+
+def _fixture(scale: float) -> dict:
+    """In-memory datasets at a scale factor, from the vectorized engines"""
+    rng = np.random.default_rng(generator.SEED)
+    campaigns = generator.generate_campaigns(max(1, round(generator.NUM_CAMPAIGNS * scale)))
+    performance = generator.generate_daily_performance(campaigns, vectorized=True, rng=rng)
+    customers = generator.generate_customers(campaigns, performance, vectorized=True, rng=rng,
+                                             max_customers=max(1, round(generator.NUM_CUSTOMERS * scale)))
+    transactions = generator.generate_transactions(customers, vectorized=True, rng=rng)
+    ab_tests = _quiet(generator.generate_ab_tests)(campaigns)
+    return {'campaigns': campaigns, 'daily_performance': performance, 'customers': customers,
+            'transactions': transactions, 'ab_tests': ab_tests}
+
+
+def write_fixture(scale: float, directory: str, fmt: str = 'csv') -> dict:
+    """Write the datasets for a scale factor the way the generator's CLI does; returns the frames"""
+    frames = {name: apply_schema(df, name) for name, df in _fixture(scale).items()}
+    lookups = {
+        'daily_performance': frames['campaigns'].set_index('campaign_id')['channel'],
+        'transactions': frames['customers'].set_index('customer_id')['channel'],
+    }
+    for name, df in frames.items():
+        write_dataset(df, directory, name, fmt, lookups.get(name))
+    return frames
+
+
+def benchmark_generation(scale: float, repeat: int, workers: int) -> List[dict]:
+    """Every generate_* function at one scale factor, with both engines where there are two"""
+    results = []
+
+    def record(name, metrics, **params):
+        results.append({'suite': 'generate', 'name': name, 'params': dict(scale=scale, **params),
+                        'metrics': metrics})
+
+    num_campaigns = max(1, round(generator.NUM_CAMPAIGNS * scale))
+    max_customers = max(1, round(generator.NUM_CUSTOMERS * scale))
+    fixture = _fixture(scale)
+    record('generate_campaigns', measure(lambda: generator.generate_campaigns(num_campaigns), repeat))
+    record('generate_ab_tests', measure(_quiet(lambda: generator.generate_ab_tests(fixture['campaigns'])), repeat))
+    for engine, vectorized in (('loop', False), ('vectorized', True)):
+        record('generate_daily_performance', measure(
+            lambda: generator.generate_daily_performance(fixture['campaigns'], vectorized=vectorized), repeat
+        ), engine=engine)
+        record('generate_customers', measure(
+            lambda: generator.generate_customers(fixture['campaigns'], fixture['daily_performance'],
+                                                 vectorized=vectorized, max_customers=max_customers), repeat
+        ), engine=engine)
+        record('generate_transactions', measure(
+            lambda: generator.generate_transactions(fixture['customers'], vectorized=vectorized), repeat
+        ), engine=engine)
+
+    # Whole-pipeline modes. Worker processes are outside tracemalloc's view,
+    # so generate_sharded's peak_mb covers the parent process only.
+    record('generate_sharded', measure(
+        _quiet(lambda: generator.generate_sharded(workers, scale=scale)), repeat
+    ), workers=workers)
+    with tempfile.TemporaryDirectory() as directory:
+        record('generate_streaming', measure(
+            _quiet(lambda: generator.generate_streaming(directory, scale=scale)), repeat
+        ))
+    # Small chunks, so some performance chunks carry no conversions and yield
+    # empty customer chunks that the Parquet writer has to get past
+    with tempfile.TemporaryDirectory() as directory:
+        record('generate_streaming', measure(
+            _quiet(lambda: generator.generate_streaming(directory, scale=scale, chunk_size=STREAM_CHUNK_SIZE,
+                                                        fmt='parquet')), repeat
+        ), fmt='parquet', chunk_size=STREAM_CHUNK_SIZE)
+
+    def extension_source():
+        directory = tempfile.mkdtemp()
+        write_fixture(scale, directory)
+        return directory
+
+    def extend(directory):
+        try:
+            end = generator.END_DATE + timedelta(days=EXTENSION_DAYS)
+            return generator.generate_extension(directory, end.strftime('%Y-%m-%d'))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    record('generate_extension', measure(_quiet(extend), repeat, setup=extension_source), days=EXTENSION_DAYS)
+    return results
+
+
+def benchmark_import(scale: float, stub: StubPostgrest, directory: str, concurrency: int) -> List[dict]:
+    """
+    Full import of one fixture into the stand-in, with per-table throughput
+
+    The import runs once: a second run would resume from the checkpoint
+    and upsert over rows the stand-in already holds.
+    """
+    before = stub.counters()
+    bulk = importer.BulkImporter(
+        data_dir=directory, concurrency=concurrency,
+        checkpoint_path=os.path.join(directory, '.import_checkpoint.json'),
+        manifest_dir=os.path.join(directory, '.import_manifest')
+    )
+    started, cpu = time.perf_counter(), time.process_time()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bulk.run()
+    finally:
+        bulk.close()
+    seconds, cpu_seconds = time.perf_counter() - started, time.process_time() - cpu
+    after = stub.counters()
+
+    params = {'scale': scale, 'latency': stub.latency, 'row_latency': stub.row_latency,
+              'concurrency': concurrency}
+    results = []
+    for table, stats in bulk.stats.items():
+        results.append({'suite': 'import', 'name': table, 'params': params, 'metrics': {
+            'seconds': stats['seconds'],
+            'rows': stats['rows'],
+            'rows_per_second': stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0,
+            'bytes': stats['bytes'],
+            'retries': stats['retries'],
+            'final_batch_size': stats['batch_size'],
+        }})
+    rows = sum(stats['rows'] for stats in bulk.stats.values())
+    results.append({'suite': 'import', 'name': 'all_tables', 'params': params, 'metrics': {
+        'seconds': seconds,
+        'cpu_seconds': cpu_seconds,
+        'rows': rows,
+        'rows_per_second': rows / seconds if seconds else 0.0,
+        'requests': after['requests'] - before['requests'],
+        'bytes': after['bytes_in'] - before['bytes_in'],
+    }})
+    return results
+
+
+# data_acquisition paths: plain fetches, client-side merges, server-side joins and an RPC
+ACQUISITION_CASES = {
+    'get_campaigns': lambda: data_acquisition.get_campaigns(use_cache=False),
+    'get_daily_performance': lambda: data_acquisition.get_daily_performance(use_cache=False),
+    'get_customers': lambda: data_acquisition.get_customers(use_cache=False),
+    'get_transactions': lambda: data_acquisition.get_transactions(use_cache=False),
+    'get_channel_performance_with_campaigns': data_acquisition.get_channel_performance_with_campaigns,
+    'get_customer_ltv_data': data_acquisition.get_customer_ltv_data,
+    'get_channel_performance_pushdown': data_acquisition.get_channel_performance_pushdown,
+    'get_customer_ltv_pushdown': data_acquisition.get_customer_ltv_pushdown,
+    'get_channel_metrics': data_acquisition.get_channel_metrics,
+}
+
+
+def benchmark_acquisition(scale: float, stub: StubPostgrest, repeat: int) -> List[dict]:
+    """Fetch and merge paths against the stand-in, which must already hold the fixture"""
+    params = {'scale': scale, 'latency': stub.latency, 'row_latency': stub.row_latency}
+    results = []
+    for name, function in ACQUISITION_CASES.items():
+        before = stub.counters()
+        metrics = measure(function, repeat)
+        after = stub.counters()
+        # Requests and bytes per call; measure() makes repeat + 1 calls
+        metrics['requests'] = (after['requests'] - before['requests']) / (repeat + 1)
+        metrics['bytes'] = (after['bytes_out'] - before['bytes_out']) / (repeat + 1)
+        results.append({'suite': 'acquire', 'name': name, 'params': params, 'metrics': metrics})
+    return results
+
+
+def _result_key(result: dict) -> str:
+    return json.dumps([result['suite'], result['name'], result['params']], sort_keys=True)
+
+
+def load_history(path: str) -> List[dict]:
+    """Earlier runs, oldest first"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_regressions(results: List[dict], history: List[dict], thresholds: Dict[str, float],
+                     baseline_runs: int = DEFAULT_BASELINE_RUNS, host: Optional[str] = None) -> List[dict]:
+    """
+    Metrics that moved past their threshold against the baseline
+
+    The baseline of each benchmark (same suite, name and parameters) is the
+    median over its last baseline_runs runs on the same host, so timings from
+    different machines are never compared.
+    """
+    previous = {}
+    for run in history:
+        if host is not None and run.get('host') != host:
+            continue
+        for result in run['results']:
+            previous.setdefault(_result_key(result), []).append(result['metrics'])
+
+    regressions = []
+    for result in results:
+        earlier = previous.get(_result_key(result), [])[-baseline_runs:]
+        for metric, threshold in thresholds.items():
+            values = [metrics[metric] for metrics in earlier if metric in metrics]
+            if not values or metric not in result['metrics']:
+                continue
+            baseline = statistics.median(values)
+            value = result['metrics'][metric]
+            change = (value - baseline) / baseline if baseline else 0.0
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > threshold and abs(value - baseline) > NOISE_FLOORS.get(metric, 0.0):
+                regressions.append({'suite': result['suite'], 'name': result['name'], 'params': result['params'],
+                                    'metric': metric, 'value': value, 'baseline': baseline,
+                                    'change': change, 'threshold': threshold})
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(suites: List[str] = SUITES, scales: List[float] = DEFAULT_SCALES, repeat: int = DEFAULT_REPEAT,
+        latency: float = DEFAULT_LATENCY, row_latency: float = DEFAULT_ROW_LATENCY,
+        concurrency: int = importer.DEFAULT_CONCURRENCY, workers: int = 2) -> List[dict]:
+    """Run the chosen suites at every scale factor and return their results"""
+    results = []
+    for scale in scales:
+        if 'generate' in suites:
+            print(f"Generation at scale {scale:g}...")
+            results.extend(benchmark_generation(scale, repeat, workers))
+        if 'import' in suites or 'acquire' in suites:
+            with tempfile.TemporaryDirectory() as directory, \
+                    StubPostgrest(latency=latency, row_latency=row_latency) as stub:
+                write_fixture(scale, directory)
+                backend = stub.client_backend()
+                # Create the client up front so its setup isn't timed as the first request
+                backend.client
+                set_backend(backend)
+                if 'import' in suites:
+                    print(f"Import at scale {scale:g} ({latency * 1000:g} ms latency)...")
+                    results.extend(benchmark_import(scale, stub, directory, concurrency))
+                else:
+                    stub.backend.load_directory(directory)
+                if 'acquire' in suites:
+                    print(f"Acquisition at scale {scale:g} ({latency * 1000:g} ms latency)...")
+                    results.extend(benchmark_acquisition(scale, stub, repeat))
+    return results
+
+
+def report(results: List[dict], regressions: List[dict]) -> str:
+    """Table of results, followed by any regressions"""
+    lines = [f"{'suite':<9} {'benchmark':<40} {'params':<56} {'seconds':>9} {'peak MB':>9} {'rows/sec':>12}"]
+    for result in results:
+        metrics = result['metrics']
+        params = ' '.join(f"{key}={value}" for key, value in result['params'].items())
+        peak = f"{metrics['peak_mb']:.1f}" if 'peak_mb' in metrics else '-'
+        rate = f"{metrics['rows_per_second']:,.0f}" if 'rows_per_second' in metrics else '-'
+        lines.append(f"{result['suite']:<9} {result['name']:<40} {params:<56} "
+                     f"{metrics['seconds']:>9.3f} {peak:>9} {rate:>12}")
+    if regressions:
+        lines.append("")
+        lines.append(f"{len(regressions)} regression(s):")
+        for regression in regressions:
+            lines.append(f"  {regression['suite']}/{regression['name']} {regression['params']}: "
+                         f"{regression['metric']} {regression['value']:.4g} vs baseline "
+                         f"{regression['baseline']:.4g} ({regression['change']:+.0%}, "
+                         f"threshold {regression['threshold']:.0%})")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Benchmark generation, import and data acquisition")
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=SUITES,
+                        help="Suites to run (default: all)")
+    parser.add_argument('--scales', nargs='+', type=float, default=DEFAULT_SCALES,
+                        help=f"Scale factors (default: {' '.join(f'{s:g}' for s in DEFAULT_SCALES)})")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help=f"Timed calls per benchmark; the fastest counts (default: {DEFAULT_REPEAT})")
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY,
+                        help=f"Stand-in server seconds per request (default: {DEFAULT_LATENCY})")
+    parser.add_argument('--row-latency', type=float, default=DEFAULT_ROW_LATENCY,
+                        help="Stand-in server seconds per row sent or returned (default: 0)")
+    parser.add_argument('--concurrency', type=int, default=importer.DEFAULT_CONCURRENCY,
+                        help=f"Importer batches in flight (default: {importer.DEFAULT_CONCURRENCY})")
+    parser.add_argument('--workers', type=int, default=2,
+                        help="Processes for the generate_sharded benchmark (default: 2)")
+    parser.add_argument('--history', default=DEFAULT_HISTORY,
+                        help="JSON lines file runs are compared with and appended to (default: history.jsonl)")
+    parser.add_argument('--baseline-runs', type=int, default=DEFAULT_BASELINE_RUNS,
+                        help=f"Earlier runs whose median is the baseline (default: {DEFAULT_BASELINE_RUNS})")
+    parser.add_argument('--threshold', action='append', default=[], metavar='METRIC=FRACTION',
+                        help="Override a regression threshold, e.g. seconds=0.5 (repeatable)")
+    parser.add_argument('--no-record', action='store_true',
+                        help="Compare with the history without appending this run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmarks, compare with the history and record the run; exits 1 on a regression"""
+    args = parse_args(argv)
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for override in args.threshold:
+        metric, _, fraction = override.partition('=')
+        thresholds[metric] = float(fraction)
+
+    started = time.perf_counter()
+    results = run(args.suites, args.scales, args.repeat, args.latency, args.row_latency,
+                  args.concurrency, args.workers)
+    host = platform.node()
+    regressions = find_regressions(results, load_history(args.history), thresholds, args.baseline_runs, host)
+
+    print()
+    print(report(results, regressions))
+    print(f"\nFinished in {time.perf_counter() - started:.1f}s")
+
+    if not args.no_record:
+        entry = {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'host': host,
+            'python': platform.python_version(),
+            'thresholds': thresholds,
+            'results': results,
+            'regressions': regressions,
+        }
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"Recorded in {args.history}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
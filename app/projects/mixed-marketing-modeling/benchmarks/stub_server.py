@@ -0,0 +1,252 @@
+"""
+PostgREST Stand-in Server
+Local HTTP endpoint mimicking the Supabase table API, with configurable latency, for benchmarks
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backends import LocalBackend, SupabaseBackend
+
+# Query parameters that are not row filters
+RESERVED_PARAMS = {'select', 'order', 'offset', 'limit', 'on_conflict', 'columns'}
+
+# PostgREST filter operators understood by LocalBackend
+OPERATORS = {'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'in'}
+
+# Key the SupabaseBackend sends; the stand-in accepts any key
+STUB_KEY = 'benchmark-key'
+
+
+def _parse_select(select: str):
+    """Split a select string into (columns, embed): 'a,b,campaigns(c,d)' -> (['a', 'b'], ('campaigns', ['c', 'd']))"""
+    embed = None
+    match = re.search(r'(\w+)\(([^)]*)\)', select)
+    if match:
+        embed = (match.group(1), [column for column in match.group(2).split(',') if column])
+        select = select[:match.start()] + select[match.end():]
+    columns = [column for column in select.split(',') if column and column != '*']
+    return columns or None, embed
+
+
+def _parse_filters(params):
+    """(operator, column, value) filters from query parameters like date=gte.2024-01-01"""
+    filters = []
+    for column, expression in params:
+        if column in RESERVED_PARAMS:
+            continue
+        operator, _, value = expression.partition('.')
+        if operator not in OPERATORS:
+            raise ValueError(f"Unsupported filter {column}={expression}")
+        if operator == 'in':
+            filters.append(('in_', column, [v.strip('"') for v in value.strip('()').split(',') if v]))
+        else:
+            filters.append((operator, column, value))
+    return filters
+
+
+class StubPostgrest:
+    """
+    Threaded HTTP server speaking enough of PostgREST for the importer and data_acquisition
+
+    Rows live in an in-memory LocalBackend, so selects, embedded selects,
+    upserts, deletes and the RPC functions return real results. Every request
+    sleeps latency seconds (plus row_latency per row sent or returned) before
+    answering, and fails with a 503 with probability error_rate, so import and
+    fetch throughput can be measured under a chosen network profile.
+    """
+
+    def __init__(self, latency: float = 0.0, row_latency: float = 0.0, error_rate: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0, seed: Optional[int] = None):
+        """
+        Args:
+            latency: Seconds added to every request
+            row_latency: Seconds added per row sent or returned
+            error_rate: Fraction of requests answered with a 503
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free one)
+            seed: Seed for the injected failures
+        """
+        self.latency = latency
+        self.row_latency = row_latency
+        self.error_rate = error_rate
+        self.backend = LocalBackend()
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Full results of recent selects, so paging through a table costs one query
+        self._selects = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def client_backend(self, **kwargs) -> SupabaseBackend:
+        """SupabaseBackend pointed at this server"""
+        return SupabaseBackend(url=self.url, key=STUB_KEY, **kwargs)
+
+    def start(self) -> 'StubPostgrest':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'StubPostgrest':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def counters(self) -> dict:
+        """Requests served and bytes received and sent so far"""
+        with self._lock:
+            return {'requests': self.requests, 'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out}
+
+    def _select(self, table: str, params) -> tuple:
+        """One page of a select, and the total row count"""
+        columns, embed = _parse_select(dict(params).get('select', '*'))
+        filters = _parse_filters(params)
+        key = (table, repr(columns), repr(embed), repr(filters))
+        with self._lock:
+            df = self._selects.get(key)
+        if df is None:
+            df = self.backend.select(table, columns=columns, filters=filters, embed=embed)
+            if embed is not None:
+                resource, embedded_columns = embed
+                df[resource] = df[embedded_columns].to_dict('records')
+                df = df.drop(columns=embedded_columns)
+            with self._lock:
+                self._selects[key] = df
+        offset = int(dict(params).get('offset', 0))
+        limit = dict(params).get('limit')
+        page = df.iloc[offset:] if limit is None else df.iloc[offset:offset + int(limit)]
+        return page, len(df)
+
+    def _write(self, method: str, table: str, params, body):
+        """Apply an insert, upsert or delete"""
+        with self._lock:
+            self._selects.clear()
+        if method == 'DELETE':
+            self.backend.delete(table, _parse_filters(params))
+        elif 'on_conflict' in dict(params):
+            self.backend.upsert(table, body, dict(params)['on_conflict'])
+        else:
+            self.backend.insert(table, body)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; with Nagle's algorithm the
+            # body waits for the client's delayed ACK, adding ~40 ms per response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, payload: bytes = b'[]', headers: Optional[dict] = None):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+                with stub._lock:
+                    stub.bytes_out += len(payload)
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                with stub._lock:
+                    stub.requests += 1
+                    stub.bytes_in += len(raw)
+                    failed = stub.error_rate and stub._random.random() < stub.error_rate
+                parts = urlsplit(self.path)
+                params = parse_qsl(parts.query, keep_blank_values=True)
+                path = parts.path.split('/rest/v1/', 1)[-1].strip('/')
+                body = json.loads(raw) if raw else None
+
+                if failed:
+                    time.sleep(stub.latency)
+                    self._reply(503, json.dumps({'message': 'injected failure'}).encode())
+                    return
+                try:
+                    headers = {}
+                    if path.startswith('rpc/'):
+                        result = stub.backend.rpc(path[len('rpc/'):], body or {})
+                        rows = len(result)
+                    elif self.command == 'GET':
+                        result, total = stub._select(path, params)
+                        rows = len(result)
+                        offset = int(dict(params).get('offset', 0))
+                        if 'count=' in self.headers.get('Prefer', ''):
+                            headers['Content-Range'] = f"{offset}-{offset + max(rows, 1) - 1}/{total}"
+                    else:
+                        stub._write(self.command, path, params, body)
+                        result = None
+                        rows = len(body) if isinstance(body, list) else 0
+                except Exception as e:
+                    self._reply(400, json.dumps({'message': str(e)}).encode())
+                    return
+
+                time.sleep(stub.latency + stub.row_latency * rows)
+                if result is None:
+                    # Writes echo the rows back, as with return=representation
+                    payload = raw if 'return=representation' in self.headers.get('Prefer', '') else b''
+                    self._reply(201 if self.command == 'POST' else 200, payload or b'[]')
+                else:
+                    self._reply(200, result.to_json(orient='records').encode(), headers)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+        return Handler
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Run a local PostgREST stand-in for benchmarks")
+    parser.add_argument('--port', type=int, default=54321, help="Port to listen on (default: 54321)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument('--row-latency', type=float, default=0.0, help="Seconds added per row")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests failing with a 503")
+    parser.add_argument('--data-dir', help="Generator output to preload (CSV or Parquet)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Serve until interrupted"""
+    args = parse_args(argv)
+    stub = StubPostgrest(args.latency, args.row_latency, args.error_rate, port=args.port)
+    if args.data_dir:
+        stub.backend.load_directory(args.data_dir)
+    print(f"Serving a PostgREST stand-in at {stub.url} (key: anything)")
+    try:
+        stub.start()._thread.join()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Multi-Touch Attribution Module
+First/last/linear/time-decay/position-based and Markov removal attribution over CSR touchpoint paths
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from schema import CATEGORIES
+
+# Channel keys in CHANNEL_CONFIG order; unknown channels are appended after these
+CHANNELS = CATEGORIES['channel']
+
+HEURISTIC_MODELS = ['first_touch', 'last_touch', 'linear', 'time_decay', 'position_based']
+MODELS = HEURISTIC_MODELS + ['markov']
+
+# Time-decay credit halves for every HALF_LIFE_DAYS between a touch and the conversion
+DEFAULT_HALF_LIFE_DAYS = 7.0
+
+# Position-based (U-shaped) credit of the first and last touch; the middle touches share the rest
+DEFAULT_POSITION_WEIGHTS = (0.4, 0.4)
+
+# Paths per shard handed to a worker process
+DEFAULT_SHARD_SIZE = 250000
+
+# Markov chain states ahead of the channel/campaign states
+START, CONVERSION, NULL = 0, 1, 2
+FIRST_STATE = 3
+
+
+class TouchpointPaths:
+    """
+    Customer journeys in compressed sparse row form
+
+    Touches of path i are rows offsets[i]:offsets[i + 1] of the flat,
+    time-ordered touch arrays (channel code, campaign id, time in days).
+    Each path also carries whether it converted and the conversion value.
+    """
+
+    def __init__(self, offsets: np.ndarray, channel: np.ndarray, campaign: np.ndarray, time: np.ndarray,
+                 converted: Optional[np.ndarray] = None, value: Optional[np.ndarray] = None,
+                 conversion_time: Optional[np.ndarray] = None, channels: Sequence[str] = CHANNELS):
+        """
+        Args:
+            offsets: Path boundaries into the touch arrays (length number of paths + 1)
+            channel: Channel code per touch, indexing channels
+            campaign: Campaign id per touch
+            time: Touch time in days
+            converted: Whether each path ended in a conversion (default: all did)
+            value: Conversion value per path (default: 1)
+            conversion_time: Conversion time per path in days (default: its last touch)
+            channels: Channel names the codes refer to
+        """
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.channel = np.asarray(channel, dtype=np.int64)
+        self.campaign = np.asarray(campaign, dtype=np.int64)
+        self.time = np.asarray(time, dtype=float)
+        paths = len(self.offsets) - 1
+        self.converted = np.ones(paths, dtype=bool) if converted is None else np.asarray(converted, dtype=bool)
+        self.value = np.ones(paths) if value is None else np.asarray(value, dtype=float)
+        if conversion_time is None:
+            last = np.maximum(self.offsets[1:] - 1, 0)
+            conversion_time = self.time[last] if len(self.time) else np.zeros(paths)
+        self.conversion_time = np.asarray(conversion_time, dtype=float)
+        self.channels = list(channels)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def slice(self, start: int, stop: int) -> 'TouchpointPaths':
+        """Paths start..stop as a standalone set (offsets rebased to zero)"""
+        lo, hi = self.offsets[start], self.offsets[stop]
+        return TouchpointPaths(self.offsets[start:stop + 1] - lo, self.channel[lo:hi], self.campaign[lo:hi],
+                               self.time[lo:hi], self.converted[start:stop], self.value[start:stop],
+                               self.conversion_time[start:stop], self.channels)
+
+    @classmethod
+    def from_frame(cls, touchpoints: pd.DataFrame, path_column: str = 'customer_id',
+                   time_column: str = 'date', paths: Optional[pd.DataFrame] = None) -> 'TouchpointPaths':
+        """
+        Build paths from one row per touch
+
+        Args:
+            touchpoints: Rows with path_column, time_column, channel and campaign_id
+            path_column: Column identifying the journey
+            time_column: Touch timestamp column
+            paths: Optional per-path rows (indexed by path id) with converted,
+                value and/or conversion_time columns
+        """
+        df = touchpoints.sort_values([path_column, time_column], kind='stable')
+        path_ids, starts = np.unique(df[path_column].to_numpy(), return_index=True)
+        offsets = np.r_[starts, len(df)]
+        channels = list(CHANNELS) + sorted(set(df['channel'].astype(str)) - set(CHANNELS))
+        channel = pd.Index(channels).get_indexer(df['channel'].astype(str))
+        epoch = pd.Timestamp('1970-01-01')
+        time = (pd.to_datetime(df[time_column]) - epoch).dt.total_seconds().to_numpy() / 86400
+
+        kwargs = {}
+        if paths is not None:
+            paths = paths.reindex(path_ids)
+            if 'converted' in paths:
+                kwargs['converted'] = paths['converted'].fillna(False).to_numpy(dtype=bool)
+            if 'value' in paths:
+                kwargs['value'] = paths['value'].fillna(0).to_numpy(dtype=float)
+            if 'conversion_time' in paths:
+                kwargs['conversion_time'] = (
+                    (pd.to_datetime(paths['conversion_time']) - epoch).dt.total_seconds().to_numpy() / 86400
+                )
+        return cls(offsets, channel, df['campaign_id'].to_numpy(), time, channels=channels, **kwargs)
+
+    @classmethod
+    def from_customers(cls, customers: pd.DataFrame, value_column: Optional[str] = 'first_order_value') \
+            -> 'TouchpointPaths':
+        """
+        Acquisition journeys from the customers table, as attribution_model_comparison() builds them
+
+        Every customer row is a touch on its campaign's channel at its
+        acquisition date, and every customer converted.
+        """
+        paths = None
+        if value_column is not None:
+            paths = customers.groupby('customer_id')[value_column].sum().rename('value').to_frame()
+        return cls.from_frame(customers, 'customer_id', 'acquisition_date', paths)
+
+
+def _touch_index(paths: TouchpointPaths) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Path number, position within the path and path length for every touch"""
+    lengths = paths.lengths
+    path = np.repeat(np.arange(len(paths)), lengths)
+    position = np.arange(len(path)) - paths.offsets[path]
+    return path, position, lengths[path]
+
+
+def touch_weights(paths: TouchpointPaths, model: str, half_life_days: float = DEFAULT_HALF_LIFE_DAYS,
+                  position_weights: Tuple[float, float] = DEFAULT_POSITION_WEIGHTS) -> np.ndarray:
+    """
+    Share of its path's conversion credited to every touch (each path sums to 1)
+
+    Args:
+        paths: Touchpoint paths
+        model: One of HEURISTIC_MODELS
+        half_life_days: Time-decay half-life
+        position_weights: Position-based credit of the first and last touch
+    """
+    path, position, length = _touch_index(paths)
+    if model == 'first_touch':
+        return (position == 0).astype(float)
+    if model == 'last_touch':
+        return (position == length - 1).astype(float)
+    if model == 'linear':
+        return 1.0 / length
+    if model == 'time_decay':
+        age = np.maximum(paths.conversion_time[path] - paths.time, 0)
+        raw = 0.5 ** (age / half_life_days)
+        return raw / np.bincount(path, weights=raw, minlength=len(paths))[path]
+    if model == 'position_based':
+        first, last = position_weights
+        middle = (1 - first - last) / np.maximum(length - 2, 1)
+        weights = np.where(position == 0, first, np.where(position == length - 1, last, middle))
+        # Without middle touches the two ends split the credit in proportion to their weights
+        weights = np.where(length == 2, weights / (first + last), weights)
+        return np.where(length == 1, 1.0, weights)
+    raise ValueError(f"Unknown attribution model: {model}. Use one of {HEURISTIC_MODELS}")
+
+
+def transition_counts(paths: TouchpointPaths, keys: np.ndarray, num_keys: int) -> np.ndarray:
+    """
+    First-order transition counts between Markov states
+
+    States are start, conversion, null (no conversion), then one per key.
+    Counts from separate shards simply add up.
+    """
+    states = num_keys + FIRST_STATE
+    touched = paths.lengths > 0
+    current = keys + FIRST_STATE
+    # Every touch moves to the next touch of its path, or to the path's outcome
+    path, position, length = _touch_index(paths)
+    outcome = np.where(paths.converted, CONVERSION, NULL)
+    following = np.where(position == length - 1, outcome[path], np.r_[current[1:], 0])
+    counts = np.bincount(current * states + following, minlength=states * states)
+    counts += np.bincount(START * states + current[paths.offsets[:-1][touched]], minlength=states * states)
+    return counts.reshape(states, states)
+
+
+def _conversion_probability(counts: np.ndarray, removed: Optional[int] = None) -> float:
+    """Probability of reaching conversion from start, optionally with one state sending everything to null"""
+    counts = counts.astype(float)
+    if removed is not None:
+        counts[removed] = 0
+        counts[removed, NULL] = 1
+    totals = counts.sum(axis=1, keepdims=True)
+    probabilities = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+    transient = np.r_[START, np.arange(FIRST_STATE, len(counts))]
+    q = probabilities[np.ix_(transient, transient)]
+    r = probabilities[transient, CONVERSION]
+    absorbed = np.linalg.lstsq(np.eye(len(transient)) - q, r, rcond=None)[0]
+    return float(absorbed[0])
+
+
+def removal_effects(counts: np.ndarray) -> np.ndarray:
+    """Relative drop in conversion probability when each key's state is removed"""
+    base = _conversion_probability(counts)
+    if base <= 0:
+        return np.zeros(len(counts) - FIRST_STATE)
+    return np.array([1 - _conversion_probability(counts, state) / base
+                     for state in range(FIRST_STATE, len(counts))])
+
+
+def _keys(paths: TouchpointPaths, by: str) -> Tuple[np.ndarray, List]:
+    """Key code per touch and the key labels"""
+    if by == 'channel':
+        return paths.channel, paths.channels
+    if by == 'campaign':
+        labels, codes = np.unique(paths.campaign, return_inverse=True)
+        return codes, labels.tolist()
+    raise ValueError(f"Unknown breakdown: {by}. Use 'channel' or 'campaign'")
+
+
+def _shard_totals(paths: TouchpointPaths, keys: np.ndarray, num_keys: int, models: List[str],
+                  half_life_days: float, position_weights: Tuple[float, float]) -> Dict[str, np.ndarray]:
+    """Attributed conversions and value per key for one shard, plus its Markov transition counts"""
+    path, _, _ = _touch_index(paths)
+    conversions = paths.converted.astype(float)[path]
+    value = (paths.value * paths.converted)[path]
+    totals = {}
+    for model in models:
+        if model == 'markov':
+            totals['markov'] = transition_counts(paths, keys, num_keys)
+            continue
+        weights = touch_weights(paths, model, half_life_days, position_weights)
+        totals[f'{model}_conversions'] = np.bincount(keys, weights=weights * conversions, minlength=num_keys)
+        totals[f'{model}_value'] = np.bincount(keys, weights=weights * value, minlength=num_keys)
+    return totals
+
+
+def attribute(paths: TouchpointPaths, models: Sequence[str] = MODELS, by: str = 'channel',
+              workers: Optional[int] = None, shard_size: int = DEFAULT_SHARD_SIZE,
+              half_life_days: float = DEFAULT_HALF_LIFE_DAYS,
+              position_weights: Tuple[float, float] = DEFAULT_POSITION_WEIGHTS) -> pd.DataFrame:
+    """
+    Attributed conversions and conversion value per channel or campaign, for each model
+
+    Paths are split into shards; every shard reduces to per-key totals and
+    Markov transition counts, which add up across shards, so the work runs
+    on a process pool when workers > 1. Markov credit is the removal effect
+    of each key, normalised to share out the total conversions and value.
+
+    Args:
+        paths: Touchpoint paths
+        models: Models to run (default: all of MODELS)
+        by: 'channel' (CHANNEL_CONFIG keys) or 'campaign'
+        workers: Worker processes (default: CPU count; 1 runs in-process)
+        shard_size: Paths per shard
+        half_life_days: Time-decay half-life
+        position_weights: Position-based credit of the first and last touch
+
+    Returns:
+        One row per key with <model>_conversions and <model>_value columns
+    """
+    models = list(models)
+    unknown = set(models) - set(MODELS)
+    if unknown:
+        raise ValueError(f"Unknown attribution models: {sorted(unknown)}. Use any of {MODELS}")
+    keys, labels = _keys(paths, by)
+    workers = workers or os.cpu_count() or 1
+    bounds = list(range(0, len(paths), shard_size)) + [len(paths)]
+    shards = [(paths.slice(start, stop), keys[paths.offsets[start]:paths.offsets[stop]])
+              for start, stop in zip(bounds[:-1], bounds[1:])]
+    args = [(shard, shard_keys, len(labels), models, half_life_days, position_weights)
+            for shard, shard_keys in shards]
+    if workers <= 1 or len(shards) <= 1:
+        results = [_shard_totals(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+            results = list(pool.map(_shard_totals, *zip(*args)))
+
+    totals = {name: sum(result[name] for result in results) for name in results[0]} if results else {}
+    result = pd.DataFrame(index=pd.Index(labels, name=by))
+    # With no paths there are no shards: every key gets zero credit
+    zeros = np.zeros(len(labels))
+    for model in models:
+        if model == 'markov':
+            effects = np.clip(removal_effects(totals['markov']), 0, None) if 'markov' in totals else zeros
+            share = effects / effects.sum() if effects.sum() > 0 else zeros
+            result['markov_conversions'] = share * paths.converted.sum()
+            result['markov_value'] = share * (paths.value * paths.converted).sum()
+            result['markov_removal_effect'] = effects
+        else:
+            result[f'{model}_conversions'] = totals.get(f'{model}_conversions', zeros)
+            result[f'{model}_value'] = totals.get(f'{model}_value', zeros)
+    return result.reset_index()
@@ -0,0 +1,498 @@
+"""
+Storage Backends Module
+Supabase (remote) and SQLite (embedded, offline) backends behind one interface
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import pandas as pd
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from instrumentation import propagate, record
+from schema import encode_for_text
+from storage import dataset_path, detect_format, read_dataset
+
+Filters = List[Tuple[str, str, object]]
+
+# Primary keys, also the stable ordering used for pagination
+PRIMARY_KEYS = {
+    'campaigns': 'campaign_id',
+    'daily_performance': 'performance_id',
+    'customers': 'customer_id',
+    'transactions': 'transaction_id',
+    'ab_tests': 'test_id'
+}
+
+# Conflict target for upserts. daily_performance files carry no
+# performance_id, so their rows are matched on UNIQUE(date, campaign_id).
+UPSERT_KEYS = dict(PRIMARY_KEYS, daily_performance='date,campaign_id')
+
+# Tables in foreign key order (parents first)
+TABLE_ORDER = ['campaigns', 'daily_performance', 'customers', 'transactions', 'ab_tests']
+
+# Foreign key used to embed a parent resource: (table, resource) -> column
+FOREIGN_KEYS = {
+    ('daily_performance', 'campaigns'): 'campaign_id',
+    ('customers', 'campaigns'): 'campaign_id',
+    ('transactions', 'customers'): 'customer_id',
+    ('ab_tests', 'campaigns'): 'campaign_id'
+}
+
+SCHEMA_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', '..', '..', '..', 'sql', 'mixed-marketing-analytics', 'schema.sql'
+))
+
+# Rows requested per page. PostgREST caps every response (1000 rows by
+# default), so a single select('*') silently truncates larger tables.
+PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))
+
+# Maximum number of pages fetched concurrently
+MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "8"))
+
+
+class Backend(ABC):
+    """
+    Interface used by data_acquisition and the importer
+
+    Filters are lists of (operator, column, value) using PostgREST operator
+    names: eq, neq, gt, gte, lt, lte and in_.
+    """
+
+    name = 'backend'
+    # Whether queries cross the network (and so are worth caching locally)
+    remote = False
+
+    @abstractmethod
+    def select(self, table: str, columns: Optional[List[str]] = None,
+               filters: Optional[Filters] = None,
+               embed: Optional[Tuple[str, List[str]]] = None) -> pd.DataFrame:
+        """
+        Fetch every matching row in primary key order
+
+        Args:
+            table: Table name
+            columns: Columns to return (default: all)
+            filters: Optional filters
+            embed: Optional (parent table, columns) joined through the foreign key,
+                returned as extra columns
+        """
+
+    @abstractmethod
+    def rpc(self, function: str, params: dict) -> pd.DataFrame:
+        """Call one of the SQL functions from marketing_analytics.sql"""
+
+    @abstractmethod
+    def insert(self, table: str, records: List[dict]):
+        """Insert a batch of rows"""
+
+    @abstractmethod
+    def upsert(self, table: str, records: List[dict], on_conflict: str):
+        """Insert a batch of rows, updating rows that collide on the on_conflict columns"""
+
+    @abstractmethod
+    def delete(self, table: str, filters: Filters):
+        """Delete matching rows"""
+
+
+def _record_transfer(response):
+    """httpx response hook adding request and response sizes to the current span"""
+    response.read()
+    record(bytes_in=len(response.content), bytes_out=len(response.request.content))
+
+
+def _flatten_embedded(df: pd.DataFrame, resource: str) -> pd.DataFrame:
+    """Expand an embedded resource column ({'channel': ...}) into regular columns"""
+    if resource not in df.columns:
+        return df
+    embedded = pd.DataFrame(df.pop(resource).map(lambda value: value or {}).tolist(), index=df.index)
+    return pd.concat([df, embedded], axis=1)
+
+
+class SupabaseBackend(Backend):
+    """
+    Supabase/PostgREST backend
+
+    The client is created on first use, so importing a module that holds this
+    backend needs neither credentials nor network access.
+    """
+
+    name = 'supabase'
+    remote = True
+
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None,
+                 page_size: Optional[int] = None, max_workers: Optional[int] = None):
+        """
+        Args:
+            url: Project URL, defaults to NEXT_PUBLIC_SUPABASE_URL
+            key: Service role key, defaults to SUPABASE_SERVICE_ROLE_KEY
+            page_size: Rows per request, defaults to PAGE_SIZE
+            max_workers: Concurrent page requests, defaults to MAX_WORKERS
+        """
+        self._url = url
+        self._key = key
+        self.page_size = page_size or PAGE_SIZE
+        self.max_workers = max_workers or MAX_WORKERS
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Supabase client, created on first access"""
+        with self._lock:
+            if self._client is None:
+                from supabase import create_client
+
+                url = self._url or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+                key = self._key or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+                if not url or not key:
+                    raise ValueError("Missing Supabase credentials. Check .env.local file.")
+                self._client = create_client(url, key)
+                self._client.postgrest.session.event_hooks['response'].append(_record_transfer)
+            return self._client
+
+    @staticmethod
+    def _apply_filters(query, filters: Optional[Filters]):
+        for operator, column, value in filters or []:
+            query = getattr(query, operator)(column, value)
+        return query
+
+    def select(self, table, columns=None, filters=None, embed=None):
+        """
+        Fetch every matching row, one page per request
+
+        The first page also asks for the exact row count; the remaining pages
+        are then requested concurrently and concatenated in primary key order.
+        """
+        select = ','.join(columns) if columns else '*'
+        if embed is not None:
+            resource, embedded_columns = embed
+            select = f"{select},{resource}({','.join(embedded_columns)})"
+        page_size = self.page_size
+
+        def page(start: int, size: int, count: Optional[str] = None):
+            query = self.client.table(table).select(select, count=count)
+            query = self._apply_filters(query, filters)
+            return query.order(PRIMARY_KEYS[table]).range(start, start + size - 1).execute()
+
+        first = page(0, page_size, count='exact')
+        rows = list(first.data)
+        total = first.count if first.count is not None else len(rows)
+
+        # The server may cap pages below the requested size; follow its limit
+        if 0 < len(rows) < min(page_size, total):
+            page_size = len(rows)
+
+        offsets = range(len(rows), total, page_size)
+        if offsets:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(offsets))) as pool:
+                for response in pool.map(propagate(lambda start: page(start, page_size)), offsets):
+                    rows.extend(response.data)
+
+        df = pd.DataFrame(rows)
+        if embed is not None:
+            df = _flatten_embedded(df, embed[0])
+        return df
+
+    def rpc(self, function, params):
+        return pd.DataFrame(self.client.rpc(function, params).execute().data)
+
+    def insert(self, table, records):
+        self.client.table(table).insert(records).execute()
+
+    def upsert(self, table, records, on_conflict):
+        self.client.table(table).upsert(records, on_conflict=on_conflict).execute()
+
+    def delete(self, table, filters):
+        self._apply_filters(self.client.table(table).delete(), filters).execute()
+
+
+# SQLite versions of the functions in marketing_analytics.sql
+LOCAL_FUNCTIONS = {
+    'calculate_channel_metrics': """
+        SELECT
+          c.channel AS channel,
+          SUM(dp.spend) AS total_spend,
+          SUM(dp.revenue) AS total_revenue,
+          SUM(dp.conversions) AS total_conversions,
+          ROUND(SUM(dp.revenue) / NULLIF(SUM(dp.spend), 0), 2) AS roas,
+          ROUND(SUM(dp.spend) / NULLIF(SUM(dp.conversions), 0), 2) AS cac,
+          ROUND(CAST(SUM(dp.clicks) AS REAL) / NULLIF(SUM(dp.impressions), 0) * 100, 2) AS ctr,
+          ROUND(CAST(SUM(dp.conversions) AS REAL) / NULLIF(SUM(dp.clicks), 0) * 100, 2) AS conversion_rate
+        FROM campaigns c
+        JOIN daily_performance dp ON c.campaign_id = dp.campaign_id
+        WHERE dp.date BETWEEN :p_start_date AND :p_end_date
+        GROUP BY c.channel
+        ORDER BY roas DESC
+    """,
+    'calculate_customer_ltv': """
+        SELECT COALESCE(SUM(order_value), 0) AS calculate_customer_ltv
+        FROM transactions
+        WHERE customer_id = :p_customer_id
+    """,
+    'cohort_retention_analysis': """
+        WITH params AS (
+          SELECT
+            strftime('%Y-%m-01', :p_cohort_month) AS m0,
+            date(strftime('%Y-%m-01', :p_cohort_month), '+1 month') AS m1,
+            date(strftime('%Y-%m-01', :p_cohort_month), '+2 months') AS m2,
+            date(strftime('%Y-%m-01', :p_cohort_month), '+3 months') AS m3
+        ),
+        cohort AS (
+          SELECT customer_id
+          FROM customers, params
+          WHERE strftime('%Y-%m-01', acquisition_date) = params.m0
+        ),
+        monthly_revenue AS (
+          SELECT
+            c.customer_id,
+            strftime('%Y-%m-01', t.transaction_date) AS transaction_month,
+            SUM(t.order_value) AS revenue
+          FROM cohort c
+          JOIN transactions t ON c.customer_id = t.customer_id
+          GROUP BY c.customer_id, strftime('%Y-%m-01', t.transaction_date)
+        )
+        SELECT
+          params.m0 AS cohort_month,
+          COUNT(DISTINCT cohort.customer_id) AS customers_acquired,
+          COALESCE(SUM(CASE WHEN transaction_month = params.m0 THEN revenue END), 0) AS month_0_revenue,
+          COALESCE(SUM(CASE WHEN transaction_month = params.m1 THEN revenue END), 0) AS month_1_revenue,
+          COALESCE(SUM(CASE WHEN transaction_month = params.m2 THEN revenue END), 0) AS month_2_revenue,
+          COALESCE(SUM(CASE WHEN transaction_month = params.m3 THEN revenue END), 0) AS month_3_revenue,
+          ROUND(CAST(COUNT(DISTINCT CASE WHEN transaction_month = params.m1 THEN monthly_revenue.customer_id END) AS REAL) /
+            NULLIF(COUNT(DISTINCT cohort.customer_id), 0) * 100, 2) AS retention_rate_month_1,
+          ROUND(CAST(COUNT(DISTINCT CASE WHEN transaction_month = params.m2 THEN monthly_revenue.customer_id END) AS REAL) /
+            NULLIF(COUNT(DISTINCT cohort.customer_id), 0) * 100, 2) AS retention_rate_month_2,
+          ROUND(CAST(COUNT(DISTINCT CASE WHEN transaction_month = params.m3 THEN monthly_revenue.customer_id END) AS REAL) /
+            NULLIF(COUNT(DISTINCT cohort.customer_id), 0) * 100, 2) AS retention_rate_month_3
+        FROM cohort
+        CROSS JOIN params
+        LEFT JOIN monthly_revenue ON cohort.customer_id = monthly_revenue.customer_id
+        GROUP BY params.m0
+    """,
+    'attribution_model_comparison': """
+        WITH touches AS (
+          SELECT
+            cu.customer_id,
+            c.channel,
+            ROW_NUMBER() OVER (PARTITION BY cu.customer_id ORDER BY cu.acquisition_date) AS first_rank,
+            ROW_NUMBER() OVER (PARTITION BY cu.customer_id ORDER BY cu.acquisition_date DESC) AS last_rank,
+            COUNT(*) OVER (PARTITION BY cu.customer_id) AS touchpoints
+          FROM customers cu
+          JOIN campaigns c ON cu.campaign_id = c.campaign_id
+          WHERE cu.acquisition_date BETWEEN :p_start_date AND :p_end_date
+        ),
+        first_touch AS (
+          SELECT channel, COUNT(*) AS conversions FROM touches WHERE first_rank = 1 GROUP BY channel
+        ),
+        last_touch AS (
+          SELECT channel, COUNT(*) AS conversions FROM touches WHERE last_rank = 1 GROUP BY channel
+        ),
+        linear AS (
+          SELECT channel, SUM(1.0 / touchpoints) AS conversions
+          FROM (SELECT DISTINCT customer_id, channel, touchpoints FROM touches)
+          GROUP BY channel
+        )
+        SELECT
+          channels.channel AS channel,
+          COALESCE(first_touch.conversions, 0) AS first_touch_conversions,
+          COALESCE(last_touch.conversions, 0) AS last_touch_conversions,
+          linear.conversions AS linear_conversions
+        FROM (SELECT DISTINCT channel FROM campaigns) AS channels
+        LEFT JOIN first_touch ON first_touch.channel = channels.channel
+        LEFT JOIN last_touch ON last_touch.channel = channels.channel
+        LEFT JOIN linear ON linear.channel = channels.channel
+        ORDER BY last_touch_conversions DESC
+    """
+}
+
+_SQL_OPERATORS = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+
+def translate_schema(sql: str) -> List[str]:
+    """Turn the PostgreSQL DDL in schema.sql into SQLite statements"""
+    sql = re.sub(r'--[^\n]*', '', sql)
+    sql = re.sub(r'\bSERIAL PRIMARY KEY\b', 'INTEGER PRIMARY KEY', sql)
+    sql = re.sub(r'\bNOW\(\)', 'CURRENT_TIMESTAMP', sql)
+    statements = [statement.strip() for statement in sql.split(';')]
+    return [statement for statement in statements
+            if statement and not statement.upper().startswith('COMMENT ON')]
+
+
+class LocalBackend(Backend):
+    """
+    Embedded SQLite backend for offline work
+
+    Creates the tables from schema.sql and can load the generator's CSV or
+    Parquet output, so the notebooks and analytics run without the remote
+    service and without a round trip per query.
+    """
+
+    name = 'local'
+    remote = False
+
+    def __init__(self, path: str = ':memory:', schema_path: str = SCHEMA_PATH):
+        """
+        Args:
+            path: SQLite database file, or ':memory:'
+            schema_path: schema.sql used to create the tables in a new database
+        """
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        existing = self._conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        if not existing:
+            with open(schema_path) as f:
+                with self._conn:
+                    for statement in translate_schema(f.read()):
+                        self._conn.execute(statement)
+        # SQLite stores 0.0 in a DECIMAL column as integer 0 and booleans as
+        # 0/1, so both are cast back on the way out
+        self._column_types = {
+            table: {row[1]: row[2].upper().split('(')[0]
+                    for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for table in PRIMARY_KEYS
+        }
+
+    @classmethod
+    def from_files(cls, directory: str, path: str = ':memory:', suffix: str = '') -> 'LocalBackend':
+        """
+        Create a backend and load every dataset found in a directory
+
+        Args:
+            directory: Generator output (e.g. scripts/data) or notebook outputs
+            path: SQLite database file, or ':memory:'
+            suffix: Dataset name suffix, e.g. '_clean' for notebook outputs
+        """
+        backend = cls(path)
+        backend.load_directory(directory, suffix)
+        return backend
+
+    def load_directory(self, directory: str, suffix: str = ''):
+        """Load <table><suffix> datasets (CSV or Parquet) in foreign key order"""
+        for table in TABLE_ORDER:
+            name = f"{table}{suffix}"
+            if not os.path.exists(dataset_path(directory, name, detect_format(directory, name))):
+                continue
+            self.load_frame(table, read_dataset(directory, name))
+
+    def load_frame(self, table: str, df: pd.DataFrame):
+        """Upsert a DataFrame, keeping only columns the table has, so loading twice doesn't duplicate rows"""
+        df = df[[column for column in df.columns if column in self._column_types[table]]].copy()
+        df = encode_for_text(df)
+        for column in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[column]):
+                df[column] = df[column].dt.strftime('%Y-%m-%d')
+        df = df.astype(object).where(df.notna(), None)
+        self.upsert(table, df.to_dict('records'), on_conflict=UPSERT_KEYS[table])
+
+    def _where(self, table: str, filters: Optional[Filters]) -> Tuple[str, list]:
+        """Build a WHERE clause and its parameters"""
+        clauses = []
+        params = []
+        for operator, column, value in filters or []:
+            if operator == 'in_':
+                values = list(value)
+                clauses.append(f"{table}.{column} IN ({', '.join('?' for _ in values)})")
+                params.extend(values)
+            else:
+                clauses.append(f"{table}.{column} {_SQL_OPERATORS[operator]} ?")
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def _query(self, sql: str, params) -> pd.DataFrame:
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def select(self, table, columns=None, filters=None, embed=None):
+        select = ', '.join(f"{table}.{column}" for column in columns) if columns else f"{table}.*"
+        join = ''
+        if embed is not None:
+            resource, embedded_columns = embed
+            key = FOREIGN_KEYS[(table, resource)]
+            select += ''.join(f", {resource}.{column} AS {column}" for column in embedded_columns)
+            join = f" LEFT JOIN {resource} ON {resource}.{key} = {table}.{key}"
+        where, params = self._where(table, filters)
+        df = self._query(f"SELECT {select} FROM {table}{join}{where} ORDER BY {table}.{PRIMARY_KEYS[table]}",
+                         params)
+        column_types = dict(self._column_types[table])
+        if embed is not None:
+            column_types.update({column: self._column_types[embed[0]][column] for column in embed[1]})
+        for column, column_type in column_types.items():
+            if column in df.columns and column_type == 'BOOLEAN':
+                df[column] = df[column].astype(bool)
+            elif column in df.columns and column_type == 'DECIMAL':
+                df[column] = df[column].astype(float)
+        return df
+
+    def rpc(self, function, params):
+        if function not in LOCAL_FUNCTIONS:
+            raise ValueError(f"Unknown function {function!r}")
+        return self._query(LOCAL_FUNCTIONS[function], params)
+
+    def insert(self, table, records):
+        if not records:
+            return
+        columns = list(records[0].keys())
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        with self._lock, self._conn:
+            self._conn.executemany(sql, [tuple(record[column] for column in columns) for record in records])
+
+    def upsert(self, table, records, on_conflict):
+        if not records:
+            return
+        columns = list(records[0].keys())
+        conflict_columns = [column.strip() for column in on_conflict.split(',')]
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column not in conflict_columns)
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+               f"ON CONFLICT ({', '.join(conflict_columns)}) DO "
+               + (f"UPDATE SET {updates}" if updates else "NOTHING"))
+        with self._lock, self._conn:
+            self._conn.executemany(sql, [tuple(record[column] for column in columns) for record in records])
+
+    def delete(self, table, filters):
+        where, params = self._where(table, filters)
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {table}{where}", params)
+
+
+_backend: Optional[Backend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> Backend:
+    """
+    Return the active backend, creating it on first use
+
+    MARKETING_BACKEND selects it: 'supabase' (default) or 'local'. The local
+    backend opens MARKETING_LOCAL_DB (default: in memory) and, when set, loads
+    the datasets in MARKETING_LOCAL_DATA.
+    """
+    global _backend
+    if _backend is None:
+        # data_acquisition calls this from worker threads; only one may create it
+        with _backend_lock:
+            if _backend is None:
+                kind = os.getenv("MARKETING_BACKEND", "supabase")
+                if kind == 'local':
+                    backend = LocalBackend(os.getenv("MARKETING_LOCAL_DB", ":memory:"))
+                    if os.getenv("MARKETING_LOCAL_DATA"):
+                        backend.load_directory(os.getenv("MARKETING_LOCAL_DATA"),
+                                               os.getenv("MARKETING_LOCAL_SUFFIX", ""))
+                    _backend = backend
+                elif kind == 'supabase':
+                    _backend = SupabaseBackend()
+                else:
+                    raise ValueError(f"Unknown MARKETING_BACKEND {kind!r}, expected 'supabase' or 'local'")
+    return _backend
+
+
+def set_backend(backend: Backend):
+    """Use a specific backend from now on, e.g. LocalBackend.from_files('scripts/data')"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,204 @@
+"""
+Table Cache Module
+Local Parquet cache for query results with incremental watermark refresh
+"""
+
+import json
+import os
+import re
+import time
+import pandas as pd
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Cached entries older than this are dropped and fetched again in full
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+# Least recently used entries are evicted once the cache grows past this
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'marketing_analytics')
+
+WATERMARK_COLUMN = 'created_at'
+
+Filters = List[Tuple[str, str, str]]
+
+
+def parquet_available() -> bool:
+    """Whether pandas can read and write Parquet here"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _estimate_payload_bytes(df: pd.DataFrame, sample_rows: int = 1000) -> int:
+    """Approximate size of the JSON the server sends for these rows, from a sample"""
+    if not len(df):
+        return 0
+    sample = df.head(sample_rows)
+    return int(len(sample.to_json(orient='records', date_format='iso')) * len(df) / len(sample))
+
+
+class TableCache:
+    """
+    On-disk cache of table fetches, keyed by table and filters
+
+    A cached entry is refreshed by fetching only rows whose created_at is at
+    least the newest one already cached and merging in those whose primary
+    key isn't cached yet. That only picks up inserted rows: rows updated or
+    deleted in place stay as cached until the entry is invalidated (the
+    importer does this for every table it writes) or expires after
+    ttl_seconds. The least recently used entries are evicted once the cache
+    exceeds max_bytes.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.rows_refreshed = 0
+        self.bytes_saved = 0
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, 'index.json')
+        self._index = self._load_index()
+
+    def _load_index(self) -> Dict[str, dict]:
+        """Read the entry index, starting empty if it is missing or unreadable"""
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        """Write the entry index atomically"""
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, self._index_path)
+
+    @staticmethod
+    def key(table: str, filters: Optional[Filters] = None) -> str:
+        """Cache key for a table and its filters, also used as the file name"""
+        parts = [table] + [f"{column}.{operator}.{value}" for operator, column, value in sorted(filters or [])]
+        return re.sub(r'[^A-Za-z0-9_.=-]', '_', '__'.join(parts))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def _remove(self, key: str):
+        """Delete one entry and its file"""
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _expired(self, entry: dict) -> bool:
+        return time.time() - entry['fetched_at'] > self.ttl_seconds
+
+    def fetch(self, table: str, filters: Optional[Filters], primary_key: str,
+              fetch: Callable[[Filters], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Return a table through the cache
+
+        Args:
+            table: Table name
+            filters: Filters applied to the query, part of the cache key
+            primary_key: Column used to merge refreshed rows into cached ones
+            fetch: Function that runs the query for a list of filters
+        """
+        filters = list(filters or [])
+        key = self.key(table, filters)
+        entry = self._index.get(key)
+
+        if entry is not None and (self._expired(entry) or not os.path.exists(self._path(key))):
+            self._remove(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            df = fetch(filters)
+            entry = {'table': table, 'fetched_at': time.time()}
+        else:
+            self.hits += 1
+            cached = pd.read_parquet(self._path(key))
+            if entry['watermark'] is not None:
+                # gte, not gt: a batch of rows can share the newest created_at
+                # with rows cached before the rest of the batch arrived
+                delta = fetch(filters + [('gte', WATERMARK_COLUMN, entry['watermark'])])
+                delta = delta[~delta[primary_key].isin(cached[primary_key])]
+                self.bytes_saved += entry['payload_bytes']
+            else:
+                delta = fetch(filters)
+            self.rows_refreshed += len(delta)
+            if not len(delta):
+                entry['last_access'] = time.time()
+                self._save_index()
+                return cached
+            df = pd.concat([cached, delta], ignore_index=True)
+            df = df.drop_duplicates(primary_key, keep='last').sort_values(primary_key, ignore_index=True)
+
+        self._store(key, entry, df)
+        return df
+
+    def _store(self, key: str, entry: dict, df: pd.DataFrame):
+        """Write an entry to disk and update its bookkeeping"""
+        path = self._path(key)
+        df.to_parquet(path, index=False)
+        watermark = None
+        if WATERMARK_COLUMN in df.columns and len(df):
+            watermark = str(df[WATERMARK_COLUMN].max())
+        entry.update({
+            'watermark': watermark,
+            'rows': len(df),
+            'bytes': os.path.getsize(path),
+            'payload_bytes': _estimate_payload_bytes(df),
+            'last_access': time.time()
+        })
+        self._index[key] = entry
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        for key in [k for k, entry in self._index.items() if self._expired(entry)]:
+            self._remove(key)
+        by_access = sorted(self._index.items(), key=lambda item: item[1]['last_access'])
+        total = sum(entry['bytes'] for _, entry in by_access)
+        for key, entry in by_access:
+            if total <= self.max_bytes:
+                break
+            total -= entry['bytes']
+            self._remove(key)
+        self._save_index()
+
+    def invalidate(self, table: Optional[str] = None):
+        """Drop every cached entry, or only those of one table"""
+        for key in [k for k, entry in self._index.items() if table is None or entry['table'] == table]:
+            self._remove(key)
+        self._save_index()
+
+    def stats(self) -> dict:
+        """Hit rate, refreshed rows and transfer saved so far in this session"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'rows_refreshed': self.rows_refreshed,
+            'bytes_saved': self.bytes_saved,
+            'entries': len(self._index),
+            'disk_bytes': sum(entry['bytes'] for entry in self._index.values())
+        }
+
+    def report(self) -> str:
+        """One-line summary of stats()"""
+        stats = self.stats()
+        return (f"Cache: {stats['hits']} hits / {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%} hit rate), {stats['rows_refreshed']:,} rows refreshed, "
+                f"~{stats['bytes_saved'] / 1024 ** 2:,.1f} MB transfer saved")
@@ -0,0 +1,248 @@
+"""
+Cohort Analysis Module
+Acquisition cohort x months-since-acquisition revenue and retention, built in one pass
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Union
+
+# Customer/month pairs are packed into one int64 key: customer_id << MONTH_BITS | month
+MONTH_BITS = 20
+
+
+def month_number(dates) -> np.ndarray:
+    """Months since 1970-01 for each date"""
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[M]').astype(np.int64)
+
+
+def month_start(numbers) -> pd.DatetimeIndex:
+    """First day of each month number"""
+    return pd.to_datetime(np.asarray(numbers, dtype=np.int64).astype('datetime64[M]'))
+
+
+class CohortMatrix:
+    """
+    Revenue, active customers and retention per acquisition cohort and month offset
+
+    State is a dense (group, cohort month, months since acquisition) array
+    for revenue and for active customers, plus each customer's cohort and
+    group indexed by customer_id. New customers and transactions are folded
+    in with bincount, so refreshing the triangle never rescans history.
+    A customer counts as active in a month once, however many orders they
+    place; transactions at or below the highest transaction_id already
+    applied are skipped.
+    """
+
+    def __init__(self, by: Optional[Union[str, List[str]]] = None):
+        """
+        Args:
+            by: Optional customer column(s) to split cohorts by, e.g. 'channel'
+                or ['channel', 'customer_segment']
+        """
+        self.by = [by] if isinstance(by, str) else list(by or [])
+        self.groups: List[tuple] = []
+        self._group_codes: Dict[tuple, int] = {}
+        self.base: Optional[int] = None
+        self.last_month: Optional[int] = None
+        self.last_transaction_id = 0
+        self.customer_cohort = np.full(0, -1, dtype=np.int64)
+        self.customer_group = np.zeros(0, dtype=np.int64)
+        self.sizes = np.zeros((0, 0), dtype=np.int64)
+        self.revenue_sum = np.zeros((0, 0, 0))
+        self.active_count = np.zeros((0, 0, 0), dtype=np.int64)
+        self.seen = np.empty(0, dtype=np.int64)
+
+    @property
+    def span(self) -> int:
+        return self.sizes.shape[1]
+
+    def _grow_customers(self, max_id: int):
+        if max_id < len(self.customer_cohort):
+            return
+        extra = max(max_id + 1, 2 * len(self.customer_cohort)) - len(self.customer_cohort)
+        self.customer_cohort = np.r_[self.customer_cohort, np.full(extra, -1, dtype=np.int64)]
+        self.customer_group = np.r_[self.customer_group, np.zeros(extra, dtype=np.int64)]
+
+    def _resize(self, first: int, last: int):
+        """Extend the cohort and offset axes to cover months first..last and all groups"""
+        base = first if self.base is None else min(self.base, first)
+        end = last if self.last_month is None else max(self.last_month, last)
+        span = end - base + 1
+        before = 0 if self.base is None else self.base - base
+        groups = len(self.groups)
+        if (before, span, groups) != (0, self.span, self.sizes.shape[0]):
+            old_groups, old_span = self.sizes.shape
+            sizes = np.zeros((groups, span), dtype=np.int64)
+            revenue = np.zeros((groups, span, span))
+            active = np.zeros((groups, span, span), dtype=np.int64)
+            # Cohorts shift by the months added in front; offsets are relative and stay put
+            sizes[:old_groups, before:before + old_span] = self.sizes
+            revenue[:old_groups, before:before + old_span, :old_span] = self.revenue_sum
+            active[:old_groups, before:before + old_span, :old_span] = self.active_count
+            self.sizes, self.revenue_sum, self.active_count = sizes, revenue, active
+        self.base, self.last_month = base, end
+
+    def _codes(self, customers: pd.DataFrame) -> np.ndarray:
+        """Group code per customer, registering new groups"""
+        if not self.by:
+            if not self.groups:
+                self.groups.append(())
+                self._group_codes[()] = 0
+            return np.zeros(len(customers), dtype=np.int64)
+        keys = customers[self.by].astype(str)
+        labels, index = np.unique(keys.to_numpy(dtype=str), axis=0, return_inverse=True)
+        mapping = []
+        for label in map(tuple, labels):
+            if label not in self._group_codes:
+                self._group_codes[label] = len(self.groups)
+                self.groups.append(label)
+            mapping.append(self._group_codes[label])
+        return np.asarray(mapping, dtype=np.int64)[index.ravel()]
+
+    def add_customers(self, customers: pd.DataFrame) -> int:
+        """Register customers in their acquisition cohort; already known customers are skipped"""
+        if not len(customers):
+            return 0
+        ids = customers['customer_id'].to_numpy(dtype=np.int64)
+        self._grow_customers(int(ids.max()))
+        new = self.customer_cohort[ids] < 0
+        customers, ids = customers[new], ids[new]
+        if not len(ids):
+            return 0
+        cohorts = month_number(customers['acquisition_date'])
+        groups = self._codes(customers)
+        self._resize(int(cohorts.min()), int(cohorts.max()))
+        self.customer_cohort[ids] = cohorts
+        self.customer_group[ids] = groups
+        self.sizes += np.bincount(groups * self.span + (cohorts - self.base),
+                                  minlength=self.sizes.size).reshape(self.sizes.shape)
+        return len(ids)
+
+    def add_transactions(self, transactions: pd.DataFrame) -> int:
+        """
+        Fold a batch of transactions into the revenue and active-customer arrays
+
+        Transactions of customers not registered yet, or dated before the
+        customer's acquisition month, are ignored.
+
+        Returns:
+            Number of transactions applied
+        """
+        if not len(transactions):
+            return 0
+        batch = transactions[transactions['transaction_id'] > self.last_transaction_id]
+        if not len(batch):
+            return 0
+        self.last_transaction_id = int(batch['transaction_id'].max())
+        ids = batch['customer_id'].to_numpy(dtype=np.int64)
+        self._grow_customers(int(ids.max()))
+        cohorts = self.customer_cohort[ids]
+        months = month_number(batch['transaction_date'])
+        keep = (cohorts >= 0) & (months >= cohorts)
+        ids, cohorts, months = ids[keep], cohorts[keep], months[keep]
+        if not len(ids):
+            return 0
+        self._resize(int(cohorts.min()), int(months.max()))
+
+        span = self.span
+        cells = (self.customer_group[ids] * span + (cohorts - self.base)) * span + (months - cohorts)
+        values = batch['order_value'].to_numpy(dtype=float)[keep]
+        self.revenue_sum += np.bincount(cells, weights=values,
+                                        minlength=self.revenue_sum.size).reshape(self.revenue_sum.shape)
+
+        # Count each customer once per month, across this and earlier batches
+        keys, first = np.unique((ids << MONTH_BITS) | months, return_index=True)
+        new = ~np.isin(keys, self.seen, assume_unique=True)
+        self.active_count += np.bincount(cells[first[new]],
+                                         minlength=self.active_count.size).reshape(self.active_count.shape)
+        self.seen = np.union1d(self.seen, keys[new])
+        return int(keep.sum())
+
+    def update(self, customers: Optional[pd.DataFrame] = None,
+               transactions: Optional[pd.DataFrame] = None) -> dict:
+        """Add new customers, then new transactions"""
+        return {
+            'customers': self.add_customers(customers) if customers is not None else 0,
+            'transactions': self.add_transactions(transactions) if transactions is not None else 0,
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Long format: one row per group, cohort month and observed month offset
+
+        Columns are the `by` columns, cohort_month, months_since_acquisition,
+        customers_acquired, revenue, active_customers and retention_rate (%).
+        """
+        columns = self.by + ['cohort_month', 'months_since_acquisition', 'customers_acquired',
+                             'revenue', 'active_customers', 'retention_rate']
+        if self.base is None:
+            return pd.DataFrame(columns=columns)
+        span = self.span
+        group, cohort, offset = np.meshgrid(np.arange(len(self.groups)), np.arange(span), np.arange(span),
+                                            indexing='ij')
+        # Only offsets that have already happened, for cohorts that exist
+        observed = (cohort + offset <= self.last_month - self.base) & (self.sizes[group, cohort] > 0)
+        group, cohort, offset = group[observed], cohort[observed], offset[observed]
+        sizes = self.sizes[group, cohort]
+        active = self.active_count[group, cohort, offset]
+
+        df = pd.DataFrame({column: [self.groups[g][i] for g in group] for i, column in enumerate(self.by)})
+        df['cohort_month'] = month_start(cohort + self.base)
+        df['months_since_acquisition'] = offset
+        df['customers_acquired'] = sizes
+        df['revenue'] = self.revenue_sum[group, cohort, offset]
+        df['active_customers'] = active
+        df['retention_rate'] = active / sizes * 100
+        return df.sort_values(self.by + ['cohort_month', 'months_since_acquisition'], ignore_index=True)
+
+    def matrix(self, metric: str = 'retention_rate') -> pd.DataFrame:
+        """Cohort triangle of one metric: rows are (by columns,) cohort_month, columns months since acquisition"""
+        return self.to_frame().pivot_table(index=self.by + ['cohort_month'], columns='months_since_acquisition',
+                                           values=metric, aggfunc='sum', observed=True)
+
+    def summary(self, months: int = 3) -> pd.DataFrame:
+        """
+        Per-cohort revenue and retention in the shape of cohort_retention_analysis()
+
+        Gives month_0..month_<months>_revenue and retention_rate_month_1..<months>
+        for every cohort at once.
+        """
+        df = self.to_frame()
+        index = self.by + ['cohort_month']
+        result = df.groupby(index, observed=True)['customers_acquired'].first().to_frame()
+        revenue = df.pivot_table(index=index, columns='months_since_acquisition', values='revenue',
+                                 aggfunc='sum', observed=True)
+        retention = df.pivot_table(index=index, columns='months_since_acquisition', values='retention_rate',
+                                   aggfunc='sum', observed=True)
+        for month in range(months + 1):
+            result[f'month_{month}_revenue'] = revenue.get(month, 0.0)
+        for month in range(1, months + 1):
+            result[f'retention_rate_month_{month}'] = retention.get(month, 0.0)
+        return result.fillna(0).round(2).reset_index()
+
+    def save(self, path: str):
+        """Write the state to an .npz file"""
+        np.savez_compressed(
+            path, by=np.asarray(self.by, dtype=str),
+            groups=np.asarray(self.groups, dtype=str).reshape(len(self.groups), len(self.by)),
+            base=-1 if self.base is None else self.base,
+            last_month=-1 if self.last_month is None else self.last_month,
+            last_transaction_id=self.last_transaction_id,
+            customer_cohort=self.customer_cohort, customer_group=self.customer_group,
+            sizes=self.sizes, revenue_sum=self.revenue_sum, active_count=self.active_count, seen=self.seen
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'CohortMatrix':
+        """Read a matrix written by save()"""
+        with np.load(path) as data:
+            matrix = cls(data['by'].tolist())
+            matrix.groups = [tuple(label) for label in data['groups'].tolist()]
+            matrix._group_codes = {label: code for code, label in enumerate(matrix.groups)}
+            matrix.base = None if int(data['base']) < 0 else int(data['base'])
+            matrix.last_month = None if int(data['last_month']) < 0 else int(data['last_month'])
+            matrix.last_transaction_id = int(data['last_transaction_id'])
+            for field in ('customer_cohort', 'customer_group', 'sizes', 'revenue_sum', 'active_count', 'seen'):
+                setattr(matrix, field, data[field])
+        return matrix
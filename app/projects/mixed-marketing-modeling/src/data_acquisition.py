@@ -1,13 +1,22 @@
 """
 Data Acquisition Module
-Functions to query marketing data from Supabase PostgreSQL database
+Functions to query marketing data from Supabase PostgreSQL or a local SQLite copy
 """
 
 import os
 import pandas as pd
-from supabase import create_client, Client
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv, find_dotenv
-from typing import Optional
+from typing import List, Optional, Sequence, Tuple, Union
+
+from attribution import MODELS, TouchpointPaths, attribute
+from backends import MAX_WORKERS, PRIMARY_KEYS, get_backend, set_backend  # noqa: F401
+from cohorts import CohortMatrix
+from instrumentation import propagate, span, traced
+from ltv import CustomerStateStore
+from metrics_cube import MetricsCube
+from schema import apply_schema
+from cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DEFAULT_TTL_SECONDS, TableCache, parquet_available
 
 # Load environment variables
 env_file = find_dotenv('.env.local')
@@ -16,98 +25,140 @@ if env_file:
 else:
     load_dotenv()
 
-# Supabase configuration
-SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+# The backend (Supabase by default, MARKETING_BACKEND=local for an embedded
+# SQLite copy) is created on first query, not at import.
+
+
+def _fetch_all(table: str, filters: Optional[List[Tuple[str, str, str]]] = None,
+               columns: Optional[List[str]] = None,
+               embed: Optional[Tuple[str, List[str]]] = None) -> pd.DataFrame:
+    """
+    Fetch every matching row of a table from the active backend
+    
+    Args:
+        table: Table name
+        filters: Optional list of (operator, column, value), e.g. ('gte', 'date', '2024-01-01')
+        columns: Columns to select (default: all)
+        embed: Optional (parent table, columns) joined in by the backend
+    """
+    with span('fetch.select', table=table) as stage:
+        df = get_backend().select(table, columns=columns, filters=filters, embed=embed)
+        stage.add(rows_out=len(df))
+        return df
+
+
+# Local cache of fetched tables (needs pyarrow; MARKETING_CACHE=0 turns it off)
+CACHE_ENABLED = os.getenv("MARKETING_CACHE", "1") != "0" and parquet_available()
+_cache: Optional[TableCache] = None
+
+
+def get_cache() -> Optional[TableCache]:
+    """Return the shared table cache, creating it on first use (None if disabled)"""
+    global _cache
+    if CACHE_ENABLED and _cache is None:
+        _cache = TableCache(
+            directory=os.getenv("MARKETING_CACHE_DIR", DEFAULT_CACHE_DIR),
+            ttl_seconds=float(os.getenv("MARKETING_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+            max_bytes=int(os.getenv("MARKETING_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        )
+    return _cache if CACHE_ENABLED else None
+
+
+def invalidate_cache(table: Optional[str] = None):
+    """Drop cached results for one table, or for all tables"""
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate(table)
+
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-    raise ValueError("Missing Supabase credentials. Check .env.local file.")
+def cache_stats() -> dict:
+    """Cache hit rate and bytes saved in this session"""
+    cache = get_cache()
+    return cache.stats() if cache is not None else {}
 
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
+def _fetch_table(table: str, filters: Optional[List[Tuple[str, str, str]]] = None,
+                 use_cache: bool = True) -> pd.DataFrame:
+    """Fetch a table through the local cache when it is enabled"""
+    # Only remote backends are worth caching; local queries are already cheap
+    cache = get_cache() if use_cache and get_backend().remote else None
+    if cache is None:
+        return _fetch_all(table, filters)
+    return cache.fetch(table, filters, PRIMARY_KEYS[table], lambda f: _fetch_all(table, f))
 
-def get_campaigns() -> pd.DataFrame:
+
+def _date_filters(column: str, start_date: Optional[str],
+                  end_date: Optional[str]) -> List[Tuple[str, str, str]]:
+    """Build gte/lte filters for an optional date range"""
+    filters = []
+    if start_date:
+        filters.append(('gte', column, start_date))
+    if end_date:
+        filters.append(('lte', column, end_date))
+    return filters
+
+
+@traced('fetch.get_campaigns')
+def get_campaigns(use_cache: bool = True) -> pd.DataFrame:
     """Fetch all campaigns from database"""
-    response = supabase.table('campaigns').select('*').execute()
-    return pd.DataFrame(response.data)
+    return apply_schema(_fetch_table('campaigns', use_cache=use_cache))
 
 
+@traced('fetch.get_daily_performance')
 def get_daily_performance(start_date: Optional[str] = None, 
-                         end_date: Optional[str] = None) -> pd.DataFrame:
+                         end_date: Optional[str] = None,
+                         use_cache: bool = True) -> pd.DataFrame:
     """
     Fetch daily performance data
     
     Args:
         start_date: Optional start date (YYYY-MM-DD)
         end_date: Optional end date (YYYY-MM-DD)
+        use_cache: Serve from the local cache, fetching only newer rows
     """
-    query = supabase.table('daily_performance').select('*')
-    
-    if start_date:
-        query = query.gte('date', start_date)
-    if end_date:
-        query = query.lte('date', end_date)
-    
-    response = query.execute()
-    df = pd.DataFrame(response.data)
-    df['date'] = pd.to_datetime(df['date'])
-    return df
+    df = _fetch_table('daily_performance', _date_filters('date', start_date, end_date), use_cache)
+    return apply_schema(df)
 
 
+@traced('fetch.get_customers')
 def get_customers(start_date: Optional[str] = None,
-                 end_date: Optional[str] = None) -> pd.DataFrame:
+                 end_date: Optional[str] = None,
+                 use_cache: bool = True) -> pd.DataFrame:
     """
     Fetch customer acquisition data
     
     Args:
         start_date: Optional start date (YYYY-MM-DD)
         end_date: Optional end date (YYYY-MM-DD)
+        use_cache: Serve from the local cache, fetching only newer rows
     """
-    query = supabase.table('customers').select('*')
-    
-    if start_date:
-        query = query.gte('acquisition_date', start_date)
-    if end_date:
-        query = query.lte('acquisition_date', end_date)
-    
-    response = query.execute()
-    df = pd.DataFrame(response.data)
-    df['acquisition_date'] = pd.to_datetime(df['acquisition_date'])
-    return df
+    df = _fetch_table('customers', _date_filters('acquisition_date', start_date, end_date), use_cache)
+    return apply_schema(df)
 
 
+@traced('fetch.get_transactions')
 def get_transactions(start_date: Optional[str] = None,
-                    end_date: Optional[str] = None) -> pd.DataFrame:
+                    end_date: Optional[str] = None,
+                    use_cache: bool = True) -> pd.DataFrame:
     """
     Fetch transaction data
     
     Args:
         start_date: Optional start date (YYYY-MM-DD)
         end_date: Optional end date (YYYY-MM-DD)
+        use_cache: Serve from the local cache, fetching only newer rows
     """
-    query = supabase.table('transactions').select('*')
-    
-    if start_date:
-        query = query.gte('transaction_date', start_date)
-    if end_date:
-        query = query.lte('transaction_date', end_date)
-    
-    response = query.execute()
-    df = pd.DataFrame(response.data)
-    df['transaction_date'] = pd.to_datetime(df['transaction_date'])
-    return df
+    df = _fetch_table('transactions', _date_filters('transaction_date', start_date, end_date), use_cache)
+    return apply_schema(df)
 
 
-def get_ab_tests() -> pd.DataFrame:
+@traced('fetch.get_ab_tests')
+def get_ab_tests(use_cache: bool = True) -> pd.DataFrame:
     """Fetch A/B test results"""
-    response = supabase.table('ab_tests').select('*').execute()
-    df = pd.DataFrame(response.data)
-    df['start_date'] = pd.to_datetime(df['start_date'])
-    df['end_date'] = pd.to_datetime(df['end_date'])
-    return df
+    return apply_schema(_fetch_table('ab_tests', use_cache=use_cache))
 
 
+@traced('fetch.get_channel_performance_with_campaigns')
 def get_channel_performance_with_campaigns() -> pd.DataFrame:
     """
     Fetch daily performance joined with campaign details
@@ -127,6 +178,7 @@ def get_channel_performance_with_campaigns() -> pd.DataFrame:
     return merged_df
 
 
+@traced('fetch.get_customer_ltv_data')
 def get_customer_ltv_data() -> pd.DataFrame:
     """
     Fetch customers with their transaction history for LTV analysis
@@ -143,3 +195,186 @@ def get_customer_ltv_data() -> pd.DataFrame:
     )
     
     return merged_df
+
+
+@traced('fetch.get_customer_features')
+def get_customer_features(store: Optional[CustomerStateStore] = None,
+                          store_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Customer-level LTV features, refreshed from new transactions only
+
+    Only transactions above the store's last applied transaction_id are
+    fetched, so a daily refresh no longer re-downloads all history.
+
+    Args:
+        store: Customer state to update (default: load store_path, or start empty)
+        store_path: Optional .npz file the store is loaded from and saved back to
+    """
+    if store is None:
+        store = (CustomerStateStore.load(store_path)
+                 if store_path and os.path.exists(store_path) else CustomerStateStore())
+    new_transactions = _fetch_all('transactions', [('gt', 'transaction_id', store.last_transaction_id)])
+    store.update(new_transactions)
+    if store_path:
+        store.save(store_path)
+    return apply_schema(store.export(get_customers()))
+
+
+# Campaign and customer attributes embedded by the pushdown joins
+CAMPAIGN_JOIN_COLUMNS = ['campaign_name', 'channel', 'target_audience']
+CUSTOMER_JOIN_COLUMNS = ['acquisition_date', 'channel', 'customer_segment', 'first_order_value']
+
+# Bounds used when a date range is left open in RPC calls
+MIN_DATE = '0001-01-01'
+MAX_DATE = '9999-12-31'
+
+
+@traced('fetch.get_channel_performance_pushdown')
+def get_channel_performance_pushdown(start_date: Optional[str] = None,
+                                     end_date: Optional[str] = None,
+                                     columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Daily performance joined with campaign details by the database
+    
+    Same result as get_channel_performance_with_campaigns(), but the join runs
+    server side through an embedded select and only the requested columns are
+    transferred.
+    
+    Args:
+        start_date: Optional start date (YYYY-MM-DD)
+        end_date: Optional end date (YYYY-MM-DD)
+        columns: Optional daily_performance columns to return (default: all)
+    """
+    df = _fetch_all('daily_performance', _date_filters('date', start_date, end_date),
+                    columns=columns, embed=('campaigns', CAMPAIGN_JOIN_COLUMNS))
+    return apply_schema(df)
+
+
+@traced('fetch.get_customer_ltv_pushdown')
+def get_customer_ltv_pushdown(start_date: Optional[str] = None,
+                              end_date: Optional[str] = None,
+                              columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Transactions joined with customer attributes by the database
+    
+    Same result as get_customer_ltv_data(), without downloading the customers
+    table separately.
+    
+    Args:
+        start_date: Optional start date for transactions (YYYY-MM-DD)
+        end_date: Optional end date for transactions (YYYY-MM-DD)
+        columns: Optional transaction columns to return (default: all)
+    """
+    df = _fetch_all('transactions', _date_filters('transaction_date', start_date, end_date),
+                    columns=columns, embed=('customers', CUSTOMER_JOIN_COLUMNS))
+    return apply_schema(df)
+
+
+@traced('fetch.get_channel_metrics')
+def get_channel_metrics(start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> pd.DataFrame:
+    """
+    Channel rollup computed by calculate_channel_metrics() in the database
+    
+    Returns one row per channel with total_spend, total_revenue,
+    total_conversions, roas, cac, ctr and conversion_rate.
+    
+    Args:
+        start_date: Optional start date (YYYY-MM-DD)
+        end_date: Optional end date (YYYY-MM-DD)
+    """
+    return apply_schema(get_backend().rpc('calculate_channel_metrics', {
+        'p_start_date': start_date or MIN_DATE,
+        'p_end_date': end_date or MAX_DATE
+    }))
+
+
+@traced('fetch.get_metrics_cube')
+def get_metrics_cube(start_date: Optional[str] = None,
+                     end_date: Optional[str] = None) -> MetricsCube:
+    """
+    Prefix-summed metrics cube over daily performance, for instant date-range rollups
+
+    cube.query(start, end, by='channel') gives the same totals as
+    get_channel_metrics() for any range without another round trip.
+
+    Args:
+        start_date: Optional start date (YYYY-MM-DD)
+        end_date: Optional end date (YYYY-MM-DD)
+    """
+    return MetricsCube.build(get_daily_performance(start_date, end_date), get_campaigns())
+
+
+@traced('fetch.get_cohort_retention')
+def get_cohort_retention(cohort_months: List[str]) -> pd.DataFrame:
+    """
+    Cohort revenue and retention from cohort_retention_analysis() in the database
+    
+    The function takes one cohort month per call, so the calls are issued
+    concurrently and stacked into one frame.
+    
+    Args:
+        cohort_months: Cohort months (YYYY-MM-DD, any day in the month)
+    """
+    backend = get_backend()
+
+    def cohort(month: str) -> pd.DataFrame:
+        return backend.rpc('cohort_retention_analysis', {'p_cohort_month': month})
+
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(cohort_months)))) as pool:
+        frames = list(pool.map(propagate(cohort), cohort_months))
+    return apply_schema(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame())
+
+
+@traced('fetch.get_cohort_matrix')
+def get_cohort_matrix(by: Optional[Union[str, List[str]]] = None) -> CohortMatrix:
+    """
+    Full cohort x months-since-acquisition matrix, built locally in one pass
+
+    Covers every cohort month at once, unlike get_cohort_retention(); call
+    update() on the result with newer customers and transactions to refresh it.
+
+    Args:
+        by: Optional customer column(s) to split cohorts by, e.g. 'channel'
+    """
+    matrix = CohortMatrix(by)
+    matrix.update(customers=get_customers(), transactions=get_transactions())
+    return matrix
+
+
+@traced('fetch.get_attribution_comparison')
+def get_attribution_comparison(start_date: Optional[str] = None,
+                               end_date: Optional[str] = None) -> pd.DataFrame:
+    """
+    First-touch, last-touch and linear conversions per channel from
+    attribution_model_comparison() in the database
+    
+    Args:
+        start_date: Optional start date (YYYY-MM-DD)
+        end_date: Optional end date (YYYY-MM-DD)
+    """
+    return apply_schema(get_backend().rpc('attribution_model_comparison', {
+        'p_start_date': start_date or MIN_DATE,
+        'p_end_date': end_date or MAX_DATE
+    }))
+
+
+@traced('fetch.get_attribution')
+def get_attribution(start_date: Optional[str] = None,
+                    end_date: Optional[str] = None,
+                    models: Sequence[str] = MODELS,
+                    by: str = 'channel') -> pd.DataFrame:
+    """
+    Multi-touch attribution computed locally over the acquisition journeys
+
+    Adds time-decay, position-based and Markov removal attribution, and a
+    per-campaign breakdown, to what get_attribution_comparison() offers.
+
+    Args:
+        start_date: Optional start date for acquisitions (YYYY-MM-DD)
+        end_date: Optional end date for acquisitions (YYYY-MM-DD)
+        models: Attribution models to run
+        by: 'channel' or 'campaign'
+    """
+    paths = TouchpointPaths.from_customers(get_customers(start_date, end_date))
+    return attribute(paths, models=models, by=by)
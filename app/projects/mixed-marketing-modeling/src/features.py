@@ -0,0 +1,227 @@
+"""
+Performance Features Pipeline
+Incremental marketing metrics, time features and outlier flags for performance_features
+"""
+
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from cache import parquet_available
+from storage import append_dataset, dataset_path, read_dataset, write_dataset
+
+# Metrics checked for outliers, each gets a <metric>_is_outlier column
+OUTLIER_METRICS = ['spend', 'revenue', 'roas', 'cac', 'ctr', 'cvr']
+
+# Season (Northern Hemisphere)
+SEASONS = {
+    12: 'Winter', 1: 'Winter', 2: 'Winter',
+    3: 'Spring', 4: 'Spring', 5: 'Spring',
+    6: 'Summer', 7: 'Summer', 8: 'Summer',
+    9: 'Fall', 10: 'Fall', 11: 'Fall'
+}
+
+# Bounds are refit once the quartiles of the data seen since the last fit have
+# moved by more than this fraction of the IQR
+DEFAULT_DRIFT_TOLERANCE = 0.05
+
+Bounds = Dict[str, Tuple[float, float]]
+
+
+def add_marketing_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """Stage 1: CTR, CVR, CPC, ROAS, CAC, profit and profit margin"""
+    df = df.copy()
+    df['ctr'] = (df['clicks'] / df['impressions'].replace(0, np.nan)) * 100
+    df['cvr'] = (df['conversions'] / df['clicks'].replace(0, np.nan)) * 100
+    df['cpc'] = df['spend'] / df['clicks'].replace(0, np.nan)
+    df['roas'] = df['revenue'] / df['spend'].replace(0, np.nan)
+    df['cac'] = df['spend'] / df['conversions'].replace(0, np.nan)
+
+    # Profit metrics
+    df['profit'] = df['revenue'] - df['spend']
+    df['profit_margin'] = (df['profit'] / df['revenue'].replace(0, np.nan)) * 100
+    return df
+
+
+def add_time_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Stage 2: date parts, weekend flag and season"""
+    df = df.copy()
+    df['year'] = df['date'].dt.year
+    df['month'] = df['date'].dt.month
+    df['month_name'] = df['date'].dt.month_name()
+    df['week'] = df['date'].dt.isocalendar().week
+    df['day_of_week'] = df['date'].dt.dayofweek
+    df['day_name'] = df['date'].dt.day_name()
+    df['quarter'] = df['date'].dt.quarter
+    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+    df['season'] = df['month'].map(SEASONS)
+    return df
+
+
+def iqr_bounds(df: pd.DataFrame, metrics: List[str] = OUTLIER_METRICS) -> Bounds:
+    """Q1 - 1.5 * IQR and Q3 + 1.5 * IQR for each metric, ignoring missing values"""
+    bounds = {}
+    for metric in metrics:
+        values = df[metric].dropna()
+        q1 = values.quantile(0.25)
+        q3 = values.quantile(0.75)
+        iqr = q3 - q1
+        bounds[metric] = (q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+    return bounds
+
+
+def flag_outliers(df: pd.DataFrame, bounds: Bounds) -> pd.DataFrame:
+    """Stage 3: <metric>_is_outlier flags; missing values are never outliers"""
+    df = df.copy()
+    for metric, (lower, upper) in bounds.items():
+        df[f'{metric}_is_outlier'] = (df[metric] < lower) | (df[metric] > upper)
+    return df
+
+
+# Stages that only look at their own rows, so new dates can be processed alone
+ROW_STAGES = [
+    ('metrics', add_marketing_metrics),
+    ('time_features', add_time_features),
+]
+
+
+def _quartiles(values: pd.Series) -> Tuple[float, float]:
+    return float(values.quantile(0.25)), float(values.quantile(0.75))
+
+
+class FeaturePipeline:
+    """
+    Materialized performance_features, refreshed incrementally
+
+    Each run computes the row stages only for dates not processed before and
+    appends them to the store. Outlier bounds are kept in the state file and
+    reused for new rows; they are refit over the full history (and every
+    row's flags rewritten) only when the quartiles of the rows added since
+    the last fit drift by more than drift_tolerance * IQR.
+    """
+
+    def __init__(self, store_dir: str, name: str = 'performance_features', fmt: Optional[str] = None,
+                 drift_tolerance: float = DEFAULT_DRIFT_TOLERANCE):
+        """
+        Args:
+            store_dir: Directory holding the materialized dataset and its state
+            name: Dataset name
+            fmt: 'csv' or 'parquet' (default: Parquet when pyarrow is installed)
+            drift_tolerance: Quartile shift, as a fraction of the IQR, that triggers a refit
+        """
+        self.store_dir = store_dir
+        self.name = name
+        self.fmt = fmt or ('parquet' if parquet_available() else 'csv')
+        self.drift_tolerance = drift_tolerance
+        self.state_path = os.path.join(store_dir, f"{name}.state.json")
+        self.state = self._load_state()
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    @property
+    def bounds(self) -> Bounds:
+        return {metric: tuple(bound) for metric, bound in self.state.get('bounds', {}).items()}
+
+    def _fit(self, df: pd.DataFrame):
+        """Fit bounds on df and make it the reference distribution"""
+        self.state['bounds'] = {metric: [float(lower), float(upper)]
+                                for metric, (lower, upper) in iqr_bounds(df).items()}
+        self.state['distribution'] = {}
+        for metric in OUTLIER_METRICS:
+            values = df[metric].dropna()
+            q1, q3 = _quartiles(values) if len(values) else (0.0, 0.0)
+            self.state['distribution'][metric] = {'count': len(values), 'q1': q1, 'q3': q3,
+                                                  'added': 0, 'q1_shift': 0.0, 'q3_shift': 0.0}
+
+    def _drifted(self, new_rows: pd.DataFrame) -> bool:
+        """Fold new rows into the drift estimate and report whether any metric moved too far"""
+        drifted = False
+        for metric in OUTLIER_METRICS:
+            reference = self.state['distribution'][metric]
+            values = new_rows[metric].dropna()
+            if not len(values):
+                continue
+            q1, q3 = _quartiles(values)
+            # Running, count-weighted shift of the new data's quartiles against the reference
+            reference['q1_shift'] += len(values) * (q1 - reference['q1'])
+            reference['q3_shift'] += len(values) * (q3 - reference['q3'])
+            reference['added'] += len(values)
+            total = reference['count'] + reference['added']
+            shift = max(abs(reference['q1_shift']), abs(reference['q3_shift'])) / total
+            iqr = reference['q3'] - reference['q1']
+            if shift > self.drift_tolerance * iqr:
+                drifted = True
+        return drifted
+
+    def load(self, **filters) -> pd.DataFrame:
+        """Read the materialized features (accepts read_dataset's columns/date/channel filters)"""
+        df = read_dataset(self.store_dir, self.name, fmt=self.fmt, **filters)
+        return df.sort_values(['date', 'campaign_id'], ignore_index=True)
+
+    def run(self, enriched: pd.DataFrame) -> dict:
+        """
+        Bring the store up to date with performance_enriched rows
+
+        Rows for dates already processed are skipped, so the whole enriched
+        table or just the newest rows can be passed in.
+
+        Returns:
+            Summary with new_rows, refit (whether bounds were refit) and seconds
+        """
+        started = time.perf_counter()
+        processed = set(self.state.get('processed_dates', []))
+        # Without the store file nothing processed survives: rebuild from every row
+        first_run = not processed or not os.path.exists(dataset_path(self.store_dir, self.name, self.fmt))
+        if first_run:
+            processed = set()
+        dates = enriched['date'].dt.strftime('%Y-%m-%d')
+        is_new = ~dates.isin(processed)
+        new_rows = enriched[is_new]
+        new_dates = set(dates[is_new])
+        if not len(new_rows):
+            return {'new_rows': 0, 'refit': False, 'seconds': time.perf_counter() - started}
+
+        for _, stage in ROW_STAGES:
+            new_rows = stage(new_rows)
+
+        if first_run:
+            self._fit(new_rows)
+            refit = True
+            write_dataset(flag_outliers(new_rows, self.bounds), self.store_dir, self.name, self.fmt)
+        elif self._drifted(new_rows):
+            # Refit on the full history and rewrite every row's flags
+            history = pd.concat([self.load(), new_rows], ignore_index=True)
+            self._fit(history)
+            refit = True
+            write_dataset(flag_outliers(history, self.bounds), self.store_dir, self.name, self.fmt)
+        else:
+            refit = False
+            append_dataset(flag_outliers(new_rows, self.bounds), self.store_dir, self.name, self.fmt)
+
+        self.state['processed_dates'] = sorted(processed | new_dates)
+        self.state['rows'] = (0 if first_run else self.state.get('rows', 0)) + len(new_rows)
+        self._save_state()
+        return {'new_rows': len(new_rows), 'refit': refit, 'seconds': time.perf_counter() - started}
+
+    def reset(self):
+        """Forget all processed dates and bounds; the next run rebuilds the store"""
+        self.state = {}
+        try:
+            os.remove(self.state_path)
+        except FileNotFoundError:
+            pass
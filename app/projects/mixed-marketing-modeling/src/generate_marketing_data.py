@@ -3,15 +3,29 @@ Marketing Analytics Dataset Generator
 Generates realistic synthetic data for multi-channel marketing campaign analysis
 """
 
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 import random
+import time
 import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
 from hashlib import sha256
 
+from ab_stats import annotate_ab_tests
+from instrumentation import peak_rss_mb, span, traced
+from schema import apply_schema
+from storage import (FORMATS, DatasetWriter, append_dataset, dataset_bytes, detect_format, iter_dataset,
+                     read_dataset, write_dataset)
+
 # Set random seed for reproducibility
-random.seed(42)
-np.random.seed(42)
+SEED = 42
+random.seed(SEED)
+np.random.seed(SEED)
+
+# Generator used by the vectorized engines unless one is passed in explicitly
+_rng = np.random.default_rng(SEED)
 
 # Configuration
 START_DATE = datetime(2024, 1, 1)
@@ -19,6 +33,9 @@ END_DATE = datetime(2024, 12, 31)
 NUM_CAMPAIGNS = 25
 NUM_CUSTOMERS = 5000
 
+# Rows per chunk written by the streaming mode
+DEFAULT_CHUNK_SIZE = 100000
+
 # Channel configurations with realistic performance characteristics
 CHANNEL_CONFIG = {
     'paid_search': {
@@ -58,14 +75,17 @@ CHANNEL_CONFIG = {
     }
 }
 
-def generate_campaigns():
-    """Generate campaign master data"""
+TARGET_AUDIENCES = ['18-24', '25-34', '35-44', '45-54', '55+']
+
+@traced('generate.campaigns')
+def generate_campaigns(num_campaigns=None):
+    """Generate campaign master data (NUM_CAMPAIGNS rows unless num_campaigns is given)"""
     campaigns = []
     campaign_id = 1
     
     channels = list(CHANNEL_CONFIG.keys())
     
-    for i in range(NUM_CAMPAIGNS):
+    for i in range(NUM_CAMPAIGNS if num_campaigns is None else num_campaigns):
         channel = random.choice(channels)
         config = CHANNEL_CONFIG[channel]
         
@@ -89,14 +109,98 @@ def generate_campaigns():
             'start_date': start_date.date(),
             'end_date': end_date.date(),
             'budget': round(budget, 2),
-            'target_audience': random.choice(['18-24', '25-34', '35-44', '45-54', '55+'])
+            'target_audience': random.choice(TARGET_AUDIENCES)
         })
         campaign_id += 1
     
     return pd.DataFrame(campaigns)
 
-def generate_daily_performance(campaigns_df):
-    """Generate daily performance metrics for each campaign"""
+def _channel_param(channels, key):
+    """Look up a CHANNEL_CONFIG value for every entry of an array of channel names"""
+    lookup = {channel: config[key] for channel, config in CHANNEL_CONFIG.items()}
+    return pd.Series(channels).map(lookup).to_numpy(dtype=float)
+
+def _to_days(values):
+    """Convert dates (date objects, strings or timestamps) to a datetime64[D] array"""
+    return pd.to_datetime(pd.Series(values)).to_numpy().astype('datetime64[D]')
+
+def _simulate_daily_performance(start, end, budget, cpc, ctr, cvr, aov, rng):
+    """
+    Array engine behind the vectorized daily performance mode
+
+    Every argument is an array with one entry per campaign. Returns the index of
+    the owning campaign for each generated day plus the metric arrays.
+    """
+    campaign_days = (end - start).astype(np.int64) + 1
+    num_rows = int(campaign_days.sum())
+
+    # Expand every campaign's date range in one pass
+    row_campaign = np.repeat(np.arange(len(campaign_days)), campaign_days)
+    row_offset = np.arange(num_rows) - np.repeat(np.cumsum(campaign_days) - campaign_days, campaign_days)
+    dates = start[row_campaign] + row_offset
+
+    # 1970-01-01 was a Thursday, so shift by 3 to get Monday == 0
+    day_of_week = (dates.astype(np.int64) + 3) % 7
+    weekend_multiplier = np.where(day_of_week >= 5, 0.7, 1.0)
+    variance = rng.uniform(0.7, 1.3, num_rows)
+
+    daily_budget = (budget / campaign_days)[row_campaign]
+    daily_spend = daily_budget * variance * weekend_multiplier
+
+    row_ctr = ctr[row_campaign]
+    impressions = (daily_spend / cpc[row_campaign] / row_ctr).astype(np.int64)
+    clicks = (impressions * row_ctr * variance).astype(np.int64)
+    conversions = (clicks * cvr[row_campaign] * variance).astype(np.int64)
+    revenue = conversions * aov[row_campaign] * rng.uniform(0.8, 1.2, num_rows)
+
+    return row_campaign, {
+        'date': dates,
+        'impressions': impressions,
+        'clicks': clicks,
+        'conversions': conversions,
+        'spend': np.round(daily_spend, 2),
+        'revenue': np.round(revenue, 2)
+    }
+
+def _generate_daily_performance_vectorized(campaigns_df, rng):
+    """Generate daily performance for all campaigns with NumPy array operations"""
+    channels = campaigns_df['channel'].to_numpy()
+    row_campaign, metrics = _simulate_daily_performance(
+        _to_days(campaigns_df['start_date']),
+        _to_days(campaigns_df['end_date']),
+        campaigns_df['budget'].to_numpy(dtype=float),
+        _channel_param(channels, 'avg_cpc'),
+        _channel_param(channels, 'avg_ctr'),
+        _channel_param(channels, 'avg_cvr'),
+        _channel_param(channels, 'avg_aov'),
+        rng
+    )
+
+    return pd.DataFrame({
+        'date': metrics['date'].astype(object),
+        'campaign_id': campaigns_df['campaign_id'].to_numpy()[row_campaign],
+        'impressions': metrics['impressions'],
+        'clicks': metrics['clicks'],
+        'conversions': metrics['conversions'],
+        'spend': metrics['spend'],
+        'revenue': metrics['revenue']
+    })
+
+@traced('generate.daily_performance')
+def generate_daily_performance(campaigns_df, vectorized=False, rng=None):
+    """
+    Generate daily performance metrics for each campaign
+
+    Args:
+        campaigns_df: Campaign master data from generate_campaigns()
+        vectorized: Draw every campaign-day at once with NumPy instead of
+            looping row by row. Much faster for large NUM_CAMPAIGNS; uses a
+            NumPy random stream, so the values differ from the loop version.
+        rng: Optional numpy.random.Generator for the vectorized mode
+    """
+    if vectorized:
+        return _generate_daily_performance_vectorized(campaigns_df, rng or _rng)
+
     daily_perf = []
     
     for _, campaign in campaigns_df.iterrows():
@@ -149,16 +253,100 @@ def generate_daily_performance(campaigns_df):
     
     return pd.DataFrame(daily_perf)
 
-def generate_customers(campaigns_df, daily_perf_df):
-    """Generate customer acquisition data"""
+def _cap_conversions(conversions, max_customers):
+    """
+    Trim per-row conversion counts so they sum to at most max_customers
+
+    Returns the positions of the rows that still produce customers and their counts.
+    """
+    rows = np.flatnonzero(conversions > 0)
+    counts = conversions[rows].astype(np.int64)
+
+    cumulative = np.cumsum(counts)
+    if len(cumulative) and cumulative[-1] > max_customers:
+        last = int(np.searchsorted(cumulative, max_customers))
+        rows = rows[:last + 1]
+        counts = counts[:last + 1].copy()
+        counts[-1] -= cumulative[last] - max_customers
+
+    return rows, counts
+
+def _assign_segments(first_order):
+    """Segment customers by first order value"""
+    return np.select(
+        [first_order >= 100, first_order >= 50],
+        ['high_value', 'medium_value'],
+        default='low_value'
+    ).astype(object)
+
+def _hash_emails(customer_ids):
+    """Generate fake email hashes for a batch of customer ids"""
+    return [sha256(b"customer_%d@example.com" % customer_id).hexdigest()
+            for customer_id in customer_ids.tolist()]
+
+def _generate_customers_vectorized(campaigns_df, daily_perf_df, rng, max_customers, first_customer_id=1):
+    """Generate customers for all converting rows at once"""
+    rows, counts = _cap_conversions(daily_perf_df['conversions'].to_numpy(), max_customers)
+
+    # campaign_id -> channel index built once instead of a scan per row
+    campaign_index = pd.Index(campaigns_df['campaign_id'])
+    row_campaign_ids = daily_perf_df['campaign_id'].to_numpy()[rows]
+    row_channels = campaigns_df['channel'].to_numpy()[campaign_index.get_indexer(row_campaign_ids)]
+
+    # One entry per customer, repeated from its converting row
+    customer_row = np.repeat(np.arange(len(rows)), counts)
+    num_customers = len(customer_row)
+    channels = row_channels[customer_row]
+
+    first_order = _channel_param(channels, 'avg_aov') * rng.uniform(0.5, 1.5, num_customers)
+
+    return _customer_frame(
+        first_customer_id,
+        daily_perf_df['date'].to_numpy()[rows][customer_row],
+        row_campaign_ids[customer_row],
+        channels,
+        first_order
+    )
+
+def _customer_frame(first_customer_id, acquisition_dates, campaign_ids, channels, first_order):
+    """Assemble the customers table from per-customer arrays"""
+    customer_ids = np.arange(first_customer_id, first_customer_id + len(first_order))
+    return pd.DataFrame({
+        'customer_id': customer_ids,
+        'acquisition_date': acquisition_dates,
+        'campaign_id': campaign_ids,
+        'channel': channels,
+        'first_order_value': np.round(first_order, 2),
+        'customer_segment': _assign_segments(first_order),
+        'email_hash': _hash_emails(customer_ids)
+    })
+
+@traced('generate.customers')
+def generate_customers(campaigns_df, daily_perf_df, vectorized=False, rng=None, max_customers=None):
+    """
+    Generate customer acquisition data
+
+    Args:
+        campaigns_df: Campaign master data from generate_campaigns()
+        daily_perf_df: Daily performance from generate_daily_performance()
+        vectorized: Create all customers in one batch with NumPy instead of
+            one at a time. Still stops at exactly the customer cap.
+        rng: Optional numpy.random.Generator for the vectorized mode
+        max_customers: Customer cap, defaults to NUM_CUSTOMERS
+    """
+    max_customers = NUM_CUSTOMERS if max_customers is None else max_customers
+    if vectorized:
+        return _generate_customers_vectorized(campaigns_df, daily_perf_df, rng or _rng, max_customers)
+
     customers = []
     customer_id = 1
+    channel_by_campaign = dict(zip(campaigns_df['campaign_id'], campaigns_df['channel']))
     
     # Get conversions by campaign and date
     for _, perf in daily_perf_df.iterrows():
         if perf['conversions'] > 0:
-            campaign = campaigns_df[campaigns_df['campaign_id'] == perf['campaign_id']].iloc[0]
-            config = CHANNEL_CONFIG[campaign['channel']]
+            channel = channel_by_campaign[perf['campaign_id']]
+            config = CHANNEL_CONFIG[channel]
             
             # Create customers for each conversion
             for _ in range(perf['conversions']):
@@ -178,8 +366,8 @@ def generate_customers(campaigns_df, daily_perf_df):
                 customers.append({
                     'customer_id': customer_id,
                     'acquisition_date': perf['date'],
-                    'campaign_id': campaign['campaign_id'],
-                    'channel': campaign['channel'],
+                    'campaign_id': perf['campaign_id'],
+                    'channel': channel,
                     'first_order_value': round(first_order, 2),
                     'customer_segment': segment,
                     'email_hash': email_hash
@@ -187,13 +375,117 @@ def generate_customers(campaigns_df, daily_perf_df):
                 customer_id += 1
                 
                 # Stop if we've reached target customer count
-                if customer_id > NUM_CUSTOMERS:
+                if customer_id > max_customers:
                     return pd.DataFrame(customers)
     
     return pd.DataFrame(customers)
 
-def generate_transactions(customers_df):
-    """Generate repeat purchase transactions"""
+# Repeat purchase behaviour per segment: (min purchases, max purchases, repeat probability)
+SEGMENT_PURCHASE_CONFIG = {
+    'high_value': (2, 8, 0.7),
+    'medium_value': (1, 4, 0.5),
+    'low_value': (0, 2, 0.3)
+}
+
+def _simulate_repeats(start_days, first_order_values, segments, rng, last_day=None):
+    """
+    Draw repeat purchases that follow each customer's start day, up to last_day
+
+    Returns the index of the owning customer for every repeat purchase (grouped
+    by customer, dates increasing) plus the dates, unrounded order values and
+    discounts.
+    """
+    num_customers = len(start_days)
+    segment_config = pd.DataFrame(SEGMENT_PURCHASE_CONFIG, index=['low', 'high', 'prob']).T
+    config = segment_config.reindex(segments).to_numpy()
+    min_purchases = config[:, 0].astype(np.int64)
+    max_purchases = config[:, 1].astype(np.int64)
+    repeat_prob = config[:, 2]
+
+    # Draw every customer's purchase attempts and their outcomes at once
+    num_attempts = rng.integers(min_purchases, max_purchases + 1)
+    attempt_customer = np.repeat(np.arange(num_customers), num_attempts)
+    succeeded = rng.random(len(attempt_customer)) < repeat_prob[attempt_customer]
+    repeat_customer = attempt_customer[succeeded]
+
+    # Purchase dates are a per-customer running sum of 7-60 day gaps
+    gaps = rng.integers(7, 61, len(repeat_customer))
+    running_gap = np.cumsum(gaps)
+    is_first_repeat = np.ones(len(repeat_customer), dtype=bool)
+    is_first_repeat[1:] = repeat_customer[1:] != repeat_customer[:-1]
+    gap_offset = np.maximum.accumulate(np.where(is_first_repeat, running_gap - gaps, 0))
+    repeat_dates = start_days[repeat_customer] + (running_gap - gap_offset)
+
+    # Dates only grow within a customer, so this mask matches stopping at the last day
+    in_range = repeat_dates <= (np.datetime64(END_DATE.date()) if last_day is None else last_day)
+    repeat_customer = repeat_customer[in_range]
+    repeat_dates = repeat_dates[in_range]
+    num_repeats = len(repeat_customer)
+
+    repeat_values = first_order_values[repeat_customer] * rng.uniform(0.7, 1.1, num_repeats)
+    discounts = rng.choice(np.array([0, 0, 0, 5, 10, 15, 20], dtype=float), num_repeats)
+    return repeat_customer, repeat_dates, repeat_values, discounts
+
+def _simulate_transactions(acquisition_days, first_order_values, segments, rng, last_day=None):
+    """
+    Array engine behind the vectorized transaction mode
+
+    Returns, in output order, the index of the owning customer for every
+    transaction plus the date, order value, product and discount arrays.
+    Repeat purchases stop at last_day (END_DATE by default).
+    """
+    num_customers = len(acquisition_days)
+    repeat_customer, repeat_dates, repeat_values, discounts = _simulate_repeats(
+        acquisition_days, first_order_values, segments, rng, last_day
+    )
+    num_repeats = len(repeat_customer)
+
+    # First purchases go ahead of each customer's repeats
+    transaction_customer = np.concatenate([np.arange(num_customers), repeat_customer])
+    order = np.argsort(transaction_customer, kind='stable')
+
+    return transaction_customer[order], {
+        'transaction_date': np.concatenate([acquisition_days, repeat_dates])[order],
+        'order_value': np.concatenate([first_order_values, np.round(repeat_values, 2)])[order],
+        'products_purchased': np.concatenate([
+            rng.integers(1, 6, num_customers),
+            rng.integers(1, 5, num_repeats)
+        ])[order],
+        'discount_applied': np.concatenate([np.zeros(num_customers), discounts])[order]
+    }
+
+def _generate_transactions_vectorized(customers_df, rng, first_transaction_id=1):
+    """Generate first and repeat purchases for all customers at once"""
+    transaction_customer, columns = _simulate_transactions(
+        _to_days(customers_df['acquisition_date']),
+        customers_df['first_order_value'].to_numpy(dtype=float),
+        customers_df['customer_segment'].to_numpy(),
+        rng
+    )
+
+    return pd.DataFrame({
+        'transaction_id': np.arange(first_transaction_id, first_transaction_id + len(transaction_customer)),
+        'customer_id': customers_df['customer_id'].to_numpy()[transaction_customer],
+        'transaction_date': columns['transaction_date'].astype(object),
+        'order_value': columns['order_value'],
+        'products_purchased': columns['products_purchased'],
+        'discount_applied': columns['discount_applied']
+    })
+
+@traced('generate.transactions')
+def generate_transactions(customers_df, vectorized=False, rng=None):
+    """
+    Generate repeat purchase transactions
+
+    Args:
+        customers_df: Customers from generate_customers()
+        vectorized: Simulate every customer's purchases with NumPy arrays
+            instead of one customer at a time
+        rng: Optional numpy.random.Generator for the vectorized mode
+    """
+    if vectorized:
+        return _generate_transactions_vectorized(customers_df, rng or _rng)
+
     transactions = []
     transaction_id = 1
     
@@ -252,20 +544,31 @@ def generate_transactions(customers_df):
     
     return pd.DataFrame(transactions)
 
-def generate_ab_tests(campaigns_df):
-    """Generate A/B test results for select campaigns"""
+@traced('generate.ab_tests')
+def generate_ab_tests(campaigns_df, first_test_id=1, rng=None):
+    """
+    Generate A/B test results for select campaigns, numbering rows from first_test_id
+
+    Draws come from rng when given (a NumPy Generator), otherwise from the
+    module-level random state as in the original generator.
+    """
     ab_tests = []
-    test_id = 1
+    test_id = first_test_id
+    if rng is not None:
+        randint = lambda low, high: int(rng.integers(low, high + 1))
+        uniform = lambda low, high: float(rng.uniform(low, high))
+    else:
+        randint, uniform = random.randint, random.uniform
     
     # Run A/B tests on ~40% of campaigns
-    test_campaigns = campaigns_df.sample(frac=0.4, random_state=42)
+    test_campaigns = campaigns_df.sample(frac=0.4, random_state=42 if rng is None else rng)
     
     for _, campaign in test_campaigns.iterrows():
         config = CHANNEL_CONFIG[campaign['channel']]
         test_name = f"Creative Test - {campaign['campaign_name']}"
         
         # Test duration (14-30 days)
-        test_duration = random.randint(14, 30)
+        test_duration = randint(14, 30)
         test_start = campaign['start_date']
         test_end = min(test_start + timedelta(days=test_duration), campaign['end_date'])
         
@@ -273,7 +576,7 @@ def generate_ab_tests(campaigns_df):
         variants = ['control', 'variant_a', 'variant_b']
         
         # Base metrics
-        base_impressions = random.randint(50000, 200000)
+        base_impressions = randint(50000, 200000)
         base_ctr = config['avg_ctr']
         base_cvr = config['avg_cvr']
         
@@ -283,20 +586,16 @@ def generate_ab_tests(campaigns_df):
                 ctr = base_ctr
                 cvr = base_cvr
             elif variant == 'variant_a':
-                ctr = base_ctr * random.uniform(0.95, 1.15)
-                cvr = base_cvr * random.uniform(0.90, 1.10)
+                ctr = base_ctr * uniform(0.95, 1.15)
+                cvr = base_cvr * uniform(0.90, 1.10)
             else:
-                ctr = base_ctr * random.uniform(0.85, 1.25)
-                cvr = base_cvr * random.uniform(0.95, 1.20)
+                ctr = base_ctr * uniform(0.85, 1.25)
+                cvr = base_cvr * uniform(0.95, 1.20)
             
-            impressions = int(base_impressions / len(variants) * random.uniform(0.9, 1.1))
+            impressions = int(base_impressions / len(variants) * uniform(0.9, 1.1))
             clicks = int(impressions * ctr)
             conversions = int(clicks * cvr)
             
-            # Simple statistical significance check (placeholder)
-            # In reality, would use proper two-proportion z-test
-            stat_sig = conversions > 100 and abs(cvr - base_cvr) / base_cvr > 0.1
-            
             ab_tests.append({
                 'test_id': test_id,
                 'campaign_id': campaign['campaign_id'],
@@ -307,44 +606,582 @@ def generate_ab_tests(campaigns_df):
                 'impressions': impressions,
                 'clicks': clicks,
                 'conversions': conversions,
-                'statistical_significance': stat_sig,
-                'p_value': round(random.uniform(0.01, 0.15), 4) if stat_sig else round(random.uniform(0.15, 0.90), 4)
+                'statistical_significance': False,
+                'p_value': 1.0
             })
             test_id += 1
     
-    return pd.DataFrame(ab_tests)
+    # Two-proportion z-test of each variant's CVR against its control, Holm-corrected per test
+    return annotate_ab_tests(pd.DataFrame(ab_tests))
+
+def _report_stage(rows, started):
+    """Print row count, throughput and peak RSS for a finished stage"""
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed > 0 else float('inf')
+    peak = peak_rss_mb()
+    peak_text = f", peak RSS {peak:,.0f} MB" if peak is not None else ""
+    print(f"   Wrote {rows:,} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec{peak_text})")
+
+@traced('generate.streaming')
+def generate_streaming(output_dir, scale=1.0, chunk_size=DEFAULT_CHUNK_SIZE, fmt='csv'):
+    """
+    Generate all datasets in bounded memory
+
+    Each stage writes fixed-size chunks straight to disk and the next stage reads
+    them back chunk by chunk, so memory stays flat as the scale factor grows.
+    Campaigns (the small dimension table) are the only dataset held in memory.
+    Uses the vectorized engines.
+
+    Args:
+        output_dir: Directory the files are written to
+        scale: Multiplier applied to NUM_CAMPAIGNS and NUM_CUSTOMERS
+        chunk_size: Target number of rows per chunk
+        fmt: 'csv' or 'parquet'
+    """
+    num_campaigns = max(1, round(NUM_CAMPAIGNS * scale))
+    max_customers = max(1, round(NUM_CUSTOMERS * scale))
+    counts = {}
+
+    print(f"\n1. Generating campaigns (scale {scale:g})...")
+    with span('generate.stream.campaigns') as stage:
+        started = time.perf_counter()
+        campaigns_df = generate_campaigns(num_campaigns)
+        write_dataset(campaigns_df, output_dir, 'campaigns', fmt)
+        counts['campaigns'] = len(campaigns_df)
+        stage.add(rows_out=counts['campaigns'], bytes_out=dataset_bytes(output_dir, 'campaigns', fmt))
+        _report_stage(counts['campaigns'], started)
 
-def main():
-    """Generate all datasets and save to CSV"""
-    print("Generating marketing analytics datasets...")
-    
-    print("\n1. Generating campaigns...")
-    campaigns_df = generate_campaigns()
-    print(f"   Generated {len(campaigns_df)} campaigns")
-    
     print("\n2. Generating daily performance data...")
-    daily_perf_df = generate_daily_performance(campaigns_df)
-    print(f"   Generated {len(daily_perf_df)} daily performance records")
-    
+    with span('generate.stream.daily_performance') as stage:
+        started = time.perf_counter()
+        # Campaigns run at most 91 days, so this many campaigns fit in one chunk
+        campaigns_per_chunk = max(1, chunk_size // 91)
+        writer = DatasetWriter(output_dir, 'daily_performance', fmt,
+                               campaigns_df.set_index('campaign_id')['channel'])
+        total_spend = total_revenue = 0.0
+        for start in range(0, len(campaigns_df), campaigns_per_chunk):
+            chunk = generate_daily_performance(
+                campaigns_df.iloc[start:start + campaigns_per_chunk], vectorized=True
+            )
+            writer.write(chunk)
+            total_spend += chunk['spend'].sum()
+            total_revenue += chunk['revenue'].sum()
+        writer.close()
+        counts['daily_performance'] = writer.rows
+        stage.add(rows_out=counts['daily_performance'],
+                  bytes_out=dataset_bytes(output_dir, 'daily_performance', fmt))
+        _report_stage(counts['daily_performance'], started)
+
     print("\n3. Generating customer acquisitions...")
-    customers_df = generate_customers(campaigns_df, daily_perf_df)
-    print(f"   Generated {len(customers_df)} customers")
-    
+    with span('generate.stream.customers') as stage:
+        started = time.perf_counter()
+        writer = DatasetWriter(output_dir, 'customers', fmt)
+        perf_chunks = iter_dataset(output_dir, 'daily_performance', ['date', 'campaign_id', 'conversions'],
+                                   chunk_size, fmt)
+        for perf_chunk in perf_chunks:
+            chunk = _generate_customers_vectorized(
+                campaigns_df, perf_chunk, _rng,
+                max_customers=max_customers - writer.rows,
+                first_customer_id=writer.rows + 1
+            )
+            chunk['acquisition_date'] = _to_days(chunk['acquisition_date']).astype(object)
+            writer.write(chunk)
+            if writer.rows >= max_customers:
+                break
+        writer.close()
+        counts['customers'] = writer.rows
+        stage.add(rows_out=counts['customers'], bytes_out=dataset_bytes(output_dir, 'customers', fmt))
+        _report_stage(counts['customers'], started)
+
     print("\n4. Generating transactions...")
-    transactions_df = generate_transactions(customers_df)
-    print(f"   Generated {len(transactions_df)} transactions")
+    with span('generate.stream.transactions') as stage:
+        started = time.perf_counter()
+        writer = DatasetWriter(output_dir, 'transactions', fmt)
+        customer_chunks = iter_dataset(
+            output_dir, 'customers',
+            ['customer_id', 'acquisition_date', 'channel', 'first_order_value', 'customer_segment'],
+            chunk_size, fmt
+        )
+        for customer_chunk in customer_chunks:
+            chunk = _generate_transactions_vectorized(
+                customer_chunk, _rng, first_transaction_id=writer.rows + 1
+            )
+            writer.set_channel_lookup(customer_chunk.set_index('customer_id')['channel'])
+            writer.write(chunk)
+        writer.close()
+        counts['transactions'] = writer.rows
+        stage.add(rows_out=counts['transactions'], bytes_out=dataset_bytes(output_dir, 'transactions', fmt))
+        _report_stage(counts['transactions'], started)
+
+    print("\n5. Generating A/B tests...")
+    with span('generate.stream.ab_tests') as stage:
+        started = time.perf_counter()
+        ab_tests_df = generate_ab_tests(campaigns_df)
+        write_dataset(ab_tests_df, output_dir, 'ab_tests', fmt)
+        counts['ab_tests'] = len(ab_tests_df)
+        stage.add(rows_out=counts['ab_tests'], bytes_out=dataset_bytes(output_dir, 'ab_tests', fmt))
+        _report_stage(counts['ab_tests'], started)
+
+    overall_roas = total_revenue / total_spend if total_spend > 0 else 0
+    print("\n✅ All datasets generated successfully!")
+    print(f"\nWrote {sum(counts.values()):,} rows to {output_dir}")
+    print(f"  - Total Spend: ${total_spend:,.2f}")
+    print(f"  - Total Revenue: ${total_revenue:,.2f}")
+    print(f"  - Overall ROAS: {overall_roas:.2f}x")
+    return counts
+
+def _campaign_streams(seed, campaign_id):
+    """
+    Independent random streams for one campaign
+
+    Returns generators for the campaign's attributes, daily performance,
+    customers and transactions. They depend only on the base seed and the
+    campaign id, never on which worker or shard handles the campaign.
+    """
+    children = np.random.SeedSequence([seed, int(campaign_id)]).spawn(4)
+    return [np.random.default_rng(child) for child in children]
+
+def _draw_campaign(campaign_id, rng, first_day, last_day, start_window=301):
+    """
+    Draw one campaign's attributes from rng
+
+    Starts within start_window days of first_day and runs 30-90 days, capped at last_day.
+    """
+    channels = list(CHANNEL_CONFIG.keys())
+    channel = channels[rng.integers(len(channels))]
+    config = CHANNEL_CONFIG[channel]
+    start_date = first_day + rng.integers(0, start_window)
+    end_date = min(start_date + rng.integers(30, 91), last_day)
+    budget = round(rng.uniform(*config['budget_range']), 2)
+    return {
+        'campaign_id': campaign_id,
+        'campaign_name': f"{channel.replace('_', ' ').title()} Campaign {campaign_id}",
+        'channel': channel,
+        'start_date': start_date,
+        'end_date': end_date,
+        'budget': budget,
+        'target_audience': TARGET_AUDIENCES[rng.integers(len(TARGET_AUDIENCES))]
+    }
+
+def _performance_shard(campaign_ids, seed):
+    """Generate campaign rows and their daily performance for one shard"""
+    first_day = np.datetime64(START_DATE.date())
+    last_day = np.datetime64(END_DATE.date())
+
+    campaigns = []
+    performance = []
+    for campaign_id in campaign_ids:
+        attribute_rng, performance_rng, _, _ = _campaign_streams(seed, campaign_id)
+        campaign = _draw_campaign(campaign_id, attribute_rng, first_day, last_day)
+        campaigns.append(campaign)
+        config = CHANNEL_CONFIG[campaign['channel']]
+
+        _, metrics = _simulate_daily_performance(
+            np.array([campaign['start_date']]), np.array([campaign['end_date']]), np.array([campaign['budget']]),
+            *(np.array([config[key]]) for key in ['avg_cpc', 'avg_ctr', 'avg_cvr', 'avg_aov']),
+            performance_rng
+        )
+        metrics['campaign_id'] = np.full(len(metrics['date']), campaign_id)
+        performance.append(metrics)
+
+    performance_df = pd.DataFrame({
+        column: np.concatenate([metrics[column] for metrics in performance])
+        for column in ['date', 'campaign_id', 'impressions', 'clicks', 'conversions', 'spend', 'revenue']
+    })
+    return pd.DataFrame(campaigns), performance_df
+
+def _customer_shard(campaigns_df, daily_perf_df, quotas, first_customer_ids, seed):
+    """Generate customers and their transactions for one shard of campaigns"""
+    perf_campaign_ids = daily_perf_df['campaign_id'].to_numpy()
+    perf_dates = daily_perf_df['date'].to_numpy().astype('datetime64[D]')
+    perf_conversions = daily_perf_df['conversions'].to_numpy()
+
+    customers = []
+    transactions = []
+    for campaign, quota, first_customer_id in zip(campaigns_df.itertuples(), quotas, first_customer_ids):
+        if quota == 0:
+            continue
+        _, _, customer_rng, transaction_rng = _campaign_streams(seed, campaign.campaign_id)
+
+        # Performance rows are grouped by campaign, in campaign order
+        lo, hi = np.searchsorted(perf_campaign_ids, [campaign.campaign_id, campaign.campaign_id + 1])
+        rows, counts = _cap_conversions(perf_conversions[lo:hi], quota)
+        customer_row = np.repeat(rows, counts)
+        aov = CHANNEL_CONFIG[campaign.channel]['avg_aov']
+        first_order = aov * customer_rng.uniform(0.5, 1.5, len(customer_row))
+
+        customers_df = _customer_frame(
+            first_customer_id,
+            perf_dates[lo:hi][customer_row],
+            np.full(len(customer_row), campaign.campaign_id),
+            np.full(len(customer_row), campaign.channel, dtype=object),
+            first_order
+        )
+        customers.append(customers_df)
+
+        transaction_customer, columns = _simulate_transactions(
+            perf_dates[lo:hi][customer_row],
+            customers_df['first_order_value'].to_numpy(),
+            customers_df['customer_segment'].to_numpy(),
+            transaction_rng
+        )
+        columns['customer_id'] = customers_df['customer_id'].to_numpy()[transaction_customer]
+        transactions.append(pd.DataFrame(columns))
+
+    if not customers:
+        return None, None
+    return pd.concat(customers, ignore_index=True), pd.concat(transactions, ignore_index=True)
+
+def _map_shards(function, shards, workers):
+    """Run function over shards in order, in a process pool when workers > 1"""
+    if workers <= 1:
+        return [function(*shard) for shard in shards]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, *zip(*shards)))
+
+@traced('generate.sharded')
+def generate_sharded(workers, scale=1.0, seed=SEED):
+    """
+    Generate campaigns, daily performance, customers and transactions across a process pool
+
+    Campaigns are split into shards and every campaign draws from its own
+    SeedSequence-derived streams, so the result is identical for any number of
+    workers. Customer ids are handed out per campaign before the customer
+    phase, and transaction ids after the shards are merged, so both stay
+    contiguous and globally unique.
+
+    Args:
+        workers: Number of worker processes
+        scale: Multiplier applied to NUM_CAMPAIGNS and NUM_CUSTOMERS
+        seed: Base seed every per-campaign stream is derived from
+
+    Returns:
+        Tuple of campaigns, daily performance, customers and transactions DataFrames
+    """
+    num_campaigns = max(1, round(NUM_CAMPAIGNS * scale))
+    max_customers = max(1, round(NUM_CUSTOMERS * scale))
+
+    # A few shards per worker keeps the pool busy when shards finish unevenly
+    campaign_ids = np.arange(1, num_campaigns + 1)
+    id_shards = np.array_split(campaign_ids, min(num_campaigns, workers * 4))
+
+    results = _map_shards(_performance_shard, [(shard.tolist(), seed) for shard in id_shards], workers)
+    campaigns_df = pd.concat([campaigns for campaigns, _ in results], ignore_index=True)
+    daily_perf_df = pd.concat([performance for _, performance in results], ignore_index=True)
+
+    # Split the global customer cap into per-campaign quotas and id ranges
+    conversions = daily_perf_df.groupby('campaign_id')['conversions'].sum().reindex(campaign_ids, fill_value=0).to_numpy()
+    before = np.cumsum(conversions) - conversions
+    quotas = np.clip(max_customers - before, 0, conversions)
+    first_customer_ids = 1 + np.cumsum(quotas) - quotas
+
+    shards = []
+    for shard in id_shards:
+        positions = shard - 1
+        shard_perf = daily_perf_df[daily_perf_df['campaign_id'].between(shard[0], shard[-1])]
+        shards.append((campaigns_df.iloc[positions], shard_perf, quotas[positions], first_customer_ids[positions], seed))
+    results = [result for result in _map_shards(_customer_shard, shards, workers) if result[0] is not None]
+
+    customers_df = pd.concat([customers for customers, _ in results], ignore_index=True)
+    transactions_df = pd.concat([transactions for _, transactions in results], ignore_index=True)
+    transactions_df.insert(0, 'transaction_id', np.arange(1, len(transactions_df) + 1))
+    transactions_df = transactions_df[['transaction_id', 'customer_id', 'transaction_date', 'order_value',
+                                       'products_purchased', 'discount_applied']]
+
+    for df, columns in [(campaigns_df, ['start_date', 'end_date']), (daily_perf_df, ['date']),
+                        (customers_df, ['acquisition_date']), (transactions_df, ['transaction_date'])]:
+        for column in columns:
+            df[column] = df[column].to_numpy().astype('datetime64[D]').astype(object)
+
+    return campaigns_df, daily_perf_df, customers_df, transactions_df
+
+def _dataset_max(directory, name, column, fmt):
+    """Largest value of one column, read chunk by chunk"""
+    return max(chunk[column].max() for chunk in iter_dataset(directory, name, [column], fmt=fmt))
+
+def _last_purchases(directory, fmt, num_customers):
+    """Latest transaction day per customer id, read chunk by chunk"""
+    last = np.full(num_customers + 1, np.iinfo(np.int64).min)
+    for chunk in iter_dataset(directory, 'transactions', ['customer_id', 'transaction_date'], fmt=fmt):
+        days = _to_days(chunk['transaction_date']).astype(np.int64)
+        np.maximum.at(last, chunk['customer_id'].to_numpy(dtype=np.int64), days)
+    return last
+
+@traced('generate.extension')
+def generate_extension(source_dir, end_date, output_dir=None, seed=SEED, fmt=None, max_customers=None):
+    """
+    Extend existing outputs past their last day, producing only the new rows
+
+    Campaigns still running on the old last day run on for up to 60 more days
+    at the same daily budget, and new campaigns launch at the historical
+    rate. Their daily performance past the old horizon brings new customers,
+    and both new and existing customers make repeat purchases up to end_date.
+    Campaign, customer, transaction and test ids continue from the existing
+    maxima, and every draw comes from streams derived from the seed and the
+    first new day, so the same extension always produces the same rows.
+
+    When output_dir is source_dir the new rows are appended to the existing
+    datasets (campaigns, the small dimension table, is rewritten with the
+    extended end dates). Otherwise only the new and changed rows are written
+    to output_dir, ready for an incremental import.
+
+    Args:
+        source_dir: Directory holding the existing outputs
+        end_date: New last day (YYYY-MM-DD), after the existing last day
+        output_dir: Where to write (default: source_dir)
+        seed: Base seed the extension streams are derived from
+        fmt: 'csv' or 'parquet', detected from source_dir if omitted
+        max_customers: Cap on new customers (default: the existing customers
+            per day times the number of new days)
+
+    Returns:
+        Dict of new (or changed) row counts per dataset
+    """
+    fmt = fmt or detect_format(source_dir, 'campaigns')
+    output_dir = output_dir or source_dir
+    campaigns_df = read_dataset(source_dir, 'campaigns', fmt=fmt)
+    horizon = np.datetime64(pd.Timestamp(_dataset_max(source_dir, 'daily_performance', 'date', fmt)).date())
+    first_day = horizon + 1
+    last_day = np.datetime64(pd.Timestamp(end_date).date())
+    if last_day < first_day:
+        raise ValueError(f"end_date {end_date} must be after the existing last day {horizon}")
+    new_days = int((last_day - first_day).astype(np.int64)) + 1
+
+    # Children are keyed by position, so adding the A/B test stream leaves the others unchanged
+    campaign_rng, performance_rng, customer_rng, transaction_rng, ab_test_rng = [
+        np.random.default_rng(child)
+        for child in np.random.SeedSequence([seed, int(first_day.astype(np.int64))]).spawn(5)
+    ]
+
+    # Campaigns running into the horizon continue at their daily budget
+    starts = _to_days(campaigns_df['start_date'])
+    ends = _to_days(campaigns_df['end_date'])
+    running = ends >= horizon
+    daily_budget = campaigns_df['budget'].to_numpy(dtype=float) / ((ends - starts).astype(np.int64) + 1)
+    extended = campaigns_df[running].copy()
+    new_ends = np.minimum(ends[running] + campaign_rng.integers(0, 61, running.sum()), last_day)
+    extended = extended[new_ends > ends[running]]
+    extended_daily = daily_budget[running][new_ends > ends[running]]
+    new_ends = new_ends[new_ends > ends[running]]
+    extended['end_date'] = new_ends
+    extended['budget'] = np.round(extended_daily * ((new_ends - _to_days(extended['start_date'])).astype(np.int64) + 1), 2)
+
+    # New campaigns launch at the historical rate
+    launch_days = int((starts.max() - starts.min()).astype(np.int64)) + 1
+    num_new = int(round(len(campaigns_df) / launch_days * new_days))
+    first_campaign_id = int(campaigns_df['campaign_id'].max()) + 1
+    launched = pd.DataFrame([
+        _draw_campaign(campaign_id, campaign_rng, first_day, last_day, start_window=new_days)
+        for campaign_id in range(first_campaign_id, first_campaign_id + num_new)
+    ], columns=campaigns_df.columns)
+    changed_campaigns = pd.concat([extended, launched], ignore_index=True)
+    changed_campaigns['start_date'] = _to_days(changed_campaigns['start_date']).astype(object)
+    changed_campaigns['end_date'] = _to_days(changed_campaigns['end_date']).astype(object)
+
+    # Daily performance past the horizon only
+    active_start = np.maximum(_to_days(changed_campaigns['start_date']), first_day)
+    active_end = _to_days(changed_campaigns['end_date'])
+    daily = np.r_[extended_daily, launched['budget'].to_numpy(dtype=float) /
+                  ((_to_days(launched['end_date']) - _to_days(launched['start_date'])).astype(np.int64) + 1)]
+    channels = changed_campaigns['channel'].to_numpy()
+    row_campaign, metrics = _simulate_daily_performance(
+        active_start, active_end, daily * ((active_end - active_start).astype(np.int64) + 1),
+        *(_channel_param(channels, key) for key in ['avg_cpc', 'avg_ctr', 'avg_cvr', 'avg_aov']),
+        performance_rng
+    )
+    metrics['campaign_id'] = changed_campaigns['campaign_id'].to_numpy()[row_campaign]
+    daily_perf_df = pd.DataFrame({
+        column: metrics[column]
+        for column in ['date', 'campaign_id', 'impressions', 'clicks', 'conversions', 'spend', 'revenue']
+    })
+    daily_perf_df['date'] = daily_perf_df['date'].astype(object)
+
+    # New customers, in date order, up to the historical acquisition rate
+    existing = read_dataset(source_dir, 'customers', ['customer_id', 'acquisition_date', 'channel',
+                                                      'first_order_value', 'customer_segment'], fmt=fmt)
+    if max_customers is None:
+        first_acquisition = _to_days(existing['acquisition_date']).min()
+        history_days = int((horizon - first_acquisition).astype(np.int64)) + 1
+        max_customers = int(round(len(existing) / history_days * new_days))
+    all_campaigns = pd.concat([campaigns_df[~campaigns_df['campaign_id'].isin(changed_campaigns['campaign_id'])],
+                               changed_campaigns], ignore_index=True)
+    by_date = daily_perf_df.sort_values(['date', 'campaign_id'], kind='stable')
+    customers_df = _generate_customers_vectorized(
+        all_campaigns, by_date, customer_rng, max_customers,
+        first_customer_id=int(existing['customer_id'].max()) + 1
+    )
+    customers_df['acquisition_date'] = _to_days(customers_df['acquisition_date']).astype(object)
+
+    # Existing customers keep buying after their last purchase. Transactions were
+    # simulated up to their own last day, which can be past the performance
+    # horizon, so only purchases after that day are new.
+    last_purchase = _last_purchases(source_dir, fmt, int(existing['customer_id'].max()))
+    transaction_horizon = max(last_purchase.max().astype('datetime64[D]'), horizon)
+    existing_ids = existing['customer_id'].to_numpy(dtype=np.int64)
+    repeat_customer, repeat_dates, repeat_values, discounts = _simulate_repeats(
+        last_purchase[existing_ids].astype('datetime64[D]'),
+        existing['first_order_value'].to_numpy(dtype=float),
+        existing['customer_segment'].astype(str).to_numpy(),
+        transaction_rng, last_day
+    )
+    new_repeat = repeat_dates > transaction_horizon
+    continuing = pd.DataFrame({
+        'customer_id': existing_ids[repeat_customer[new_repeat]],
+        'transaction_date': repeat_dates[new_repeat],
+        'order_value': np.round(repeat_values[new_repeat], 2),
+        'products_purchased': transaction_rng.integers(1, 5, new_repeat.sum()),
+        'discount_applied': discounts[new_repeat]
+    })
+    transaction_customer, columns = _simulate_transactions(
+        _to_days(customers_df['acquisition_date']),
+        customers_df['first_order_value'].to_numpy(dtype=float),
+        customers_df['customer_segment'].to_numpy(),
+        transaction_rng, last_day
+    )
+    columns['customer_id'] = customers_df['customer_id'].to_numpy()[transaction_customer]
+    transactions_df = pd.concat([continuing, pd.DataFrame(columns)], ignore_index=True)
+    first_transaction_id = int(_dataset_max(source_dir, 'transactions', 'transaction_id', fmt)) + 1
+    transactions_df.insert(0, 'transaction_id',
+                           np.arange(first_transaction_id, first_transaction_id + len(transactions_df)))
+    transactions_df = transactions_df[['transaction_id', 'customer_id', 'transaction_date', 'order_value',
+                                       'products_purchased', 'discount_applied']]
+    transactions_df['transaction_date'] = transactions_df['transaction_date'].to_numpy().astype(
+        'datetime64[D]').astype(object)
+
+    first_test_id = int(_dataset_max(source_dir, 'ab_tests', 'test_id', fmt)) + 1
+    ab_tests_df = generate_ab_tests(launched, first_test_id, ab_test_rng) if len(launched) else pd.DataFrame()
+
+    frames = {
+        'campaigns': changed_campaigns,
+        'daily_performance': daily_perf_df,
+        'customers': customers_df,
+        'transactions': transactions_df,
+        'ab_tests': ab_tests_df,
+    }
+    channel_lookups = {
+        'daily_performance': all_campaigns.set_index('campaign_id')['channel'].astype(str),
+        'transactions': pd.concat([existing.set_index('customer_id')['channel'].astype(str),
+                                   customers_df.set_index('customer_id')['channel']]),
+    }
+    in_place = os.path.abspath(output_dir) == os.path.abspath(source_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    for name, df in frames.items():
+        if not len(df):
+            continue
+        df = apply_schema(df)
+        if in_place and name == 'campaigns':
+            write_dataset(apply_schema(all_campaigns.sort_values('campaign_id', ignore_index=True)),
+                          output_dir, name, fmt)
+        elif in_place:
+            append_dataset(df, output_dir, name, fmt, channel_lookups.get(name))
+        else:
+            write_dataset(df, output_dir, name, fmt, channel_lookups.get(name))
+
+    counts = {name: len(df) for name, df in frames.items()}
+    print(f"Extended {source_dir} from {first_day} to {last_day}:")
+    for name, count in counts.items():
+        print(f"  - {name}: {count:,} new rows")
+    return counts
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Generate synthetic marketing analytics datasets")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Scale factor applied to campaign and customer counts (default: 1)")
+    parser.add_argument('--output-dir', default='scripts/data',
+                        help="Directory for the generated files (default: scripts/data)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Write fixed-size chunks straight to disk to keep memory bounded")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Rows per chunk in streaming mode (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument('--vectorized', action='store_true',
+                        help="Use the NumPy engines for the in-memory mode")
+    parser.add_argument('--format', choices=FORMATS, default='csv', dest='fmt',
+                        help="Output format; Parquet partitions daily_performance and transactions "
+                             "by month and channel (default: csv)")
+    parser.add_argument('--workers', type=int,
+                        help="Generate in shards across this many processes (same output for any count)")
+    parser.add_argument('--seed', type=int, default=SEED,
+                        help=f"Base seed for sharded generation (default: {SEED})")
+    parser.add_argument('--extend-from',
+                        help="Extend the outputs in this directory up to --end-date, writing only new rows "
+                             "(appended in place when it is also --output-dir)")
+    parser.add_argument('--end-date',
+                        help="New last day (YYYY-MM-DD) for --extend-from")
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers is not None and args.stream:
+        parser.error("--workers and --stream cannot be combined")
+    if bool(args.extend_from) != bool(args.end_date):
+        parser.error("--extend-from and --end-date must be given together")
+    return args
+
+@traced('generate.main')
+def main(argv=None):
+    """Generate all datasets and save to CSV"""
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    print("Generating marketing analytics datasets...")
+
+    if args.extend_from:
+        generate_extension(args.extend_from, args.end_date, args.output_dir, seed=args.seed)
+        return
+
+    if args.stream:
+        generate_streaming(args.output_dir, scale=args.scale, chunk_size=args.chunk_size, fmt=args.fmt)
+        return
+    
+    if args.workers is not None:
+        print(f"\n1-4. Generating campaigns, performance, customers and transactions on {args.workers} workers...")
+        campaigns_df, daily_perf_df, customers_df, transactions_df = generate_sharded(
+            args.workers, scale=args.scale, seed=args.seed
+        )
+        print(f"   Generated {len(campaigns_df)} campaigns, {len(daily_perf_df)} daily performance records, "
+              f"{len(customers_df)} customers and {len(transactions_df)} transactions")
+    else:
+        print("\n1. Generating campaigns...")
+        campaigns_df = generate_campaigns(max(1, round(NUM_CAMPAIGNS * args.scale)))
+        print(f"   Generated {len(campaigns_df)} campaigns")
+
+        print("\n2. Generating daily performance data...")
+        daily_perf_df = generate_daily_performance(campaigns_df, vectorized=args.vectorized)
+        print(f"   Generated {len(daily_perf_df)} daily performance records")
+
+        print("\n3. Generating customer acquisitions...")
+        customers_df = generate_customers(campaigns_df, daily_perf_df, vectorized=args.vectorized,
+                                          max_customers=max(1, round(NUM_CUSTOMERS * args.scale)))
+        print(f"   Generated {len(customers_df)} customers")
+
+        print("\n4. Generating transactions...")
+        transactions_df = generate_transactions(customers_df, vectorized=args.vectorized)
+        print(f"   Generated {len(transactions_df)} transactions")
     
     print("\n5. Generating A/B tests...")
     ab_tests_df = generate_ab_tests(campaigns_df)
     print(f"   Generated {len(ab_tests_df)} A/B test records")
     
-# Save to CSV
-    print("\n6. Saving datasets to CSV...")
-    campaigns_df.to_csv('scripts/data/campaigns.csv', index=False)
-    daily_perf_df.to_csv('scripts/data/daily_performance.csv', index=False)
-    customers_df.to_csv('scripts/data/customers.csv', index=False)
-    transactions_df.to_csv('scripts/data/transactions.csv', index=False)
-    ab_tests_df.to_csv('scripts/data/ab_tests.csv', index=False)
+    print("\n6. Applying compact dtypes...")
+    campaigns_df = apply_schema(campaigns_df, 'campaigns', report=True)
+    daily_perf_df = apply_schema(daily_perf_df, 'daily_performance', report=True)
+    customers_df = apply_schema(customers_df, 'customers', report=True)
+    transactions_df = apply_schema(transactions_df, 'transactions', report=True)
+    ab_tests_df = apply_schema(ab_tests_df, 'ab_tests', report=True)
+
+    # Save to CSV or Parquet
+    print(f"\n7. Saving datasets to {args.fmt.upper()}...")
+    with span('generate.write', format=args.fmt) as stage:
+        write_dataset(campaigns_df, args.output_dir, 'campaigns', args.fmt)
+        write_dataset(daily_perf_df, args.output_dir, 'daily_performance', args.fmt,
+                      campaigns_df.set_index('campaign_id')['channel'])
+        write_dataset(customers_df, args.output_dir, 'customers', args.fmt)
+        write_dataset(transactions_df, args.output_dir, 'transactions', args.fmt,
+                      customers_df.set_index('customer_id')['channel'])
+        write_dataset(ab_tests_df, args.output_dir, 'ab_tests', args.fmt)
+        frames = {'campaigns': campaigns_df, 'daily_performance': daily_perf_df, 'customers': customers_df,
+                  'transactions': transactions_df, 'ab_tests': ab_tests_df}
+        stage.add(rows_out=sum(len(df) for df in frames.values()),
+                  bytes_out=sum(dataset_bytes(args.output_dir, name, args.fmt) for name in frames))
     
     print("\n✅ All datasets generated successfully!")
     print("\nDataset Summary:")
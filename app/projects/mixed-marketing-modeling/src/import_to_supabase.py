@@ -1,175 +1,583 @@
 """
 Import Marketing Data to Supabase
-Loads CSV files into PostgreSQL database
+Streams CSV or Parquet files into PostgreSQL database as idempotent upserts
 """
 
+import argparse
+import json
 import os
+import random
+import threading
+import time
+import numpy as np
 import pandas as pd
-from supabase import create_client, Client
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime
 
+from backends import PRIMARY_KEYS, UPSERT_KEYS, get_backend
+from data_acquisition import invalidate_cache
+from instrumentation import propagate, span, traced
+from schema import encode_for_text
+from storage import DATE_COLUMNS, dataset_path, detect_format, iter_dataset
+
 # load environment variables from .env.local
 load_dotenv(dotenv_path=".env.local")
 
-# Supabase configuration
-SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+# The target backend (Supabase unless MARKETING_BACKEND=local) is created on
+# first use, so credentials are only checked once an import actually starts.
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-    raise ValueError("Supabase URL or Service Role Key not found in environment variables. Check .env.local file.")
+DATA_DIR = "scripts/data"
 
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# Rows read from disk at a time; only one chunk's records are held in memory
+DEFAULT_CHUNK_SIZE = 50000
 
-def import_campaigns():
-    """Import marketing campaigns from CSV to Supabase"""
-    campaigns_df = pd.read_csv("scripts/data/campaigns.csv")
-    # Convert dates to strings
-    campaigns_df['start_date'] = pd.to_datetime(campaigns_df['start_date']).dt.strftime('%Y-%m-%d')
-    campaigns_df['end_date'] = pd.to_datetime(campaigns_df['end_date']).dt.strftime('%Y-%m-%d')
+# Tables imported together in each wave; a wave starts only after every table
+# it references through a foreign key has finished
+IMPORT_WAVES = [
+    ['campaigns'],
+    ['daily_performance', 'customers', 'ab_tests'],
+    ['transactions']
+]
+
+# Batches in flight at once, across all tables of a wave
+DEFAULT_CONCURRENCY = 4
+
+# Starting batch size; it then grows or shrinks with observed latency
+DEFAULT_BATCH_SIZE = 500
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 5000
+
+# A batch slower than this, or larger than the payload limit, halves the size
+TARGET_BATCH_SECONDS = 2.0
+MAX_PAYLOAD_BYTES = 1024 ** 2
+
+DEFAULT_MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+DEFAULT_CHECKPOINT = os.path.join(DATA_DIR, ".import_checkpoint.json")
+
+# Row keys and content hashes from the last successful import, used by --delta
+DEFAULT_MANIFEST_DIR = os.path.join(DATA_DIR, ".import_manifest")
+
+# Keys per delete request
+DELETE_BATCH_SIZE = 500
+
+class AdaptiveBatchSize:
+    """
+    Additive-increase / multiplicative-decrease batch sizing
+
+    Each fast batch grows the size by a fixed step; a slow, oversized or
+    failed batch halves it. The size is also capped so that the estimated
+    payload stays under max_payload_bytes.
+    """
+
+    def __init__(self, initial=DEFAULT_BATCH_SIZE, minimum=MIN_BATCH_SIZE, maximum=MAX_BATCH_SIZE,
+                 target_seconds=TARGET_BATCH_SECONDS, max_payload_bytes=MAX_PAYLOAD_BYTES):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = max(1, initial // 4)
+        self.target_seconds = target_seconds
+        self.max_payload_bytes = max_payload_bytes
+        self.bytes_per_row = None
+        self._lock = threading.Lock()
+
+    def next_size(self):
+        """Rows to put in the next batch"""
+        with self._lock:
+            size = self.size
+            if self.bytes_per_row:
+                size = min(size, int(self.max_payload_bytes / self.bytes_per_row))
+            return max(self.minimum, size)
+
+    def record(self, rows, seconds, payload_bytes):
+        """Adjust the size after a successful batch"""
+        with self._lock:
+            if rows:
+                self.bytes_per_row = payload_bytes / rows
+            if seconds > self.target_seconds or payload_bytes > self.max_payload_bytes:
+                self.size = max(self.minimum, self.size // 2)
+            else:
+                self.size = min(self.maximum, self.size + self.step)
+
+    def failed(self):
+        """Back off after a failed batch"""
+        with self._lock:
+            self.size = max(self.minimum, self.size // 2)
+
+class ImportCheckpoint:
+    """
+    JSON record of the row ranges already imported for each table
+
+    Each table's progress is tied to a signature of its source file, so a
+    regenerated file starts over instead of resuming against stale ranges.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.tables = json.load(f)
+        except (OSError, ValueError):
+            self.tables = {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.tables, f)
+        os.replace(tmp_path, self.path)
+
+    def begin(self, table, signature):
+        """Start or resume a table, discarding progress recorded for another version of its file"""
+        with self._lock:
+            entry = self.tables.get(table)
+            if entry is None or entry['signature'] != signature:
+                self.tables[table] = {'signature': signature, 'ranges': []}
+
+    def pending(self, table, start, end):
+        """Row ranges within [start, end) of a table that still need importing"""
+        with self._lock:
+            gaps = []
+            position = start
+            for done_start, done_end in self.tables[table]['ranges']:
+                if done_end <= position or done_start >= end:
+                    continue
+                if done_start > position:
+                    gaps.append((position, done_start))
+                position = max(position, done_end)
+            if position < end:
+                gaps.append((position, end))
+            return gaps
+
+    def complete(self, table, start, end):
+        """Mark rows [start, end) of a table as imported"""
+        with self._lock:
+            ranges = sorted(self.tables[table]['ranges'] + [[start, end]])
+            merged = [ranges[0]]
+            for range_start, range_end in ranges[1:]:
+                if range_start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], range_end)
+                else:
+                    merged.append([range_start, range_end])
+            self.tables[table]['ranges'] = merged
+            self._save()
+
+    def clear(self):
+        """Forget all progress"""
+        with self._lock:
+            self.tables = {}
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+def _with_retries(function, max_retries, on_retry=None):
+    """Call function, retrying failures with exponential backoff and full jitter"""
+    for attempt in range(max_retries + 1):
+        try:
+            return function()
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            if on_retry is not None:
+                on_retry(e, delay)
+            time.sleep(delay)
+
+def _row_hashes(df):
+    """
+    Content hash per row that doesn't depend on the dtypes pandas inferred for the chunk
+
+    A CSV chunk with a missing value reads an integer column as float, and a
+    boolean one as object, so numbers and booleans are hashed as float64 and
+    missing values as None.
+    """
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)
+                or (series.dtype == object and series.dropna().map(type).eq(bool).all()
+                    and series.notna().any())):
+            series = series.astype('float64')
+        else:
+            series = series.astype(object).where(series.notna(), None)
+        columns[column] = series
+    # Stored as int64 so the hashes survive a CSV round trip
+    return pd.util.hash_pandas_object(pd.DataFrame(columns, index=df.index), index=False).to_numpy().view(np.int64)
+
+class RowManifest:
+    """
+    Key and content hash of every row in a table's last successful import
+
+    diff() compares a chunk against it and returns which rows are new or
+    changed; keys never seen again by the end of the run were deleted from
+    the source.
+    """
+
+    def __init__(self, directory, table):
+        self.path = os.path.join(directory, f"{table}.csv.gz")
+        self.key_columns = UPSERT_KEYS[table].split(',')
+        self._pieces = []
+        self._lock = threading.Lock()
+        self.previous = None
+        if os.path.exists(self.path):
+            self.previous = pd.read_csv(self.path)
+            self._index = self._keys(self.previous)
+            self._hashes = self.previous['row_hash'].to_numpy()
+            self._seen = np.zeros(len(self.previous), dtype=bool)
+
+    def _keys(self, df):
+        if len(self.key_columns) == 1:
+            return pd.Index(df[self.key_columns[0]])
+        return pd.MultiIndex.from_frame(df[self.key_columns])
+
+    def diff(self, df):
+        """Record a chunk's hashes and return a mask of its rows that need sending"""
+        hashes = _row_hashes(df)
+        with self._lock:
+            self._pieces.append(df[self.key_columns].assign(row_hash=hashes))
+            if self.previous is None:
+                return np.ones(len(df), dtype=bool)
+            positions = self._index.get_indexer(self._keys(df))
+            known = positions >= 0
+            self._seen[positions[known]] = True
+            changed = np.ones(len(df), dtype=bool)
+            changed[known] = self._hashes[positions[known]] != hashes[known]
+            return changed
 
-    # Insert in batches
-    batch_size = 100
-    records = campaigns_df.to_dict('records')
+    def deleted_keys(self):
+        """Keys in the previous import that the source no longer has"""
+        if self.previous is None:
+            return pd.DataFrame(columns=self.key_columns)
+        return self.previous.loc[~self._seen, self.key_columns]
 
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i+batch_size]
-        result = supabase.table('campaigns').insert(batch).execute()
-        print(f"  Inserted {len(batch)} campaigns")
+    def save(self):
+        """Replace the stored manifest with the hashes recorded in this run"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        df = pd.concat(self._pieces, ignore_index=True) if self._pieces else pd.DataFrame(
+            columns=self.key_columns + ['row_hash'])
+        tmp_path = self.path + '.tmp'
+        df.to_csv(tmp_path, index=False, compression='gzip')
+        os.replace(tmp_path, self.path)
 
-    print(f"✅ Imported {len(campaigns_df)} campaigns\n")
+class BulkImporter:
+    """
+    Sends a table's rows as concurrent batches through the active backend
 
-def import_daily_performance():
+    At most `concurrency` batches are in flight at once, batch sizes follow
+    AdaptiveBatchSize, failed batches are retried with backoff, and completed
+    row ranges are written to the checkpoint so an interrupted run resumes.
+    With delta=True only rows whose hash differs from the manifest of the
+    previous import are sent, and rows that disappeared are deleted.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, concurrency=DEFAULT_CONCURRENCY,
+                 batch_size=DEFAULT_BATCH_SIZE, max_retries=DEFAULT_MAX_RETRIES,
+                 checkpoint_path=DEFAULT_CHECKPOINT, chunk_size=DEFAULT_CHUNK_SIZE,
+                 manifest_dir=DEFAULT_MANIFEST_DIR, delta=False):
+        self.data_dir = data_dir
+        self.chunk_size = chunk_size
+        self.manifest_dir = manifest_dir
+        self.delta = delta
+        self.manifests = {}
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.checkpoint = ImportCheckpoint(checkpoint_path)
+        self.stats = {}
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _signature(self, table):
+        """Size and modification time of a table's file (or Parquet directory)"""
+        path = dataset_path(self.data_dir, table, detect_format(self.data_dir, table))
+        paths = [path]
+        if os.path.isdir(path):
+            paths = [os.path.join(root, file) for root, _, files in os.walk(path) for file in files]
+        stats = [os.stat(p) for p in paths]
+        return f"{sum(st.st_size for st in stats)}:{int(max(st.st_mtime for st in stats))}"
+
+    def _chunks(self, table, manifest):
+        """
+        Yield (first row offset, row count, positions, records) per chunk
+
+        Dates are formatted as YYYY-MM-DD strings. Only rows that need
+        sending become records; positions holds their row numbers.
+        """
+        offset = 0
+        for df in iter_dataset(self.data_dir, table, chunk_size=self.chunk_size):
+            df = encode_for_text(df)
+            for column in DATE_COLUMNS.get(table, []):
+                if column in df.columns:
+                    df[column] = pd.to_datetime(df[column]).dt.strftime('%Y-%m-%d')
+            send = manifest.diff(df)
+            if not self.delta:
+                send[:] = True
+            yield offset, len(df), np.flatnonzero(send) + offset, df[send].to_dict('records')
+            offset += len(df)
+
+    def _send(self, table, records, batch_size, stats):
+        """Send one batch, with retries, and return its payload size"""
+        payload_bytes = len(json.dumps(records, default=str))
+
+        def on_retry(error, delay):
+            batch_size.failed()
+            with stats['lock']:
+                stats['retries'] += 1
+            print(f"  {table}: batch failed ({error}), retrying in {delay:.1f}s")
+
+        started = time.perf_counter()
+        # Upserts make retries and re-runs safe: a batch that reached the
+        # server before a timeout is simply written again
+        _with_retries(lambda: get_backend().upsert(table, records, on_conflict=UPSERT_KEYS[table]),
+                      self.max_retries, on_retry)
+        batch_size.record(len(records), time.perf_counter() - started, payload_bytes)
+        return payload_bytes
+
+    def import_table(self, table):
+        """Stream one table in chunks, skipping row ranges the checkpoint marks as done"""
+        with span('import.table', table=table) as stage:
+            try:
+                stats = self._import_table(table)
+            finally:
+                # Upserted rows keep their created_at, so the cache's
+                # incremental refresh would never see them
+                invalidate_cache(table)
+            stage.add(rows_in=stats['read'], rows_out=stats['rows'], bytes_out=stats['bytes'],
+                      retries=stats['retries'])
+            return stats
+
+    def _import_table(self, table):
+        self.checkpoint.begin(table, self._signature(table))
+        manifest = self.manifests[table] = RowManifest(self.manifest_dir, table)
+        stats = {'rows': 0, 'read': 0, 'skipped': 0, 'unchanged': 0, 'deleted': 0, 'retries': 0, 'bytes': 0,
+                 'seconds': 0.0, 'lock': threading.Lock()}
+        self.stats[table] = stats
+        batch_size = AdaptiveBatchSize(initial=self.batch_size, minimum=min(MIN_BATCH_SIZE, self.batch_size))
+        errors = []
+        started = time.perf_counter()
+
+        def run(records, start, end):
+            try:
+                if not errors:
+                    payload_bytes = self._send(table, records, batch_size, stats)
+                    self.checkpoint.complete(table, start, end)
+                    with stats['lock']:
+                        stats['rows'] += len(records)
+                        stats['bytes'] += payload_bytes
+            except Exception as e:
+                errors.append(e)
+            finally:
+                self._slots.release()
+
+        futures = []
+        for offset, length, positions, records in self._chunks(table, manifest):
+            gaps = self.checkpoint.pending(table, offset, offset + length)
+            stats['read'] += length
+            stats['skipped'] += length - sum(end - start for start, end in gaps)
+            stats['unchanged'] += length - len(records)
+            for gap_start, gap_end in gaps:
+                # Batches cover row ranges of the file but only carry the rows
+                # that need sending, so the checkpoint stays in file offsets
+                first, last = np.searchsorted(positions, [gap_start, gap_end])
+                position = gap_start
+                if first == last:
+                    self.checkpoint.complete(table, gap_start, gap_end)
+                while first < last and not errors:
+                    self._slots.acquire()
+                    stop = min(last, first + batch_size.next_size())
+                    end = gap_end if stop == last else int(positions[stop - 1]) + 1
+                    futures.append(self._pool.submit(run, records[first:stop], position, end))
+                    first, position = stop, end
+            if errors:
+                break
+        for future in futures:
+            future.result()
+
+        stats['seconds'] = time.perf_counter() - started
+        stats['batch_size'] = batch_size.next_size()
+        if errors:
+            raise errors[0]
+        if not stats['rows']:
+            print(f"  {table}: nothing to send ({stats['skipped']:,} resumed, {stats['unchanged']:,} unchanged)")
+            return stats
+        print(f"  {table}: {stats['rows']:,} rows in {stats['seconds']:.1f}s "
+              f"({stats['rows'] / max(stats['seconds'], 1e-9):,.0f} rows/sec, "
+              f"{stats['retries']} retries, {stats['unchanged']:,} unchanged, "
+              f"final batch size {stats['batch_size']})")
+        return stats
+
+    def delete_removed(self, table):
+        """Delete rows whose keys were in the previous import but not in this one"""
+        keys = self.manifests[table].deleted_keys()
+        if not len(keys):
+            return 0
+        *group_columns, key_column = self.manifests[table].key_columns
+        groups = keys.groupby(group_columns) if group_columns else [((), keys)]
+        for _, group_keys in groups:
+            group = group_keys[group_columns].iloc[0].tolist()
+            filters = [('eq', column, value) for column, value in zip(group_columns, group)]
+            values = group_keys[key_column].tolist()
+            for i in range(0, len(values), DELETE_BATCH_SIZE):
+                batch = filters + [('in_', key_column, values[i:i + DELETE_BATCH_SIZE])]
+                _with_retries(lambda: get_backend().delete(table, batch), self.max_retries)
+        self.stats[table]['deleted'] = len(keys)
+        invalidate_cache(table)
+        print(f"  {table}: deleted {len(keys):,} rows no longer in the source")
+        return len(keys)
+
+    @traced('import.run')
+    def run(self, waves=IMPORT_WAVES):
+        """
+        Import every wave in order, running the tables of a wave in parallel
+
+        In delta mode, removed rows are deleted afterwards, children first.
+        Manifests are saved only once everything succeeded.
+        """
+        for wave in waves:
+            print(f"Importing {', '.join(wave)}...")
+            with span('import.wave', tables=wave), ThreadPoolExecutor(max_workers=len(wave)) as pool:
+                for future in [pool.submit(propagate(self.import_table), table) for table in wave]:
+                    future.result()
+            print()
+        if self.delta:
+            print("Deleting removed rows...")
+            with span('import.delete_removed'):
+                for wave in reversed(waves):
+                    for table in wave:
+                        self.delete_removed(table)
+            print()
+        for manifest in self.manifests.values():
+            manifest.save()
+
+    def report(self):
+        """Per-table throughput summary"""
+        lines = []
+        for table, stats in self.stats.items():
+            rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+            lines.append(f"  {table:<18} {stats['rows']:>10,} rows  {rate:>10,.0f} rows/sec  "
+                         f"{stats['retries']:>3} retries  {stats['skipped']:>10,} resumed  "
+                         f"{stats['unchanged']:>10,} unchanged  {stats['deleted']:>8,} deleted")
+        return "\n".join(lines)
+
+    def close(self):
+        self._pool.shutdown()
+
+def import_campaigns(importer=None):
+    """Import marketing campaigns from CSV to Supabase"""
+    return (importer or BulkImporter()).import_table('campaigns')
+
+def import_daily_performance(importer=None):
     """Import daily performance metrics from CSV to Supabase"""
-    print("Importing daily performance...")
-    daily_performance_df = pd.read_csv("scripts/data/daily_performance.csv")
-    
-    # Convert date to string
-    daily_performance_df['date'] = pd.to_datetime(daily_performance_df['date']).dt.strftime('%Y-%m-%d')
-    
-    # Insert in batches
-    batch_size = 500
-    records = daily_performance_df.to_dict('records')
-    
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i+batch_size]
-        result = supabase.table('daily_performance').insert(batch).execute()
-        print(f"  Inserted {len(batch)} records")
-    
-    print(f"✅ Imported {len(daily_performance_df)} daily performance records\n")
-
-def import_customers():
+    return (importer or BulkImporter()).import_table('daily_performance')
+
+def import_customers(importer=None):
     """Import customer acquisition data from CSV to Supabase"""
-    print("Importing customers...")
-    customers_df = pd.read_csv("scripts/data/customers.csv")
-    
-    # Convert date to string
-    customers_df['acquisition_date'] = pd.to_datetime(customers_df['acquisition_date']).dt.strftime('%Y-%m-%d')
-    
-    # Insert in batches
-    batch_size = 500
-    records = customers_df.to_dict('records')
-    
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i+batch_size]
-        result = supabase.table('customers').insert(batch).execute()
-        print(f"  Inserted {len(batch)} customers")
-    
-    print(f"✅ Imported {len(customers_df)} customers\n")
-
-def import_transactions():
+    return (importer or BulkImporter()).import_table('customers')
+
+def import_transactions(importer=None):
     """Import customer transaction history from CSV to Supabase"""
-    print("Importing transactions...")
-    transactions_df = pd.read_csv("scripts/data/transactions.csv")
-    
-    # Convert date to string
-    transactions_df['transaction_date'] = pd.to_datetime(transactions_df['transaction_date']).dt.strftime('%Y-%m-%d')
-    
-    # Insert in batches
-    batch_size = 500
-    records = transactions_df.to_dict('records')
-    
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i+batch_size]
-        result = supabase.table('transactions').insert(batch).execute()
-        print(f"  Inserted {len(batch)} transactions")
-    
-    print(f"✅ Imported {len(transactions_df)} transactions\n")
-
-def import_ab_tests():
+    return (importer or BulkImporter()).import_table('transactions')
+
+def import_ab_tests(importer=None):
     """Import A/B test results from CSV to Supabase"""
-    print("Importing A/B tests...")
-    ab_tests_df = pd.read_csv("scripts/data/ab_tests.csv")
-    
-    # Convert dates to strings
-    ab_tests_df['start_date'] = pd.to_datetime(ab_tests_df['start_date']).dt.strftime('%Y-%m-%d')
-    ab_tests_df['end_date'] = pd.to_datetime(ab_tests_df['end_date']).dt.strftime('%Y-%m-%d')
-    
-    # Insert in batches
-    batch_size = 100
-    records = ab_tests_df.to_dict('records')
-    
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i+batch_size]
-        result = supabase.table('ab_tests').insert(batch).execute()
-        print(f"  Inserted {len(batch)} A/B tests")
-    
-    print(f"✅ Imported {len(ab_tests_df)} A/B test records\n")
-
-def clear_all_tables():
+    return (importer or BulkImporter()).import_table('ab_tests')
+
+def clear_all_tables(confirm=True):
     """Clear all data from tables (use with caution!)"""
     print("⚠️  WARNING: This will delete all existing data!")
-    response = input("Are you sure you want to continue? (yes/no): ")
-    
-    if response.lower() != 'yes':
-        print("Import cancelled.")
-        return False
-    
+    if confirm:
+        response = input("Are you sure you want to continue? (yes/no): ")
+
+        if response.lower() != 'yes':
+            print("Import cancelled.")
+            return False
+
     print("\nClearing tables...")
     tables = ['ab_tests', 'transactions', 'customers', 'daily_performance', 'campaigns']
-    
+
     for table in tables:
         try:
-            # Delete all records
-            supabase.table(table).delete().neq('campaign_id', 0).execute()
+            # Delete all records (PostgREST needs a filter; every id is positive)
+            get_backend().delete(table, [('gt', PRIMARY_KEYS[table], 0)])
+            invalidate_cache(table)
             print(f"  Cleared {table}")
         except Exception as e:
             print(f"  Error clearing {table}: {e}")
-    
+
     print("✅ All tables cleared\n")
     return True
 
-def main():
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Import generated marketing data into Supabase")
+    parser.add_argument('--data-dir', default=DATA_DIR,
+                        help=f"Directory holding the generated CSV files (default: {DATA_DIR})")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Batches in flight at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Starting rows per batch, adapted to latency (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES,
+                        help=f"Retries per batch before giving up (default: {DEFAULT_MAX_RETRIES})")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Rows read from disk at a time (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument('--clear', action='store_true',
+                        help="Delete all existing rows before importing; not needed to re-run, "
+                             "since rows are upserted")
+    parser.add_argument('--delta', action='store_true',
+                        help="Only send rows added or changed since the last import, and delete "
+                             "removed ones (assumes the database still matches that import)")
+    parser.add_argument('--checkpoint', default=None,
+                        help="Checkpoint file used to resume an interrupted import "
+                             "(default: <data-dir>/.import_checkpoint.json)")
+    return parser.parse_args(argv)
+
+@traced('import.main')
+def main(argv=None):
     """Main import function"""
+    args = parse_args(argv)
     print("=" * 60)
     print("Marketing Analytics Data Import to Supabase")
     print("=" * 60)
     print()
-    
-    # Option to clear existing data
-    print("Do you want to clear existing data before importing?")
-    clear = input("(yes/no): ")
-    
-    if clear.lower() == 'yes':
-        if not clear_all_tables():
-            return
-    
+
+    importer = BulkImporter(
+        data_dir=args.data_dir,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        max_retries=args.max_retries,
+        checkpoint_path=args.checkpoint or os.path.join(args.data_dir, ".import_checkpoint.json"),
+        chunk_size=args.chunk_size,
+        manifest_dir=os.path.join(args.data_dir, ".import_manifest"),
+        delta=args.delta and not args.clear
+    )
+    if args.clear:
+        clear_all_tables(confirm=False)
+        importer.checkpoint.clear()
+    elif importer.checkpoint.tables:
+        print(f"Resuming from checkpoint {importer.checkpoint.path}\n")
+
     try:
-        # Import in order (respecting foreign keys)
-        import_campaigns()
-        import_daily_performance()
-        import_customers()
-        import_transactions()
-        import_ab_tests()
-        
+        # Import in waves (respecting foreign keys)
+        importer.run()
+        importer.checkpoint.clear()
+
         print("=" * 60)
         print("🎉 All data imported successfully!")
+        print(importer.report())
         print("=" * 60)
-        
+
     except Exception as e:
         print(f"\n❌ Error during import: {e}")
-        print("Import stopped. Some data may have been imported.")
+        print(f"Progress saved to {importer.checkpoint.path}; run the import again to resume.")
+    finally:
+        importer.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,382 @@
+"""
+Instrumentation Module
+Stage spans with wall/CPU time, peak memory, rows, bytes and retries, written to a JSON trace
+"""
+
+import atexit
+import collections
+import contextlib
+import cProfile
+import functools
+import itertools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Deque, Iterator, List, Optional
+
+import pandas as pd
+
+# Path of the JSON trace written at exit; spans are still timed when unset,
+# but only the most recent MEMORY_SPANS are kept, for summary()
+TRACE_ENV = 'MARKETING_TRACE'
+MEMORY_SPANS = 10000
+
+# Optional capture for root spans: 'cprofile', 'tracemalloc' or both, comma separated
+PROFILE_ENV = 'MARKETING_PROFILE'
+PROFILERS = ['cprofile', 'tracemalloc']
+
+# Functions (by cumulative time) and allocation sites (by size) kept per profiled span
+PROFILE_TOP = 25
+
+COUNTERS = ['rows_in', 'rows_out', 'bytes_in', 'bytes_out', 'retries']
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _rows(value) -> int:
+    """Rows in a DataFrame, a tuple of DataFrames or a dict of row counts (0 for anything else)"""
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(len(part) for part in value if isinstance(part, pd.DataFrame))
+    if isinstance(value, dict) and value and all(isinstance(v, int) for v in value.values()):
+        return sum(value.values())
+    return 0
+
+
+class Span:
+    """
+    One timed stage
+
+    Counters (rows in and out, bytes in and out, retries) may be added from
+    any thread while the span is open; attributes describe the stage, e.g.
+    the table or scale factor.
+    """
+
+    def __init__(self, span_id: int, name: str, parent_id: Optional[int], attributes: dict):
+        self.id = span_id
+        self.name = name
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.thread = threading.current_thread().name
+        self.started_at = time.time()
+        self.wall_seconds: Optional[float] = None
+        self.cpu_seconds: Optional[float] = None
+        self.peak_rss_mb: Optional[float] = None
+        self.traced_peak_mb: Optional[float] = None
+        self.error: Optional[str] = None
+        self.profile: Optional[dict] = None
+        self._traced_peak = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        """Add to counters, e.g. add(rows_out=500, bytes_out=48_000)"""
+        with self._lock:
+            for counter, value in counts.items():
+                self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def set(self, **attributes):
+        """Set attributes"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        record = {
+            'id': self.id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'thread': self.thread,
+            'started_at': self.started_at,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'peak_rss_mb': self.peak_rss_mb,
+            **self.counters,
+            'attributes': self.attributes,
+        }
+        for key in ('traced_peak_mb', 'error', 'profile'):
+            if getattr(self, key) is not None:
+                record[key] = getattr(self, key)
+        return record
+
+
+class Tracer:
+    """
+    Collects finished spans and writes them as one JSON trace
+
+    Spans nest per thread; propagate() carries the current span into worker
+    threads so their spans nest under it. CPU time is process-wide, so spans
+    running concurrently on threads each see the others' CPU as well.
+
+    With 'tracemalloc' profiling, tracing starts with the tracer and every
+    span records the peak traced allocation during its run, plus the top
+    allocation sites for root spans. With 'cprofile', each root span
+    (one without a parent) runs under cProfile, which only sees the thread
+    that started it; the hottest functions go into the trace and the full
+    profile next to it as a .prof file for snakeviz or pstats.
+    """
+
+    def __init__(self, path: Optional[str] = None, profile: Optional[List[str]] = None):
+        """
+        Args:
+            path: JSON trace file (None keeps only the last MEMORY_SPANS spans, in memory)
+            profile: Profilers to run, from PROFILERS
+        """
+        unknown = set(profile or []) - set(PROFILERS)
+        if unknown:
+            raise ValueError(f"Unknown profiler(s) {sorted(unknown)}, expected some of {PROFILERS}")
+        self.path = path
+        self.profile = list(profile or [])
+        # Without a file to write, a long-lived process would otherwise grow without bound
+        self.spans: Deque[Span] = collections.deque(maxlen=None if path else MEMORY_SPANS)
+        self.started_at = time.time()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiling = False
+        if 'tracemalloc' in self.profile and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self) -> Optional[Span]:
+        """Innermost open span on this thread"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time a stage; the span is yielded so counters can be added inside the block"""
+        parent = self.current()
+        span = Span(next(self._ids), name, parent.id if parent else None, attributes)
+        profiler = self._start_cprofile() if parent is None else None
+        tracing = tracemalloc.is_tracing() and 'tracemalloc' in self.profile
+        if tracing:
+            # Hand the peak so far to the parent before measuring this span's own
+            if parent is not None:
+                parent._traced_peak = max(parent._traced_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+        stack = self._stack()
+        stack.append(span)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.wall_seconds = time.perf_counter() - wall
+            span.cpu_seconds = time.process_time() - cpu
+            stack.pop()
+            span.peak_rss_mb = peak_rss_mb()
+            if tracing:
+                peak = max(span._traced_peak, tracemalloc.get_traced_memory()[1])
+                span.traced_peak_mb = peak / 1024 ** 2
+                if parent is not None:
+                    parent._traced_peak = max(parent._traced_peak, peak)
+                else:
+                    span.profile = dict(span.profile or {}, allocations=self._top_allocations())
+            if profiler is not None:
+                span.profile = dict(span.profile or {}, **self._stop_cprofile(profiler, span))
+            with self._lock:
+                self.spans.append(span)
+
+    @contextlib.contextmanager
+    def activate(self, span: Optional[Span]) -> Iterator[None]:
+        """Make span the current span on this thread, e.g. inside a worker thread"""
+        stack = self._stack()
+        if span is not None:
+            stack.append(span)
+        try:
+            yield
+        finally:
+            if span is not None:
+                stack.pop()
+
+    def propagate(self, function: Callable) -> Callable:
+        """Wrap function so it runs with the caller's current span active, on whatever thread runs it"""
+        span = self.current()
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.activate(span):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def record(self, **counts):
+        """Add counters to the current span, if there is one"""
+        span = self.current()
+        if span is not None:
+            span.add(**counts)
+
+    def _start_cprofile(self) -> Optional[cProfile.Profile]:
+        """Profile a root span, unless profiling is off or another root span is being profiled"""
+        if 'cprofile' not in self.profile:
+            return None
+        with self._lock:
+            if self._profiling:
+                return None
+            self._profiling = True
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger's) is already active
+            with self._lock:
+                self._profiling = False
+            return None
+        return profiler
+
+    def _stop_cprofile(self, profiler: cProfile.Profile, span: Span) -> dict:
+        profiler.disable()
+        with self._lock:
+            self._profiling = False
+        stats = pstats.Stats(profiler)
+        result = {}
+        if self.path:
+            result['prof_path'] = f"{os.path.splitext(self.path)[0]}.{span.id}.prof"
+            stats.dump_stats(result['prof_path'])
+        ranked = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+        result['functions'] = [
+            {'function': f"{filename}:{line}({function})", 'calls': calls,
+             'total_seconds': total, 'cumulative_seconds': cumulative}
+            for (filename, line, function), (_, calls, total, cumulative, _) in ranked
+        ]
+        return result
+
+    @staticmethod
+    def _top_allocations() -> List[dict]:
+        """Largest live allocation sites at the end of a root span"""
+        statistics = tracemalloc.take_snapshot().statistics('lineno')[:PROFILE_TOP]
+        return [{'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 'size_mb': stat.size / 1024 ** 2, 'count': stat.count} for stat in statistics]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.id)
+        return {
+            'command': sys.argv,
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'finished_at': time.time(),
+            'profile': self.profile,
+            'spans': [span.to_dict() for span in spans],
+        }
+
+    def summary(self) -> pd.DataFrame:
+        """Finished spans as a DataFrame, one row per span"""
+        records = self.to_dict()['spans']
+        return pd.DataFrame(records, columns=['id', 'parent_id', 'name', 'thread', 'started_at', 'wall_seconds',
+                                              'cpu_seconds', 'peak_rss_mb'] + COUNTERS + ['attributes'])
+
+    def write(self, path: Optional[str] = None) -> Optional[str]:
+        """Write the trace as JSON; returns the path (None when there is nowhere to write)"""
+        path = path or self.path
+        if not path:
+            return None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        os.replace(tmp_path, path)
+        return path
+
+
+def _profilers_from_env() -> List[str]:
+    return [name.strip() for name in os.getenv(PROFILE_ENV, '').split(',') if name.strip()]
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """
+    Return the active tracer, creating it on first use
+
+    MARKETING_TRACE names the JSON trace written at exit and
+    MARKETING_PROFILE turns on cProfile and/or tracemalloc capture.
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(os.getenv(TRACE_ENV) or None, _profilers_from_env())
+    return _tracer
+
+
+def set_tracer(tracer: Tracer):
+    """Use a specific tracer from now on, e.g. Tracer('trace.json', ['cprofile'])"""
+    global _tracer
+    _tracer = tracer
+
+
+@atexit.register
+def _write_at_exit():
+    if _tracer is not None and _tracer.spans:
+        _tracer.write()
+
+
+def span(name: str, **attributes):
+    """Context manager timing a stage on the active tracer"""
+    return get_tracer().span(name, **attributes)
+
+
+def current_span() -> Optional[Span]:
+    """Innermost open span on this thread"""
+    return get_tracer().current()
+
+
+def record(**counts):
+    """Add counters to the current span, if there is one"""
+    get_tracer().record(**counts)
+
+
+def propagate(function: Callable) -> Callable:
+    """Wrap function so it runs under the caller's current span in worker threads"""
+    return get_tracer().propagate(function)
+
+
+def traced(name: Optional[str] = None, **attributes) -> Callable:
+    """
+    Decorator running a function inside a span
+
+    Rows in are the rows of DataFrame arguments, rows out the rows of the
+    result (a DataFrame, a tuple of DataFrames or a dict of row counts).
+
+    Args:
+        name: Span name (default: the function's qualified name)
+        **attributes: Attributes recorded on every call
+    """
+    def decorate(function: Callable) -> Callable:
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes) as stage:
+                rows_in = sum(_rows(value) for value in itertools.chain(args, kwargs.values())
+                              if isinstance(value, pd.DataFrame))
+                if rows_in:
+                    stage.add(rows_in=rows_in)
+                result = function(*args, **kwargs)
+                rows_out = _rows(result)
+                if rows_out:
+                    stage.add(rows_out=rows_out)
+                return result
+        return wrapper
+    return decorate
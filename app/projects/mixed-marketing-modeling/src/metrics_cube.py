@@ -0,0 +1,201 @@
+"""
+Metrics Cube Module
+Prefix-summed daily metrics per campaign cell, for O(1) date-range rollups
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Union
+
+MEASURES = ['spend', 'revenue', 'clicks', 'impressions', 'conversions']
+
+# Campaign attributes each cell carries; rollups can group and filter by any of them
+DIMENSIONS = ['campaign_id', 'campaign_name', 'channel', 'target_audience']
+
+
+def _day(value) -> int:
+    """Days since 1970-01-01"""
+    return int(np.datetime64(pd.Timestamp(value).date(), 'D').astype(np.int64))
+
+
+def add_ratios(df: pd.DataFrame) -> pd.DataFrame:
+    """ROAS, CAC, CTR, CVR, CPC, profit and profit margin from summed measures"""
+    df = df.copy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['roas'] = df['revenue'] / df['spend'].replace(0, np.nan)
+        df['cac'] = df['spend'] / df['conversions'].replace(0, np.nan)
+        df['ctr'] = df['clicks'] / df['impressions'].replace(0, np.nan) * 100
+        df['cvr'] = df['conversions'] / df['clicks'].replace(0, np.nan) * 100
+        df['cpc'] = df['spend'] / df['clicks'].replace(0, np.nan)
+        df['profit'] = df['revenue'] - df['spend']
+        df['profit_margin'] = df['profit'] / df['revenue'].replace(0, np.nan) * 100
+    return df
+
+
+class MetricsCube:
+    """
+    Cumulative daily sums of spend, revenue, clicks, impressions and conversions
+
+    Cells are campaigns (which fix channel and target audience), so the
+    cube covers date x channel x campaign x target_audience. prefix[d, cell]
+    holds the totals of all days before day d, so any date range costs one
+    subtraction per cell; grouping the handful of cells and the derived
+    ratios are computed at query time.
+
+    The prefixes live in a buffer whose day and cell capacity doubles when
+    full, so appending days or campaigns doesn't copy the whole history.
+    """
+
+    def __init__(self):
+        self.first_day: Optional[int] = None
+        self.cells = pd.DataFrame(columns=DIMENSIONS)
+        self._buffer = np.zeros((1, 0, len(MEASURES)))
+        self._rows = 1
+
+    @property
+    def prefix(self) -> np.ndarray:
+        """(days + 1, cells, measures) prefix sums, a view of the used part of the buffer"""
+        return self._buffer[:self._rows, :len(self.cells)]
+
+    @prefix.setter
+    def prefix(self, value: np.ndarray):
+        self._buffer = value
+        self._rows = len(value)
+
+    def _reserve(self, rows: int, cells: int):
+        """Make room for rows prefixes of cells cells, at least doubling whichever capacity runs out"""
+        capacity_rows, capacity_cells = self._buffer.shape[:2]
+        if rows <= capacity_rows and cells <= capacity_cells:
+            return
+        if rows > capacity_rows:
+            capacity_rows = max(rows, 2 * capacity_rows)
+        if cells > capacity_cells:
+            capacity_cells = max(cells, 2 * capacity_cells)
+        # Unused cells stay zero, so cells registered later start from empty prefixes
+        buffer = np.zeros((capacity_rows, capacity_cells, len(MEASURES)))
+        used = self.prefix
+        buffer[:used.shape[0], :used.shape[1]] = used
+        self._buffer = buffer
+
+    @property
+    def days(self) -> int:
+        return len(self.prefix) - 1
+
+    @property
+    def last_day(self) -> Optional[int]:
+        return None if self.first_day is None else self.first_day + self.days - 1
+
+    @classmethod
+    def build(cls, daily_performance: pd.DataFrame, campaigns: Optional[pd.DataFrame] = None) -> 'MetricsCube':
+        """Cube over daily_performance rows (campaign attributes come from campaigns when not on the rows)"""
+        cube = cls()
+        cube.append(daily_performance, campaigns)
+        return cube
+
+    def _cell_codes(self, df: pd.DataFrame) -> np.ndarray:
+        """Cell per row, registering campaigns not seen before"""
+        known = pd.Index(self.cells['campaign_id'].astype(np.int64))
+        ids = df['campaign_id'].to_numpy(dtype=np.int64)
+        new = df.loc[~np.isin(ids, known), DIMENSIONS].drop_duplicates('campaign_id')
+        if len(new):
+            new = new.astype({'campaign_name': str, 'channel': str, 'target_audience': str})
+            self._reserve(self._rows, len(self.cells) + len(new))
+            self.cells = pd.concat([self.cells, new], ignore_index=True)
+            known = pd.Index(self.cells['campaign_id'].astype(np.int64))
+        return known.get_indexer(ids)
+
+    def append(self, daily_performance: pd.DataFrame, campaigns: Optional[pd.DataFrame] = None) -> int:
+        """
+        Add daily_performance rows
+
+        Rows are added on top of what the cube holds, so pass each row once.
+        New days extend the cube at the amortised cost of the new days only;
+        rows for days already covered (late corrections) update every later
+        prefix, and days before the first one shift the whole cube.
+
+        Returns:
+            Number of rows added
+        """
+        if not len(daily_performance):
+            return 0
+        df = daily_performance
+        missing = [c for c in DIMENSIONS if c not in df.columns]
+        if missing:
+            df = df.merge(campaigns[['campaign_id'] + missing], on='campaign_id', how='left')
+        cells = self._cell_codes(df)
+        days = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+        first, last = int(days.min()), int(days.max())
+        if self.first_day is None:
+            self.first_day = first
+        if first < self.first_day:
+            # Earlier days than the cube covers: prepend empty prefixes
+            pad = np.zeros((self.first_day - first,) + self.prefix.shape[1:])
+            self.prefix = np.concatenate([pad, self.prefix])
+            self.first_day = first
+        if last > self.last_day:
+            # Later days start from the last prefix
+            rows = self._rows + last - self.last_day
+            self._reserve(rows, len(self.cells))
+            self._buffer[self._rows:rows, :len(self.cells)] = self._buffer[self._rows - 1, :len(self.cells)]
+            self._rows = rows
+
+        # Dense per-day deltas from the earliest affected day, folded into the prefixes
+        offset = first - self.first_day
+        span = self.days - offset
+        index = (days - first) * len(self.cells) + cells
+        delta = np.stack([np.bincount(index, weights=df[m].to_numpy(dtype=float), minlength=span * len(self.cells))
+                          for m in MEASURES], axis=-1).reshape(span, len(self.cells), len(MEASURES))
+        self.prefix[offset + 1:] += np.cumsum(delta, axis=0)
+        return len(df)
+
+    def totals(self, start_date=None, end_date=None) -> np.ndarray:
+        """(cells, measures) totals over an inclusive date range, clipped to the cube"""
+        if self.first_day is None:
+            return np.zeros((0, len(MEASURES)))
+        start = 0 if start_date is None else min(max(_day(start_date) - self.first_day, 0), self.days)
+        end = self.days if end_date is None else min(max(_day(end_date) - self.first_day + 1, 0), self.days)
+        return self.prefix[max(end, start)] - self.prefix[start]
+
+    def query(self, start_date=None, end_date=None, by: Union[str, List[str], None] = 'channel',
+              **filters) -> pd.DataFrame:
+        """
+        Rollup of a date range, with derived ratios
+
+        Args:
+            start_date: Optional first day (inclusive)
+            end_date: Optional last day (inclusive)
+            by: Dimension(s) to group by (None for one overall row)
+            **filters: Dimension values to keep, e.g. channel='email' or campaign_id=[1, 2]
+
+        Returns:
+            One row per group with the summed MEASURES and add_ratios() columns
+        """
+        cells = self.cells.reset_index(drop=True)
+        df = pd.concat([cells, pd.DataFrame(self.totals(start_date, end_date), columns=MEASURES)], axis=1)
+        for column, value in filters.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            df = df[df[column].isin(values)]
+        by = [by] if isinstance(by, str) else list(by or [])
+        if by:
+            df = df.groupby(by, sort=False, observed=True)[MEASURES].sum().reset_index()
+        else:
+            df = df[MEASURES].sum().to_frame().T
+        return add_ratios(df)
+
+    def save(self, path: str):
+        """Write the cube to an .npz file"""
+        np.savez_compressed(path, prefix=self.prefix,
+                            first_day=-1 if self.first_day is None else self.first_day,
+                            campaign_id=self.cells['campaign_id'].to_numpy(dtype=np.int64),
+                            **{c: self.cells[c].to_numpy(dtype=str) for c in DIMENSIONS[1:]})
+
+    @classmethod
+    def load(cls, path: str) -> 'MetricsCube':
+        """Read a cube written by save()"""
+        cube = cls()
+        with np.load(path) as data:
+            cube.prefix = data['prefix']
+            cube.first_day = None if int(data['first_day']) < 0 else int(data['first_day'])
+            cube.cells = pd.DataFrame({c: data[c] for c in DIMENSIONS}).astype({c: object for c in DIMENSIONS[1:]})
+        return cube
@@ -0,0 +1,250 @@
+"""
+Marketing Mix Model Module
+Adstock and Hill saturation over a hyperparameter grid, with batched ridge fits per grid point
+"""
+
+import itertools
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+from schema import CATEGORIES
+
+# Channel keys in CHANNEL_CONFIG order
+CHANNELS = CATEGORIES['channel']
+
+# Default search space, shared by every channel: carry-over per day, half-saturation
+# point as a fraction of the channel's peak adstocked spend, and Hill shape
+DEFAULT_DECAYS = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+DEFAULT_HALF_SATURATIONS = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0]
+DEFAULT_SHAPES = [0.5, 0.75, 1.0, 1.5, 2.0, 2.5, 3.0]
+
+DEFAULT_ALPHA = 1.0
+
+# Grid points per block handed to a worker process
+DEFAULT_BLOCK_SIZE = 500
+
+
+def channel_spend(daily_performance: pd.DataFrame, campaigns: Optional[pd.DataFrame] = None,
+                  target: str = 'revenue', channels: Sequence[str] = CHANNELS) -> pd.DataFrame:
+    """
+    Daily spend per channel plus the daily target, one row per date
+
+    Args:
+        daily_performance: Daily performance rows (with a channel column, or campaigns to join it from)
+        campaigns: Campaigns table, needed when daily_performance has no channel column
+        target: Column summed per day as the response
+        channels: Channel columns to return, in order (missing channels are all zero)
+    """
+    df = daily_performance
+    if 'channel' not in df.columns:
+        df = df.merge(campaigns[['campaign_id', 'channel']], on='campaign_id', how='left')
+    dates = pd.to_datetime(df['date'])
+    spend = df.pivot_table(index=dates, columns=df['channel'].astype(str), values='spend',
+                           aggfunc='sum', fill_value=0.0)
+    full_range = pd.date_range(dates.min(), dates.max(), freq='D', name='date')
+    result = spend.reindex(index=full_range, columns=list(channels), fill_value=0.0)
+    result[target] = df.groupby(dates)[target].sum().reindex(full_range, fill_value=0.0)
+    result.columns.name = None
+    return result
+
+
+def make_grid(decays: Sequence[float] = DEFAULT_DECAYS,
+              half_saturations: Sequence[float] = DEFAULT_HALF_SATURATIONS,
+              shapes: Sequence[float] = DEFAULT_SHAPES, num_channels: int = len(CHANNELS),
+              samples: Optional[int] = None, seed: Optional[int] = None) -> dict:
+    """
+    Hyperparameter grid as (grid points x channels) arrays
+
+    By default every combination of decay, half saturation and shape is
+    used for all channels at once. With samples, that many grid points are
+    drawn with each channel's values picked independently.
+    """
+    if samples is None:
+        combos = np.array(list(itertools.product(decays, half_saturations, shapes)))
+        return {name: np.repeat(combos[:, [i]], num_channels, axis=1)
+                for i, name in enumerate(['decay', 'half_saturation', 'shape'])}
+    rng = np.random.default_rng(seed)
+    return {name: rng.choice(np.asarray(values, dtype=float), size=(samples, num_channels))
+            for name, values in (('decay', decays), ('half_saturation', half_saturations), ('shape', shapes))}
+
+
+def geometric_adstock(spend: np.ndarray, decay: np.ndarray) -> np.ndarray:
+    """
+    Carry-over a[t] = x[t] + decay * a[t - 1], for every grid point at once
+
+    Args:
+        spend: (days, channels) spend
+        decay: (grid points, channels) decay rates
+
+    Returns:
+        (grid points, days, channels) adstocked spend
+    """
+    adstocked = np.empty((len(decay),) + spend.shape)
+    carry = np.zeros(decay.shape)
+    for day in range(len(spend)):
+        carry = spend[day] + decay * carry
+        adstocked[:, day] = carry
+    return adstocked
+
+
+def hill_saturation(adstocked: np.ndarray, half_saturation: np.ndarray, shape: np.ndarray) -> np.ndarray:
+    """
+    Hill curve x^s / (x^s + k^s), with k relative to each channel's peak adstocked spend
+
+    Args:
+        adstocked: (grid points, days, channels)
+        half_saturation: (grid points, channels) half-saturation as a fraction of the peak
+        shape: (grid points, channels) Hill exponent
+    """
+    peak = adstocked.max(axis=1, keepdims=True)
+    scaled = np.divide(adstocked, peak, out=np.zeros_like(adstocked), where=peak > 0)
+    s = shape[:, None, :]
+    powered = scaled ** s
+    return powered / (powered + half_saturation[:, None, :] ** s)
+
+
+def _fit_block(spend: np.ndarray, y: np.ndarray, decay: np.ndarray, half_saturation: np.ndarray,
+               shape: np.ndarray, alpha: float, train: int) -> dict:
+    """Transform and ridge-fit one block of grid points; returns scores, coefficients and intercepts"""
+    features = hill_saturation(geometric_adstock(spend, decay), half_saturation, shape)
+    x_train, y_train = features[:, :train], y[:train]
+    # Centering leaves the intercept unpenalized
+    x_mean = x_train.mean(axis=1)
+    y_mean = y_train.mean()
+    xc = x_train - x_mean[:, None, :]
+    gram = np.einsum('gtc,gtd->gcd', xc, xc) + alpha * np.eye(spend.shape[1])
+    moment = np.einsum('gtc,t->gc', xc, y_train - y_mean)
+    coefficients = np.linalg.solve(gram, moment[..., None])[..., 0]
+    intercepts = y_mean - np.einsum('gc,gc->g', x_mean, coefficients)
+
+    # Score on the holdout days when there are any, otherwise in sample
+    x_score, y_score = (features[:, train:], y[train:]) if train < len(y) else (features, y)
+    predicted = np.einsum('gtc,gc->gt', x_score, coefficients) + intercepts[:, None]
+    residual = ((y_score - predicted) ** 2).sum(axis=1)
+    total = ((y_score - y_score.mean()) ** 2).sum()
+    return {'r2': 1 - residual / total if total > 0 else np.zeros(len(decay)),
+            'coefficients': coefficients, 'intercepts': intercepts}
+
+
+class MixModel:
+    """
+    Marketing mix model: adstock -> Hill saturation -> ridge regression
+
+    fit() searches the hyperparameter grid in blocks. Every block transforms
+    the spend for all its grid points at once and solves their ridge
+    regressions as one batched linear solve; blocks run on a process pool.
+    The best grid point (highest R^2 on the holdout days, or in sample) is
+    kept for contributions and response curves.
+    """
+
+    def __init__(self, grid: Optional[dict] = None, alpha: float = DEFAULT_ALPHA, holdout_days: int = 0,
+                 workers: Optional[int] = None, block_size: int = DEFAULT_BLOCK_SIZE):
+        """
+        Args:
+            grid: Hyperparameter arrays from make_grid() (default: the full default grid)
+            alpha: Ridge penalty
+            holdout_days: Trailing days left out of the fit and used for scoring
+            workers: Worker processes (default: CPU count; 1 runs in-process)
+            block_size: Grid points per block
+        """
+        self.grid = grid
+        self.alpha = alpha
+        self.holdout_days = holdout_days
+        self.workers = workers or os.cpu_count() or 1
+        self.block_size = block_size
+        self.channels: List[str] = []
+        self.target: Optional[str] = None
+        self.data: Optional[pd.DataFrame] = None
+        self.results: Optional[pd.DataFrame] = None
+        self.best: Optional[dict] = None
+
+    def fit(self, data: pd.DataFrame, target: str = 'revenue') -> 'MixModel':
+        """
+        Fit every grid point and keep the best
+
+        Args:
+            data: Daily rows with one spend column per channel and the target, e.g. from channel_spend()
+            target: Response column
+        """
+        self.channels = [c for c in data.columns if c != target]
+        self.target = target
+        self.data = data
+        spend = data[self.channels].to_numpy(dtype=float)
+        y = data[target].to_numpy(dtype=float)
+        grid = self.grid or make_grid(num_channels=len(self.channels))
+        points = len(grid['decay'])
+        train = len(y) - self.holdout_days
+        if train < 2:
+            raise ValueError(f"holdout_days={self.holdout_days} leaves too few days to fit")
+
+        starts = range(0, points, self.block_size)
+        blocks = [(spend, y, grid['decay'][s:s + self.block_size], grid['half_saturation'][s:s + self.block_size],
+                   grid['shape'][s:s + self.block_size], self.alpha, train) for s in starts]
+        if self.workers <= 1 or len(blocks) <= 1:
+            fits = [_fit_block(*block) for block in blocks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(blocks))) as pool:
+                fits = list(pool.map(_fit_block, *zip(*blocks)))
+
+        r2 = np.concatenate([fit['r2'] for fit in fits])
+        coefficients = np.concatenate([fit['coefficients'] for fit in fits])
+        intercepts = np.concatenate([fit['intercepts'] for fit in fits])
+        columns = {'r2': r2, 'intercept': intercepts}
+        for i, channel in enumerate(self.channels):
+            columns[f'{channel}_decay'] = grid['decay'][:, i]
+            columns[f'{channel}_half_saturation'] = grid['half_saturation'][:, i]
+            columns[f'{channel}_shape'] = grid['shape'][:, i]
+            columns[f'{channel}_coefficient'] = coefficients[:, i]
+        self.results = pd.DataFrame(columns).sort_values('r2', ascending=False, ignore_index=True)
+
+        best = int(np.nanargmax(r2))
+        self.best = {'r2': float(r2[best]), 'intercept': float(intercepts[best]),
+                     'coefficients': coefficients[best],
+                     'decay': grid['decay'][best], 'half_saturation': grid['half_saturation'][best],
+                     'shape': grid['shape'][best],
+                     'peak': geometric_adstock(spend, grid['decay'][best:best + 1])[0].max(axis=0)}
+        return self
+
+    def _features(self, spend: np.ndarray) -> np.ndarray:
+        """Best-fit transform of (days, channels) spend, using the fitted peak for scaling"""
+        adstocked = geometric_adstock(spend, self.best['decay'][None])[0]
+        peak = self.best['peak']
+        scaled = np.divide(adstocked, peak, out=np.zeros_like(adstocked), where=peak > 0)
+        powered = scaled ** self.best['shape']
+        return powered / (powered + self.best['half_saturation'] ** self.best['shape'])
+
+    def contributions(self) -> pd.DataFrame:
+        """Daily contribution of each channel (and the baseline) to the target, under the best fit"""
+        spend = self.data[self.channels].to_numpy(dtype=float)
+        df = pd.DataFrame(self._features(spend) * self.best['coefficients'], index=self.data.index,
+                          columns=self.channels)
+        df.insert(0, 'baseline', self.best['intercept'])
+        df['predicted'] = df.sum(axis=1)
+        df[self.target] = self.data[self.target].to_numpy()
+        return df
+
+    def response_curves(self, points: int = 50, max_multiplier: float = 2.0) -> pd.DataFrame:
+        """
+        Steady-state contribution per channel as daily spend varies
+
+        A constant daily spend x adstocks to x / (1 - decay); each curve goes
+        from zero to max_multiplier times the channel's largest daily spend.
+
+        Returns:
+            Long rows of channel, daily_spend and contribution
+        """
+        spend = self.data[self.channels].to_numpy(dtype=float)
+        rows = []
+        for i, channel in enumerate(self.channels):
+            levels = np.linspace(0, spend[:, i].max() * max_multiplier, points)
+            adstocked = levels / (1 - self.best['decay'][i])
+            peak = self.best['peak'][i]
+            scaled = adstocked / peak if peak > 0 else np.zeros(points)
+            shape = self.best['shape'][i]
+            response = scaled ** shape / (scaled ** shape + self.best['half_saturation'][i] ** shape)
+            rows.append(pd.DataFrame({'channel': channel, 'daily_spend': levels,
+                                      'contribution': response * self.best['coefficients'][i]}))
+        return pd.concat(rows, ignore_index=True)
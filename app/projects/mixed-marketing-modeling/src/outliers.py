@@ -0,0 +1,275 @@
+"""
+Outlier Detection Module
+Streaming IQR outlier flags from mergeable quantile sketches, per metric and group
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from features import OUTLIER_METRICS, add_marketing_metrics
+from storage import dataset_path, detect_format, iter_dataset, read_dataset
+
+# Higher compression keeps more centroids: more accurate, more memory
+DEFAULT_COMPRESSION = 200
+
+# Key used for the sketch over all rows, regardless of group
+ALL = '__all__'
+
+# Campaign tables a group_by column missing from the rows is looked up in, by campaign_id
+CAMPAIGN_DATASETS = ['campaigns', 'campaigns_clean']
+
+
+class TDigest:
+    """
+    Mergeable quantile sketch (merging t-digest)
+
+    Values are summarised as weighted centroids, small near the tails and
+    larger in the middle, so extreme quantiles stay accurate. Updating and
+    merging are both a sort plus a vectorized regrouping of centroids, and
+    memory stays around `compression` centroids however many values are seen.
+    """
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def update(self, values) -> 'TDigest':
+        """Add a batch of values (NaNs are ignored)"""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self._absorb(values, np.ones(len(values)))
+        return self
+
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        """Fold another digest into this one"""
+        if len(other.means):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._absorb(other.means, other.weights)
+        return self
+
+    def _absorb(self, means: np.ndarray, weights: np.ndarray):
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        # Centroids whose quantile midpoints fall in the same unit interval of
+        # the k1 scale function k(q) = compression / (2 pi) * asin(2q - 1) are
+        # combined; the scale is steep at the tails, keeping those centroids small
+        total = weights.sum()
+        midpoints = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * midpoints - 1, -1, 1))
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+        cluster_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / cluster_weights
+        self.weights = cluster_weights
+
+    def quantile(self, q) -> np.ndarray:
+        """Approximate quantile(s) q in [0, 1]"""
+        q = np.asarray(q, dtype=float)
+        if not len(self.means):
+            return np.full(q.shape, np.nan)
+        positions = np.cumsum(self.weights) - self.weights / 2
+        positions = np.r_[0.0, positions, self.count]
+        values = np.r_[self.min, self.means, self.max]
+        return np.interp(q * self.count, positions, values)
+
+    def to_dict(self) -> dict:
+        return {'compression': self.compression, 'means': self.means.tolist(),
+                'weights': self.weights.tolist(), 'min': float(self.min), 'max': float(self.max)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TDigest':
+        digest = cls(data['compression'])
+        digest.means = np.asarray(data['means'], dtype=float)
+        digest.weights = np.asarray(data['weights'], dtype=float)
+        digest.min = data['min']
+        digest.max = data['max']
+        return digest
+
+
+class OutlierDetector:
+    """
+    IQR outlier detection over streamed data, per metric and optionally per group
+
+    update() feeds chunks into one TDigest per (group, metric), plus one per
+    metric over all rows. flag() then marks values outside
+    Q1 - k * IQR .. Q3 + k * IQR for every metric in one vectorized pass;
+    rows whose group was never seen fall back to the overall bounds.
+    Detectors built on separate workers combine with merge().
+    """
+
+    def __init__(self, metrics: List[str] = OUTLIER_METRICS, group_by: Optional[str] = None,
+                 k: float = 1.5, compression: float = DEFAULT_COMPRESSION):
+        """
+        Args:
+            metrics: Columns to check
+            group_by: Optional column to compute bounds within, e.g. 'channel' or 'campaign_id'
+            k: IQR multiplier
+            compression: TDigest compression
+        """
+        self.metrics = list(metrics)
+        self.group_by = group_by
+        self.k = k
+        self.compression = compression
+        self.digests: Dict[str, Dict[str, TDigest]] = {}
+
+    def _digests(self, group: str) -> Dict[str, TDigest]:
+        if group not in self.digests:
+            self.digests[group] = {metric: TDigest(self.compression) for metric in self.metrics}
+        return self.digests[group]
+
+    def update(self, df: pd.DataFrame) -> 'OutlierDetector':
+        """Add a chunk of rows"""
+        values = df[self.metrics].to_numpy(dtype=float)
+        overall = self._digests(ALL)
+        for i, metric in enumerate(self.metrics):
+            overall[metric].update(values[:, i])
+        if self.group_by is not None:
+            codes, groups = pd.factorize(df[self.group_by].astype(str))
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(groups) + 1))
+            for g, group in enumerate(groups):
+                rows = values[order[bounds[g]:bounds[g + 1]]]
+                digests = self._digests(group)
+                for i, metric in enumerate(self.metrics):
+                    digests[metric].update(rows[:, i])
+        return self
+
+    def merge(self, other: 'OutlierDetector') -> 'OutlierDetector':
+        """Fold in a detector built on another slice of the data"""
+        if other.metrics != self.metrics or other.group_by != self.group_by:
+            raise ValueError("Can only merge detectors with the same metrics and group_by")
+        for group, digests in other.digests.items():
+            mine = self._digests(group)
+            for metric, digest in digests.items():
+                mine[metric].merge(digest)
+        return self
+
+    def bounds(self) -> pd.DataFrame:
+        """Lower and upper bound per group and metric (group '__all__' covers every row)"""
+        rows = []
+        for group, digests in self.digests.items():
+            for metric in self.metrics:
+                q1, q3 = digests[metric].quantile([0.25, 0.75])
+                iqr = q3 - q1
+                rows.append({'group': group, 'metric': metric, 'q1': q1, 'q3': q3,
+                             'lower': q1 - self.k * iqr, 'upper': q3 + self.k * iqr,
+                             'count': digests[metric].count})
+        return pd.DataFrame(rows)
+
+    def _bound_arrays(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Groups, and (group x metric) lower/upper arrays; the last row is the overall bounds"""
+        table = self.bounds()
+        groups = [g for g in self.digests if g != ALL] + [ALL]
+        lower = table.pivot(index='group', columns='metric', values='lower').reindex(
+            index=groups, columns=self.metrics).to_numpy()
+        upper = table.pivot(index='group', columns='metric', values='upper').reindex(
+            index=groups, columns=self.metrics).to_numpy()
+        return groups, lower, upper
+
+    def flag(self, df: pd.DataFrame, suffix: str = '_is_outlier') -> pd.DataFrame:
+        """Return df with a boolean <metric><suffix> column per metric; NaNs are never outliers"""
+        groups, lower, upper = self._bound_arrays()
+        values = df[self.metrics].to_numpy(dtype=float)
+        if self.group_by is not None:
+            index = pd.Index(groups[:-1]).get_indexer(df[self.group_by].astype(str))
+            index[index < 0] = len(groups) - 1
+        else:
+            index = np.full(len(df), len(groups) - 1)
+        flags = (values < lower[index]) | (values > upper[index])
+        df = df.copy()
+        for i, metric in enumerate(self.metrics):
+            df[f'{metric}{suffix}'] = flags[:, i]
+        return df
+
+    def to_dict(self) -> dict:
+        return {'metrics': self.metrics, 'group_by': self.group_by, 'k': self.k,
+                'compression': self.compression,
+                'digests': {group: {metric: digest.to_dict() for metric, digest in digests.items()}
+                            for group, digests in self.digests.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'OutlierDetector':
+        detector = cls(data['metrics'], data['group_by'], data['k'], data['compression'])
+        detector.digests = {group: {metric: TDigest.from_dict(digest) for metric, digest in digests.items()}
+                            for group, digests in data['digests'].items()}
+        return detector
+
+    def save(self, path: str):
+        """Write the sketches as JSON"""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> 'OutlierDetector':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def merge_detectors(detectors: Iterable[OutlierDetector]) -> OutlierDetector:
+    """Combine detectors built in parallel (e.g. one per worker or file)"""
+    detectors = list(detectors)
+    merged = OutlierDetector(detectors[0].metrics, detectors[0].group_by,
+                             detectors[0].k, detectors[0].compression)
+    for detector in detectors:
+        merged.merge(detector)
+    return merged
+
+
+def fit_dataset(directory: str, name: str, metrics: List[str] = OUTLIER_METRICS,
+                group_by: Optional[str] = None, chunk_size: int = 100000) -> OutlierDetector:
+    """
+    Build a detector by streaming a stored dataset chunk by chunk
+
+    Derived metrics (ctr, cvr, roas, cac) are computed per chunk when the
+    dataset only has the raw daily performance columns.
+
+    Args:
+        directory: Directory holding the dataset
+        name: Dataset name, e.g. 'performance_features' or 'daily_performance'
+        metrics: Columns to check
+        group_by: Optional column to compute bounds within; looked up from the
+            campaigns in the same directory when the rows lack it (e.g. channel
+            in a daily_performance CSV)
+        chunk_size: Rows per chunk
+    """
+    detector = OutlierDetector(metrics, group_by)
+    lookup = None
+    for chunk in iter_dataset(directory, name, chunk_size=chunk_size):
+        if any(metric not in chunk.columns for metric in metrics):
+            chunk = add_marketing_metrics(chunk)
+        if group_by is not None and group_by not in chunk.columns:
+            if lookup is None:
+                lookup = _campaign_lookup(directory, name, group_by, chunk)
+            chunk = chunk.assign(**{group_by: lookup.reindex(chunk['campaign_id']).to_numpy()})
+        detector.update(chunk)
+    return detector
+
+
+def _campaign_lookup(directory: str, name: str, column: str, chunk: pd.DataFrame) -> pd.Series:
+    """A campaign attribute per campaign_id, from the campaigns stored next to a dataset"""
+    if 'campaign_id' in chunk.columns:
+        for campaigns in CAMPAIGN_DATASETS:
+            if not os.path.exists(dataset_path(directory, campaigns, detect_format(directory, campaigns))):
+                continue
+            df = read_dataset(directory, campaigns)
+            if column in df.columns:
+                return df.set_index('campaign_id')[column]
+    raise ValueError(f"{name} rows have no {column!r} column, and no campaigns dataset in {directory} "
+                     f"provides it by campaign_id")
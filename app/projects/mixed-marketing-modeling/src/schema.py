@@ -0,0 +1,181 @@
+"""
+Dataset Schema Module
+Compact dtypes shared by the generator, the importer, data acquisition and the notebooks
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+
+# Known values of the low-cardinality fields. Values outside these lists are
+# kept (appended as extra categories), the lists only fix the category order
+# so chunks and tables share the same codes.
+CATEGORIES = {
+    'channel': ['paid_search', 'social', 'display', 'email', 'affiliate'],
+    'customer_segment': ['high_value', 'medium_value', 'low_value'],
+    'target_audience': ['18-24', '25-34', '35-44', '45-54', '55+'],
+    'variant': ['control', 'variant_a', 'variant_b'],
+    'season': ['Winter', 'Spring', 'Summer', 'Fall'],
+    'month_name': ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+                   'August', 'September', 'October', 'November', 'December'],
+    'day_name': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+    # Repeated on every row of the joined datasets, categories taken from the data
+    'campaign_name': None,
+    'test_name': None,
+}
+
+# Integer widths, chosen from each field's range rather than from the data seen
+# so that every chunk of a table gets the same dtype. Money columns stay
+# float64: float32 can't represent cents beyond ~100k.
+INTEGER_TYPES = {
+    'campaign_id': 'int32',
+    'customer_id': 'int32',
+    'transaction_id': 'int32',
+    'performance_id': 'int32',
+    'test_id': 'int32',
+    'impressions': 'int32',
+    'clicks': 'int32',
+    'conversions': 'int32',
+    'total_conversions': 'int32',
+    'total_clicks': 'int32',
+    'total_impressions': 'int32',
+    'num_orders': 'int16',
+    'total_products': 'int32',
+    'products_purchased': 'int8',
+    'days_as_customer': 'int16',
+    'campaign_duration_days': 'int16',
+    'year': 'int16',
+    'month': 'int8',
+    'week': 'int8',
+    'day_of_week': 'int8',
+    'quarter': 'int8',
+}
+
+DATE_COLUMNS = ['date', 'start_date', 'end_date', 'acquisition_date', 'transaction_date',
+                'first_purchase_date', 'last_purchase_date', 'cohort_month']
+
+TIMESTAMP_COLUMNS = ['created_at']
+
+# SHA-256 hex digests stored as 32 raw bytes
+HASH_COLUMNS = ['email_hash']
+HASH_BYTES = 32
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """Deep memory usage of a frame in MB"""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def _hash_dtype():
+    """Fixed-size binary dtype for hashes (pyarrow), or None to fall back to bytes objects"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    return pd.ArrowDtype(pa.binary(HASH_BYTES))
+
+
+def _to_hash_bytes(series: pd.Series) -> pd.Series:
+    """Convert hex digests (or raw bytes) to 32-byte binary values"""
+    dtype = _hash_dtype()
+    if dtype is not None and series.dtype == dtype:
+        return series
+    values = series.to_numpy(dtype=object)
+    if len(values) and isinstance(values[0], str):
+        raw = bytes.fromhex(''.join(values))
+    else:
+        raw = np.asarray(values, dtype=f'S{HASH_BYTES}').tobytes()
+    # Built from the contiguous buffer: going through numpy 'S' values would
+    # strip digests that happen to end in zero bytes
+    if dtype is None:
+        digests = [raw[i:i + HASH_BYTES] for i in range(0, len(raw), HASH_BYTES)]
+        return pd.Series(digests, index=series.index, name=series.name, dtype=object)
+    import pyarrow as pa
+    array = pa.FixedSizeBinaryArray.from_buffers(dtype.pyarrow_dtype, len(values), [None, pa.py_buffer(raw)])
+    return pd.Series(pd.arrays.ArrowExtensionArray(array), index=series.index, name=series.name)
+
+
+def _to_category(series: pd.Series, known: Optional[list]) -> pd.Series:
+    if isinstance(series.dtype, pd.CategoricalDtype) and known is None:
+        return series
+    observed = [value for value in pd.unique(series.dropna())]
+    categories = list(known or []) + sorted(str(value) for value in observed if value not in (known or []))
+    return series.astype(pd.CategoricalDtype(categories))
+
+
+def _fits(series: pd.Series, dtype: str) -> bool:
+    """Whether an integer column can be stored in dtype without overflow or lost NaNs"""
+    if not pd.api.types.is_numeric_dtype(series) or series.isna().any():
+        return False
+    if not len(series):
+        return True
+    if not pd.api.types.is_integer_dtype(series) and not (series == series.round()).all():
+        return False
+    limits = np.iinfo(dtype)
+    return limits.min <= series.min() and series.max() <= limits.max
+
+
+def apply_schema(df: pd.DataFrame, name: Optional[str] = None, report: bool = False) -> pd.DataFrame:
+    """
+    Cast a frame's known columns to their compact dtypes
+
+    Columns are matched by name, so the same rules cover the raw tables, the
+    cleaned notebook outputs and the joined datasets. Unknown columns are left
+    alone, and integer columns that don't fit their width (or hold NaNs after
+    a join) keep their current dtype.
+
+    Args:
+        df: Frame to convert (not modified)
+        name: Table name, used in the memory report
+        report: Print memory use before and after
+    """
+    before = memory_mb(df) if report else None
+    df = df.copy()
+    for column in df.columns:
+        series = df[column]
+        if column in CATEGORIES:
+            df[column] = _to_category(series, CATEGORIES[column])
+        elif column in INTEGER_TYPES:
+            if _fits(series, INTEGER_TYPES[column]):
+                df[column] = series.astype(INTEGER_TYPES[column])
+        elif column in DATE_COLUMNS or column in TIMESTAMP_COLUMNS:
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                df[column] = pd.to_datetime(series, format='mixed' if column in TIMESTAMP_COLUMNS else None)
+        elif column in HASH_COLUMNS and series.notna().all():
+            df[column] = _to_hash_bytes(series)
+    if report:
+        print(memory_report(name or 'frame', before, memory_mb(df)))
+    return df
+
+
+def memory_report(name: str, before_mb: float, after_mb: float) -> str:
+    """One-line before/after memory summary"""
+    saved = 1 - after_mb / before_mb if before_mb else 0.0
+    return f"   {name}: {before_mb:,.2f} MB -> {after_mb:,.2f} MB ({saved:.0%} smaller)"
+
+
+def encode_for_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Turn binary hashes back into hex strings for CSV and JSON output"""
+    columns = [c for c in HASH_COLUMNS if c in df.columns and df[c].notna().all()]
+    if not columns:
+        return df
+    df = df.copy()
+    for column in columns:
+        values = df[column].to_numpy(dtype=object)
+        if len(values) and isinstance(values[0], str):
+            continue
+        hex_digests = np.asarray(values, dtype=f'S{HASH_BYTES}').tobytes().hex()
+        width = HASH_BYTES * 2
+        df[column] = [hex_digests[i:i + width] for i in range(0, len(hex_digests), width)]
+    return df
+
+
+def memory_by_table(frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Memory use per table before and after apply_schema"""
+    rows = []
+    for name, df in frames.items():
+        compact = apply_schema(df)
+        rows.append({'table': name, 'rows': len(df), 'before_mb': memory_mb(df), 'after_mb': memory_mb(compact)})
+    result = pd.DataFrame(rows)
+    result['saved'] = 1 - result['after_mb'] / result['before_mb']
+    return result
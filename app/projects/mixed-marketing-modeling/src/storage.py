@@ -0,0 +1,376 @@
+"""
+Dataset Storage Module
+Read and write marketing datasets as CSV or partitioned Parquet
+"""
+
+import os
+import pandas as pd
+from typing import Iterator, List, Optional
+
+from schema import encode_for_text
+
+FORMATS = ('csv', 'parquet')
+
+# Date columns per dataset, parsed on read and stored as Parquet date32
+DATE_COLUMNS = {
+    'campaigns': ['start_date', 'end_date'],
+    'daily_performance': ['date'],
+    'customers': ['acquisition_date'],
+    'transactions': ['transaction_date'],
+    'ab_tests': ['start_date', 'end_date'],
+    'campaigns_clean': ['start_date', 'end_date'],
+    'daily_performance_clean': ['date'],
+    'customers_clean': ['acquisition_date'],
+    'transactions_clean': ['transaction_date'],
+    'ab_tests_clean': ['start_date', 'end_date'],
+    'performance_enriched': ['date'],
+    'customer_ltv_dataset': ['transaction_date', 'acquisition_date'],
+    'performance_features': ['date'],
+    'customer_features': ['acquisition_date', 'first_purchase_date', 'last_purchase_date'],
+    'campaign_performance': ['start_date', 'end_date'],
+}
+
+# Datasets written as Parquet directories partitioned by month and channel.
+# 'channel_key' names the id column used to look up the channel for tables
+# that don't carry one; there the channel only exists as a partition column.
+PARTITIONED = {
+    'daily_performance': {'date_column': 'date', 'channel_key': 'campaign_id'},
+    'transactions': {'date_column': 'transaction_date', 'channel_key': 'customer_id'},
+    'daily_performance_clean': {'date_column': 'date', 'channel_key': 'campaign_id'},
+    'transactions_clean': {'date_column': 'transaction_date', 'channel_key': 'customer_id'},
+    'performance_enriched': {'date_column': 'date', 'channel_key': None},
+    'performance_features': {'date_column': 'date', 'channel_key': None},
+}
+
+# Named year_month rather than month so it can't clash with the month
+# feature column of performance_features
+MONTH_PARTITION = 'year_month'
+PARTITION_COLUMNS = [MONTH_PARTITION, 'channel']
+
+
+def _require_pyarrow():
+    """Import pyarrow or explain how to get Parquet support"""
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet support requires pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def dataset_path(directory: str, name: str, fmt: str) -> str:
+    """Location of a dataset: name.csv, name.parquet, or a name/ directory for partitioned Parquet"""
+    if fmt == 'csv':
+        return os.path.join(directory, f"{name}.csv")
+    if name in PARTITIONED:
+        return os.path.join(directory, name)
+    return os.path.join(directory, f"{name}.parquet")
+
+
+def detect_format(directory: str, name: str) -> str:
+    """Pick Parquet if the dataset exists in that format, otherwise CSV"""
+    if os.path.exists(dataset_path(directory, name, 'parquet')):
+        return 'parquet'
+    return 'csv'
+
+
+def dataset_bytes(directory: str, name: str, fmt: str) -> int:
+    """Size on disk of a dataset's file, or of every file of a partitioned dataset (0 if missing)"""
+    path = dataset_path(directory, name, fmt)
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(path) for file in files)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _to_arrow(df: pd.DataFrame, name: str):
+    """Convert a frame to an Arrow table with date columns stored as date32"""
+    pa = _require_pyarrow()
+    df = df.copy()
+    for column in DATE_COLUMNS.get(name, []):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column])
+    # Without pandas metadata: it records extension dtypes such as the
+    # fixed-size binary hashes by a name pandas can't parse back
+    table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata()
+    for column in DATE_COLUMNS.get(name, []):
+        if column in table.column_names:
+            index = table.column_names.index(column)
+            table = table.set_column(index, column, table[column].cast(pa.date32()))
+    return table
+
+
+class DatasetWriter:
+    """
+    Write a dataset one chunk at a time
+
+    CSV chunks are appended to a single file. Parquet chunks become new files,
+    and partitioned datasets get one file per month/channel partition per chunk.
+    """
+
+    def __init__(self, directory: str, name: str, fmt: str = 'csv',
+                 channel_lookup: Optional[pd.Series] = None):
+        """
+        Args:
+            directory: Output directory
+            name: Dataset name, e.g. 'daily_performance'
+            fmt: 'csv' or 'parquet'
+            channel_lookup: Channel per id (indexed by the dataset's channel_key),
+                needed to partition tables that have no channel column
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+        self.name = name
+        self.fmt = fmt
+        self.path = dataset_path(directory, name, fmt)
+        self.channel_lookup = channel_lookup
+        self.rows = 0
+        self._chunks = 0
+        self._parquet_writer = None
+        self._empty = None
+        os.makedirs(directory, exist_ok=True)
+
+    def set_channel_lookup(self, channel_lookup: pd.Series):
+        """Replace the id -> channel lookup used for the following chunks"""
+        self.channel_lookup = channel_lookup
+
+    def write(self, df: pd.DataFrame):
+        """Write one chunk"""
+        if self.fmt == 'parquet' and df.empty:
+            # Columns of an empty chunk have no values to infer Arrow types
+            # from, so it is held back and only written if nothing else is
+            self._empty = df
+            return
+        if self.fmt == 'csv':
+            df = encode_for_text(df)
+            df.to_csv(self.path, mode='w' if self._chunks == 0 else 'a',
+                      header=self._chunks == 0, index=False)
+        elif self.name in PARTITIONED:
+            self._write_partitioned(df)
+        else:
+            self._write_parquet(df)
+        self._chunks += 1
+        self.rows += len(df)
+
+    def _write_parquet(self, df: pd.DataFrame):
+        """Append a chunk to a single Parquet file"""
+        pa = _require_pyarrow()
+        table = _to_arrow(df, self.name)
+        if self._parquet_writer is None:
+            self._parquet_writer = pa.parquet.ParquetWriter(self.path, table.schema)
+        elif not table.schema.equals(self._parquet_writer.schema):
+            # e.g. a column that is all null in this chunk
+            table = table.cast(self._parquet_writer.schema)
+        self._parquet_writer.write_table(table)
+
+    def _write_partitioned(self, df: pd.DataFrame):
+        """Write a chunk into year_month=YYYY-MM/channel=<channel> partitions"""
+        pa = _require_pyarrow()
+        spec = PARTITIONED[self.name]
+        df = df.copy()
+        if spec['channel_key'] is not None:
+            if self.channel_lookup is None:
+                raise ValueError(f"{self.name} needs a channel_lookup to be partitioned by channel")
+            df['channel'] = self.channel_lookup.reindex(df[spec['channel_key']]).to_numpy()
+        df[MONTH_PARTITION] = pd.to_datetime(df[spec['date_column']]).dt.strftime('%Y-%m')
+
+        if self._chunks == 0 and os.path.isdir(self.path):
+            # Start from a clean directory instead of mixing with an earlier run
+            for root, _, files in os.walk(self.path):
+                for file in files:
+                    if file.endswith('.parquet'):
+                        os.remove(os.path.join(root, file))
+
+        pa.parquet.write_to_dataset(
+            _to_arrow(df, self.name),
+            self.path,
+            partition_cols=PARTITION_COLUMNS,
+            basename_template=f"part-{self._chunks:05d}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore'
+        )
+
+    def close(self):
+        """Flush and close any open file"""
+        if self._chunks == 0 and self._empty is not None:
+            # Every chunk was empty: still leave an (empty) dataset behind
+            if self.name in PARTITIONED:
+                os.makedirs(self.path, exist_ok=True)
+            else:
+                self._write_parquet(self._empty)
+            self._chunks += 1
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+
+def write_dataset(df: pd.DataFrame, directory: str, name: str, fmt: str = 'csv',
+                  channel_lookup: Optional[pd.Series] = None) -> str:
+    """
+    Write a whole dataset in one go
+
+    Args:
+        df: Data to write
+        directory: Output directory
+        name: Dataset name, e.g. 'performance_features'
+        fmt: 'csv' or 'parquet'
+        channel_lookup: Channel per id for partitioned tables without a channel column
+
+    Returns:
+        Path of the written file or directory
+    """
+    writer = DatasetWriter(directory, name, fmt, channel_lookup)
+    writer.write(df)
+    writer.close()
+    return writer.path
+
+
+def append_dataset(df: pd.DataFrame, directory: str, name: str, fmt: str = 'csv',
+                   channel_lookup: Optional[pd.Series] = None) -> str:
+    """
+    Add rows to an existing dataset, or create it
+
+    CSV rows are appended to the file and partitioned Parquet gets new files
+    next to the existing ones, so earlier rows are never rewritten. A
+    single-file Parquet dataset has to be read and written back whole.
+
+    Args:
+        df: Rows to add, with the same columns as the dataset
+        directory: Output directory
+        name: Dataset name, e.g. 'performance_features'
+        fmt: 'csv' or 'parquet'
+        channel_lookup: Channel per id for partitioned tables without a channel column
+
+    Returns:
+        Path of the written file or directory
+    """
+    path = dataset_path(directory, name, fmt)
+    if not os.path.exists(path):
+        return write_dataset(df, directory, name, fmt, channel_lookup)
+    if fmt == 'csv':
+        columns = pd.read_csv(path, nrows=0).columns
+        encode_for_text(df)[columns].to_csv(path, mode='a', header=False, index=False)
+        return path
+    if name not in PARTITIONED:
+        existing = read_dataset(directory, name, fmt=fmt)
+        return write_dataset(pd.concat([existing, df], ignore_index=True), directory, name, fmt)
+
+    writer = DatasetWriter(directory, name, fmt, channel_lookup)
+    # Continue the file numbering so the new files don't replace existing ones
+    writer._chunks = sum(len(files) for _, _, files in os.walk(path))
+    writer.write(df)
+    return path
+
+
+def _filter_date_column(name: str) -> Optional[str]:
+    """Date column that start_date/end_date filters apply to"""
+    if name in PARTITIONED:
+        return PARTITIONED[name]['date_column']
+    return (DATE_COLUMNS.get(name) or [None])[0]
+
+
+def _partition_filters(name: str, start_date: Optional[str], end_date: Optional[str],
+                       channels: Optional[List[str]]) -> list:
+    """Arrow filters that prune month/channel partitions and then the exact date range"""
+    filters = []
+    date_column = _filter_date_column(name)
+    partitioned = name in PARTITIONED
+    if start_date and date_column:
+        start = pd.Timestamp(start_date)
+        if partitioned:
+            filters.append((MONTH_PARTITION, '>=', start.strftime('%Y-%m')))
+        filters.append((date_column, '>=', start.date()))
+    if end_date and date_column:
+        end = pd.Timestamp(end_date)
+        if partitioned:
+            filters.append((MONTH_PARTITION, '<=', end.strftime('%Y-%m')))
+        filters.append((date_column, '<=', end.date()))
+    if channels:
+        filters.append(('channel', 'in', list(channels)))
+    return filters
+
+
+def _finish_frame(df: pd.DataFrame, name: str, columns: Optional[List[str]]) -> pd.DataFrame:
+    """Drop partition-only columns that weren't asked for and normalise dates"""
+    spec = PARTITIONED.get(name)
+    if spec is not None:
+        synthetic = [MONTH_PARTITION] + (['channel'] if spec['channel_key'] is not None else [])
+        drop = [c for c in synthetic if c in df.columns and (columns is None or c not in columns)]
+        df = df.drop(columns=drop)
+        if 'channel' in df.columns:
+            df['channel'] = df['channel'].astype(str)
+    for column in DATE_COLUMNS.get(name, []):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column])
+    return df
+
+
+def read_dataset(directory: str, name: str, columns: Optional[List[str]] = None,
+                 start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 channels: Optional[List[str]] = None, fmt: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read a dataset with column projection and date/channel filtering
+
+    For partitioned Parquet only the month/channel partitions that overlap the
+    filters are opened and only the requested columns are decoded. CSV is read
+    in full and filtered afterwards.
+
+    Args:
+        directory: Directory holding the dataset
+        name: Dataset name, e.g. 'performance_features'
+        columns: Optional list of columns to load
+        start_date: Optional start date (YYYY-MM-DD)
+        end_date: Optional end date (YYYY-MM-DD)
+        channels: Optional list of channels to keep
+        fmt: 'csv' or 'parquet', detected from the files on disk if omitted
+    """
+    fmt = fmt or detect_format(directory, name)
+    path = dataset_path(directory, name, fmt)
+
+    if fmt == 'parquet':
+        pa = _require_pyarrow()
+        filters = _partition_filters(name, start_date, end_date, channels)
+        table = pa.parquet.read_table(path, columns=columns, filters=filters or None,
+                                      partitioning='hive' if name in PARTITIONED else None)
+        return _finish_frame(table.to_pandas(), name, columns)
+
+    date_columns = [c for c in DATE_COLUMNS.get(name, []) if columns is None or c in columns]
+    df = pd.read_csv(path, parse_dates=date_columns)
+    date_column = _filter_date_column(name)
+    if date_column in df.columns:
+        if start_date:
+            df = df[df[date_column] >= pd.Timestamp(start_date)]
+        if end_date:
+            df = df[df[date_column] <= pd.Timestamp(end_date)]
+    if channels and 'channel' in df.columns:
+        df = df[df['channel'].isin(channels)]
+    if columns is not None:
+        df = df[columns]
+    return df.reset_index(drop=True)
+
+
+def iter_dataset(directory: str, name: str, columns: Optional[List[str]] = None,
+                 chunk_size: int = 100000, fmt: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read a dataset back in chunks of at most chunk_size rows
+
+    Args:
+        directory: Directory holding the dataset
+        name: Dataset name
+        columns: Optional list of columns to load
+        chunk_size: Maximum rows per chunk
+        fmt: 'csv' or 'parquet', detected from the files on disk if omitted
+    """
+    fmt = fmt or detect_format(directory, name)
+    path = dataset_path(directory, name, fmt)
+
+    if fmt == 'parquet':
+        pa = _require_pyarrow()
+        dataset = pa.dataset.dataset(path, format='parquet',
+                                     partitioning='hive' if name in PARTITIONED else None)
+        for batch in dataset.to_batches(columns=columns, batch_size=chunk_size):
+            if batch.num_rows:
+                yield _finish_frame(batch.to_pandas(), name, columns)
+        return
+
+    date_columns = [c for c in DATE_COLUMNS.get(name, []) if columns is None or c in columns]
+    yield from pd.read_csv(path, usecols=columns, parse_dates=date_columns, chunksize=chunk_size)
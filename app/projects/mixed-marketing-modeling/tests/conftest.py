@@ -0,0 +1,42 @@
+"""
+Shared Test Fixtures
+Small generated datasets and a local PostgREST stand-in for the importer and data acquisition
+"""
+
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(TESTS_DIR, '..', 'src'))
+sys.path.append(os.path.join(TESTS_DIR, '..', 'benchmarks'))
+
+# Tests never read or invalidate the user's table cache
+os.environ['MARKETING_CACHE'] = '0'
+
+from backends import set_backend
+from run_benchmarks import write_fixture
+from stub_server import StubPostgrest
+
+# Scale factor of the generated test datasets: 10 campaigns, 2,000 customers
+TEST_SCALE = 0.4
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Directory holding a small generated dataset as CSV"""
+    directory = str(tmp_path / 'data')
+    write_fixture(TEST_SCALE, directory)
+    return directory
+
+
+@pytest.fixture
+def stub():
+    """Running PostgREST stand-in, installed as the active backend"""
+    with StubPostgrest(seed=0) as server:
+        set_backend(server.client_backend())
+        try:
+            yield server
+        finally:
+            set_backend(None)
@@ -0,0 +1,65 @@
+"""
+A/B Test Statistics Tests
+Grouped p-value corrections against a per-group reference loop
+"""
+
+import numpy as np
+import pytest
+
+from ab_stats import adjust_pvalues
+
+
+def _reference(p, method):
+    """Textbook correction of one family of p-values"""
+    m = len(p)
+    order = np.argsort(p, kind='stable')
+    sorted_p = p[order]
+    if method == 'bonferroni':
+        adjusted = np.minimum(1, sorted_p * m)
+    elif method == 'holm':
+        adjusted = np.empty(m)
+        running = 0.0
+        for i, value in enumerate(sorted_p):
+            running = max(running, min(1.0, (m - i) * value))
+            adjusted[i] = running
+    else:
+        adjusted = np.empty(m)
+        running = 1.0
+        for i in range(m - 1, -1, -1):
+            running = min(running, min(1.0, sorted_p[i] * m / (i + 1)))
+            adjusted[i] = running
+    result = np.empty(m)
+    result[order] = adjusted
+    return result
+
+
+def _per_group(p, groups, method):
+    expected = np.empty(len(p))
+    for group in np.unique(groups):
+        members = groups == group
+        expected[members] = _reference(p[members], method)
+    return expected
+
+
+@pytest.mark.parametrize('method', ['holm', 'bh', 'bonferroni'])
+def test_grouped_adjustment_matches_a_per_group_loop(method):
+    rng = np.random.default_rng(7)
+    groups = rng.integers(0, 3000, 12000)
+    # Rounded so there are plenty of ties, plus exact zeros and ones
+    p = np.round(rng.uniform(0, 1, len(groups)) ** 3, 3)
+    p[rng.integers(0, len(p), 500)] = 1.0
+    p[rng.integers(0, len(p), 200)] = 0.0
+    np.testing.assert_array_equal(adjust_pvalues(p, groups, method), _per_group(p, groups, method))
+
+
+@pytest.mark.parametrize('method', ['holm', 'bh'])
+def test_ties_and_ones_within_one_family(method):
+    p = np.array([0.01, 0.04, 0.04, 0.04, 1.0, 1.0, 0.02])
+    np.testing.assert_array_equal(adjust_pvalues(p, method=method), _reference(p, method))
+    assert adjust_pvalues(p, method=method).max() == 1.0
+
+
+def test_string_groups_and_single_member_groups():
+    p = np.array([0.03, 0.2, 0.01, 0.5])
+    groups = np.array(['b', 'a', 'b', 'c'])
+    np.testing.assert_array_equal(adjust_pvalues(p, groups, 'holm'), [0.03, 0.2, 0.02, 0.5])
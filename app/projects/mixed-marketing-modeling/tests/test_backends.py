@@ -0,0 +1,25 @@
+"""
+Backend Tests
+The backend interface and reloading data into an existing SQLite file
+"""
+
+import pytest
+
+from backends import TABLE_ORDER, Backend, LocalBackend
+
+
+def test_incomplete_backend_cannot_be_created():
+    class ReadOnlyBackend(Backend):
+        def select(self, table, columns=None, filters=None, embed=None):
+            return None
+
+    with pytest.raises(TypeError, match='abstract'):
+        ReadOnlyBackend()
+
+
+def test_loading_a_directory_twice_does_not_duplicate_rows(data_dir, tmp_path):
+    path = str(tmp_path / 'marketing.db')
+    counts = {table: len(LocalBackend.from_files(data_dir, path=path).select(table)) for table in TABLE_ORDER}
+    reloaded = LocalBackend.from_files(data_dir, path=path)
+    assert {table: len(reloaded.select(table)) for table in TABLE_ORDER} == counts
+    assert all(counts.values())
@@ -0,0 +1,73 @@
+"""
+Table Cache Tests
+Incremental watermark refresh and the transfer it saves
+"""
+
+import pandas as pd
+import pytest
+
+from cache import TableCache
+
+OPERATORS = {
+    'eq': lambda series, value: series == value,
+    'gt': lambda series, value: series > value,
+    'gte': lambda series, value: series >= value,
+}
+
+
+class FakeTable:
+    """In-memory table answering the cache's fetches"""
+
+    def __init__(self, df):
+        self.df = df
+
+    def fetch(self, filters):
+        df = self.df
+        for operator, column, value in filters:
+            df = df[OPERATORS[operator](df[column].astype(str), str(value))]
+        return df.reset_index(drop=True)
+
+
+def _rows(ids, created_at):
+    return pd.DataFrame({'customer_id': ids, 'value': [float(i) for i in ids],
+                         'created_at': [created_at] * len(ids)})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    pytest.importorskip('pyarrow')
+    return TableCache(str(tmp_path / 'cache'))
+
+
+def test_refresh_picks_up_rows_sharing_the_watermark(cache):
+    # The first half of a batch is cached, the rest arrives with the same created_at
+    table = FakeTable(_rows([1, 2, 3], '2024-05-01 10:00:00'))
+    assert len(cache.fetch('customers', [], 'customer_id', table.fetch)) == 3
+    table.df = pd.concat([table.df, _rows([4, 5], '2024-05-01 10:00:00')], ignore_index=True)
+
+    df = cache.fetch('customers', [], 'customer_id', table.fetch)
+    assert df['customer_id'].tolist() == [1, 2, 3, 4, 5]
+    assert cache.stats()['rows_refreshed'] == 2
+
+
+def test_refresh_adds_newer_rows_once(cache):
+    table = FakeTable(_rows([1, 2], '2024-05-01'))
+    cache.fetch('customers', [], 'customer_id', table.fetch)
+    table.df = pd.concat([table.df, _rows([3], '2024-05-02')], ignore_index=True)
+    cache.fetch('customers', [], 'customer_id', table.fetch)
+    df = cache.fetch('customers', [], 'customer_id', table.fetch)
+    assert df['customer_id'].tolist() == [1, 2, 3]
+    assert not df['customer_id'].duplicated().any()
+
+
+def test_bytes_saved_counts_only_delta_queries(cache):
+    # Without a created_at column there is no watermark, so refreshes fetch everything
+    table = FakeTable(_rows([1, 2, 3], '2024-05-01').drop(columns='created_at'))
+    cache.fetch('campaigns', [], 'customer_id', table.fetch)
+    cache.fetch('campaigns', [], 'customer_id', table.fetch)
+    assert cache.stats()['bytes_saved'] == 0
+
+    table = FakeTable(_rows([1, 2, 3], '2024-05-01'))
+    cache.fetch('customers', [], 'customer_id', table.fetch)
+    cache.fetch('customers', [], 'customer_id', table.fetch)
+    assert cache.stats()['bytes_saved'] > 0
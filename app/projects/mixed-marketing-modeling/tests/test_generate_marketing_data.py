@@ -0,0 +1,52 @@
+"""
+Generator Tests
+Sharded generation is independent of the worker count, and the CLI rejects bad worker counts
+"""
+
+import filecmp
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import generate_marketing_data as generator
+from conftest import TEST_SCALE
+
+GENERATOR = os.path.abspath(generator.__file__)
+
+
+def test_sharded_frames_do_not_depend_on_the_worker_count():
+    single = generator.generate_sharded(1, scale=TEST_SCALE)
+    pooled = generator.generate_sharded(3, scale=TEST_SCALE)
+    for expected, actual in zip(single, pooled):
+        pd.testing.assert_frame_equal(expected, actual)
+
+
+def test_sharded_cli_output_is_byte_identical_for_any_worker_count(tmp_path):
+    # Separate processes, so the module-level random state starts fresh each time as in real use
+    outputs = {}
+    for workers in (1, 4):
+        output_dir = str(tmp_path / f"workers_{workers}")
+        subprocess.run([sys.executable, GENERATOR, '--workers', str(workers), '--scale', str(TEST_SCALE),
+                        '--output-dir', output_dir], check=True, capture_output=True)
+        outputs[workers] = output_dir
+    names = sorted(os.listdir(outputs[1]))
+    assert 'transactions.csv' in names
+    assert names == sorted(os.listdir(outputs[4]))
+    match, mismatch, errors = filecmp.cmpfiles(outputs[1], outputs[4], names, shallow=False)
+    assert (mismatch, errors) == ([], [])
+
+
+@pytest.mark.parametrize('workers', ['0', '-2'])
+def test_cli_rejects_worker_counts_below_one(workers, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        generator.parse_args(['--workers', workers])
+    assert exit_info.value.code == 2
+    assert '--workers must be at least 1' in capsys.readouterr().err
+
+
+def test_generate_campaigns_honours_an_explicit_zero():
+    assert len(generator.generate_campaigns(0)) == 0
+    assert len(generator.generate_campaigns(3)) == 3
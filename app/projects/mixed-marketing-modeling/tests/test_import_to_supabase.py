@@ -0,0 +1,196 @@
+"""
+Importer Tests
+Batch sizing, checkpoints and retries, and whole imports against the PostgREST stand-in
+"""
+
+import pandas as pd
+import pytest
+
+import import_to_supabase as importer
+from backends import UPSERT_KEYS
+from import_to_supabase import AdaptiveBatchSize, BulkImporter, IMPORT_WAVES, ImportCheckpoint, _with_retries
+from storage import read_dataset
+
+TABLES = [table for wave in IMPORT_WAVES for table in wave]
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    """Keep retry backoff in the milliseconds"""
+    monkeypatch.setattr(importer, 'RETRY_BASE_DELAY', 0.001)
+    monkeypatch.setattr(importer, 'RETRY_MAX_DELAY', 0.01)
+
+
+def _importer(data_dir, tmp_path, **kwargs):
+    options = dict(concurrency=2, batch_size=50, max_retries=20, chunk_size=300,
+                   checkpoint_path=str(tmp_path / 'checkpoint.json'), manifest_dir=str(tmp_path / 'manifest'))
+    options.update(kwargs)
+    return BulkImporter(data_dir=data_dir, **options)
+
+
+def _run(bulk):
+    """Run an import to completion and clear its checkpoint, as main() does"""
+    try:
+        bulk.run()
+        bulk.checkpoint.clear()
+    finally:
+        bulk.close()
+    return bulk.stats
+
+
+def _assert_matches_source(stub, data_dir, table):
+    """The stand-in holds exactly the source rows of a table, once each"""
+    keys = UPSERT_KEYS[table].split(',')
+    source = read_dataset(data_dir, table)
+    stored = stub.backend.select(table)
+    assert len(stored) == len(source)
+    assert not stored.duplicated(keys).any()
+    for column in keys:
+        stored[column] = stored[column].astype(str)
+        source[column] = pd.to_datetime(source[column]).dt.strftime('%Y-%m-%d') \
+            if column == 'date' else source[column].astype(str)
+    merged = stored.merge(source, on=keys, suffixes=('', '_source'))
+    assert len(merged) == len(source)
+    numeric = [column for column in source.columns
+               if column not in keys and pd.api.types.is_numeric_dtype(source[column])]
+    for column in numeric:
+        assert (merged[column].astype(float) - merged[f'{column}_source'].astype(float)).abs().max() < 1e-6
+
+
+def test_batch_size_grows_on_fast_batches_and_halves_on_slow_ones():
+    batch_size = AdaptiveBatchSize(initial=400, minimum=50, maximum=1000, target_seconds=1.0)
+    batch_size.record(400, 0.1, 4000)
+    assert batch_size.next_size() == 500
+    batch_size.record(500, 2.0, 5000)
+    assert batch_size.next_size() == 250
+    batch_size.failed()
+    batch_size.failed()
+    batch_size.failed()
+    assert batch_size.next_size() == 50
+    for _ in range(20):
+        batch_size.record(50, 0.1, 500)
+    assert batch_size.next_size() == 1000
+
+
+def test_batch_size_keeps_payload_under_the_limit():
+    batch_size = AdaptiveBatchSize(initial=1000, minimum=10, maximum=5000, max_payload_bytes=10_000)
+    batch_size.record(100, 0.1, 5_000)
+    # 50 bytes per row, so at most 200 rows fit
+    assert batch_size.next_size() == 200
+    batch_size.record(100, 0.1, 20_000)
+    assert batch_size.size == 625
+    assert batch_size.next_size() == 50
+
+
+def test_checkpoint_merges_ranges_and_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = ImportCheckpoint(path)
+    checkpoint.begin('customers', 'v1')
+    checkpoint.complete('customers', 0, 100)
+    checkpoint.complete('customers', 200, 300)
+    checkpoint.complete('customers', 100, 150)
+
+    resumed = ImportCheckpoint(path)
+    resumed.begin('customers', 'v1')
+    assert resumed.tables['customers']['ranges'] == [[0, 150], [200, 300]]
+    assert resumed.pending('customers', 0, 400) == [(150, 200), (300, 400)]
+    assert resumed.pending('customers', 0, 150) == []
+
+    resumed.clear()
+    assert ImportCheckpoint(path).tables == {}
+
+
+def test_checkpoint_starts_over_when_the_file_changed(tmp_path):
+    checkpoint = ImportCheckpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint.begin('customers', 'v1')
+    checkpoint.complete('customers', 0, 100)
+    checkpoint.begin('customers', 'v2')
+    assert checkpoint.pending('customers', 0, 100) == [(0, 100)]
+
+
+def test_retries_back_off_with_jitter_then_succeed():
+    calls = []
+    delays = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 4:
+            raise ConnectionError('reset')
+        return 'done'
+
+    assert _with_retries(flaky, max_retries=5, on_retry=lambda error, delay: delays.append(delay)) == 'done'
+    assert len(calls) == 4
+    assert len(delays) == 3
+    for attempt, delay in enumerate(delays):
+        assert 0 <= delay <= min(importer.RETRY_MAX_DELAY, importer.RETRY_BASE_DELAY * 2 ** attempt)
+
+
+def test_retries_give_up_after_max_retries():
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ConnectionError('reset')
+
+    with pytest.raises(ConnectionError):
+        _with_retries(failing, max_retries=2)
+    assert len(calls) == 3
+
+
+def test_import_retries_injected_failures(stub, data_dir, tmp_path):
+    stub.error_rate = 0.2
+    stats = _run(_importer(data_dir, tmp_path))
+    assert sum(table_stats['retries'] for table_stats in stats.values()) > 0
+    for table in TABLES:
+        _assert_matches_source(stub, data_dir, table)
+
+
+def test_interrupted_import_resumes_from_the_checkpoint(stub, data_dir, tmp_path):
+    # Without retries the first injected failure stops the import part way
+    stub.error_rate = 0.3
+    first = _importer(data_dir, tmp_path, max_retries=0)
+    with pytest.raises(Exception):
+        _run(first)
+    sent = {table: table_stats['rows'] for table, table_stats in first.stats.items()}
+    assert 0 < sum(sent.values()) < sum(len(read_dataset(data_dir, table)) for table in TABLES)
+
+    stub.error_rate = 0.1
+    resumed = _run(_importer(data_dir, tmp_path))
+    for table in TABLES:
+        table_stats = resumed[table]
+        # Rows the first run completed are skipped, everything else is sent exactly once
+        assert table_stats['skipped'] == sent.get(table, 0)
+        assert table_stats['rows'] + table_stats['skipped'] == table_stats['read']
+        _assert_matches_source(stub, data_dir, table)
+
+
+def test_delta_import_sends_only_changed_rows_and_deletes_removed_ones(stub, data_dir, tmp_path):
+    stub.error_rate = 0.1
+    first = _run(_importer(data_dir, tmp_path, delta=True))
+    for table in TABLES:
+        assert first[table]['rows'] == first[table]['read']
+
+    path = f"{data_dir}/customers.csv"
+    customers = pd.read_csv(path)
+    customers.loc[10, 'first_order_value'] += 1.0
+    customers.to_csv(path, index=False)
+
+    path = f"{data_dir}/daily_performance.csv"
+    performance = pd.read_csv(path)
+    performance.loc[5, 'spend'] += 1.0
+    performance.to_csv(path, index=False)
+
+    path = f"{data_dir}/transactions.csv"
+    transactions = pd.read_csv(path)
+    removed = transactions['transaction_id'].iloc[[3, 7]].tolist()
+    added = transactions.iloc[[0]].assign(transaction_id=transactions['transaction_id'].max() + 1)
+    pd.concat([transactions.drop(index=[3, 7]), added]).to_csv(path, index=False)
+
+    second = _run(_importer(data_dir, tmp_path, delta=True))
+    expected = {'campaigns': (0, 0), 'ab_tests': (0, 0), 'customers': (1, 0),
+                'daily_performance': (1, 0), 'transactions': (1, 2)}
+    for table, (sent, deleted) in expected.items():
+        assert (second[table]['rows'], second[table]['deleted']) == (sent, deleted), table
+        assert second[table]['unchanged'] == second[table]['read'] - sent
+        _assert_matches_source(stub, data_dir, table)
+    assert not stub.backend.select('transactions')['transaction_id'].isin(removed).any()
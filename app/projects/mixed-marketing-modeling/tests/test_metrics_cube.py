@@ -0,0 +1,102 @@
+"""
+Metrics Cube Tests
+Incremental appends and save/load round trips agree with a cube built in one go
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics_cube import MEASURES, MetricsCube
+from storage import read_dataset
+
+RANGES = [(None, None), ('2024-02-01', '2024-02-29'), ('2024-06-15', '2024-09-30'), ('2024-12-01', None),
+          ('2023-06-01', '2024-01-10'), ('2025-01-01', '2025-02-01')]
+
+
+@pytest.fixture
+def performance(data_dir):
+    return read_dataset(data_dir, 'daily_performance'), read_dataset(data_dir, 'campaigns')
+
+
+def _cell_totals(cube, start_date, end_date):
+    """Totals per campaign, independent of the order cells were registered in"""
+    totals = pd.DataFrame(cube.totals(start_date, end_date), columns=MEASURES,
+                          index=cube.cells['campaign_id'].astype(np.int64).to_numpy())
+    return totals.sort_index()
+
+
+def _assert_same_cube(expected, actual):
+    assert (actual.first_day, actual.days) == (expected.first_day, expected.days)
+    for start_date, end_date in RANGES:
+        pd.testing.assert_frame_equal(_cell_totals(actual, start_date, end_date),
+                                      _cell_totals(expected, start_date, end_date))
+        for by in ['channel', ['channel', 'target_audience'], None]:
+            sort = by or []
+            pd.testing.assert_frame_equal(
+                actual.query(start_date, end_date, by=by).sort_values(sort, ignore_index=True),
+                expected.query(start_date, end_date, by=by).sort_values(sort, ignore_index=True)
+            )
+
+
+def test_shuffled_appends_match_a_single_build(performance):
+    daily_performance, campaigns = performance
+    expected = MetricsCube.build(daily_performance, campaigns)
+
+    # Start from the middle of the year, so later chunks both extend the cube
+    # and reach back before its first day, then add the rest in random
+    # chunks: late corrections, new campaigns and buffer growth
+    dates = pd.to_datetime(daily_performance['date'])
+    middle = dates.between('2024-06-01', '2024-06-30')
+    rest = daily_performance[~middle].sample(frac=1, random_state=0)
+    cube = MetricsCube.build(daily_performance[middle], campaigns)
+    for chunk in np.array_split(np.arange(len(rest)), 17):
+        cube.append(rest.iloc[chunk], campaigns)
+    _assert_same_cube(expected, cube)
+
+
+def test_day_by_day_appends_match_a_single_build(performance):
+    daily_performance, campaigns = performance
+    expected = MetricsCube.build(daily_performance, campaigns)
+    cube = MetricsCube()
+    for _, day in daily_performance.groupby('date'):
+        cube.append(day, campaigns)
+    _assert_same_cube(expected, cube)
+
+
+def test_split_rows_add_up(performance):
+    daily_performance, campaigns = performance
+    expected = MetricsCube.build(daily_performance, campaigns)
+    # The same rows sent as two halves of every measure
+    half = daily_performance.copy()
+    half[MEASURES] = half[MEASURES] / 2
+    cube = MetricsCube.build(half, campaigns)
+    cube.append(half.sample(frac=1, random_state=1), campaigns)
+    for start_date, end_date in RANGES:
+        pd.testing.assert_frame_equal(_cell_totals(cube, start_date, end_date),
+                                      _cell_totals(expected, start_date, end_date))
+
+
+def test_save_and_load_round_trip(performance, tmp_path):
+    daily_performance, campaigns = performance
+    dates = pd.to_datetime(daily_performance['date'])
+    early = daily_performance[dates < '2024-07-01']
+    late = daily_performance[dates >= '2024-07-01']
+
+    cube = MetricsCube.build(early, campaigns)
+    path = str(tmp_path / 'cube.npz')
+    cube.save(path)
+    loaded = MetricsCube.load(path)
+    np.testing.assert_array_equal(loaded.prefix, cube.prefix)
+    pd.testing.assert_frame_equal(loaded.cells, cube.cells.astype(loaded.cells.dtypes.to_dict()))
+    _assert_same_cube(cube, loaded)
+
+    # A loaded cube keeps growing like the original
+    loaded.append(late, campaigns)
+    _assert_same_cube(MetricsCube.build(daily_performance, campaigns), loaded)
+
+
+def test_empty_cube():
+    cube = MetricsCube()
+    assert cube.append(pd.DataFrame(columns=['date', 'campaign_id'] + MEASURES)) == 0
+    assert cube.totals().shape == (0, len(MEASURES))
@@ -0,0 +1,24 @@
+"""
+Outlier Detection Tests
+Streaming a stored dataset grouped by a column its rows don't carry
+"""
+
+import pytest
+
+from outliers import ALL, fit_dataset
+from storage import read_dataset
+
+
+def test_fit_dataset_groups_csv_performance_by_campaign_channel(data_dir):
+    bounds = fit_dataset(data_dir, 'daily_performance', group_by='channel', chunk_size=50).bounds()
+    channels = set(read_dataset(data_dir, 'campaigns')['channel'].astype(str))
+    assert set(bounds['group']) == channels | {ALL}
+
+    rows = len(read_dataset(data_dir, 'daily_performance'))
+    roas_counts = bounds[bounds['metric'] == 'roas'].set_index('group')['count']
+    assert roas_counts[ALL] == roas_counts.drop(ALL).sum() <= rows
+
+
+def test_fit_dataset_rejects_a_group_column_nothing_provides(data_dir):
+    with pytest.raises(ValueError, match="no 'region' column"):
+        fit_dataset(data_dir, 'daily_performance', group_by='region')